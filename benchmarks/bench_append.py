@@ -0,0 +1,99 @@
+"""
+Time appendratings for a daily delta against a full reload of base + delta
+followed by rangepartition and roundrobinpartition. The delta mixes new
+ratings with unchanged pairs from the base file, which appendratings skips.
+
+    python benchmarks/bench_append.py data/ml-10M100K/ratings.dat --delta-rows 100000
+    python benchmarks/bench_append.py data/ml-10M100K/ratings.dat --delta-rows 100000 --skip-reload
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.database import get_connection, loadratings
+from database.append import appendratings
+from partitioning.partitioning import rangepartition, roundrobinpartition
+
+# New rows use user ids above any MovieLens user so they never collide with loaded data
+FIRST_USERID = 10000000
+
+def write_delta(ratingsfile, path, rows, duplicate_share, seed=0):
+    """Delta file with `rows` lines, `duplicate_share` of them repeating pairs from the head of ratingsfile"""
+    rng = random.Random(seed)
+    duplicates = int(rows * duplicate_share)
+    with open(ratingsfile) as source, open(path, 'w') as delta:
+        for _ in range(duplicates):
+            line = source.readline()
+            if not line:
+                break
+            delta.write(line)
+        for i in range(rows - duplicates):
+            delta.write(f"{FIRST_USERID + i // 20}::{rng.randint(1, 65000)}::{rng.randint(1, 10) / 2}::1230000000\n")
+
+def partition(table, partitions, conn):
+    rangepartition(table, partitions, conn)
+    roundrobinpartition(table, partitions, conn)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ratingsfile')
+    parser.add_argument('--table', default='ratings')
+    parser.add_argument('--partitions', type=int, default=5)
+    parser.add_argument('--delta-rows', type=int, default=100000)
+    parser.add_argument('--duplicate-share', type=float, default=0.1, help='share of delta rows already loaded')
+    parser.add_argument('--skip-reload', action='store_true', help='only time appendratings')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_append_')
+    delta_path = os.path.join(workdir, 'delta.dat')
+    write_delta(args.ratingsfile, delta_path, args.delta_rows, args.duplicate_share)
+
+    conn = get_connection()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            loadratings(args.table, args.ratingsfile, conn)
+            conn.commit()
+            partition(args.table, args.partitions, conn)
+
+        start_time = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            appended = appendratings(args.table, delta_path, conn)
+        results = {
+            'delta_rows': args.delta_rows,
+            'rows_added': appended['rows_added'],
+            'rows_updated': appended['rows_updated'],
+            'append_seconds': round(time.time() - start_time, 3),
+        }
+
+        if not args.skip_reload:
+            combined_path = os.path.join(workdir, 'combined.dat')
+            with open(combined_path, 'wb') as combined:
+                for path in (args.ratingsfile, delta_path):
+                    with open(path, 'rb') as f:
+                        shutil.copyfileobj(f, combined, 1024 * 1024)
+            start_time = time.time()
+            with contextlib.redirect_stdout(io.StringIO()):
+                loadratings(args.table, combined_path, conn)
+                conn.commit()
+                partition(args.table, args.partitions, conn)
+            results['full_reload_seconds'] = round(time.time() - start_time, 3)
+    finally:
+        conn.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare rows/sec of the single-row insert APIs (rangeinsert, roundrobininsert)
+with the batch APIs (rangeinsert_many, roundrobininsert_many).
+
+    python benchmarks/bench_batch_insert.py data/ml-10M100K/ratings.dat --partitions 5 --rows 2000 --batch 1000
+    python benchmarks/bench_batch_insert.py --skip-load --native
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.database import get_connection, loadratings
+from partitioning.partitioning import (rangepartition, roundrobinpartition, rangeinsert, roundrobininsert,
+                                       rangeinsert_many, roundrobininsert_many)
+
+# New rows use user ids above any MovieLens user so they never collide with loaded data
+FIRST_USERID = 10000000
+
+def make_rows(count, first_userid):
+    return [(first_userid + i, random.randint(1, 65000), random.randint(1, 10) / 2) for i in range(count)]
+
+def timed(func, *args):
+    start_time = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(*args)
+    return time.time() - start_time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ratingsfile', nargs='?')
+    parser.add_argument('--table', default='ratings')
+    parser.add_argument('--skip-load', action='store_true', help='reuse an already loaded ratings table')
+    parser.add_argument('--partitions', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=2000, help='rows inserted by each method')
+    parser.add_argument('--batch', type=int, default=1000, help='rows per *_many call')
+    parser.add_argument('--native', action='store_true', help='partition with native=True')
+    args = parser.parse_args()
+
+    conn = get_connection()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if not args.skip_load:
+            loadratings(args.table, args.ratingsfile, conn)
+            conn.commit()
+        rangepartition(args.table, args.partitions, conn, native=args.native)
+        roundrobinpartition(args.table, args.partitions, conn, native=args.native)
+
+    strategies = [('range', rangeinsert, rangeinsert_many), ('roundrobin', roundrobininsert, roundrobininsert_many)]
+    results = []
+    next_userid = FIRST_USERID
+    for strategy, insert_one, insert_many in strategies:
+        rows = make_rows(args.rows, next_userid)
+        next_userid += args.rows
+        single = timed(lambda: [insert_one(args.table, *row, conn) for row in rows])
+
+        rows = make_rows(args.rows, next_userid)
+        next_userid += args.rows
+        batched = timed(lambda: [insert_many(args.table, rows[i:i + args.batch], conn)
+                                 for i in range(0, len(rows), args.batch)])
+
+        result = {
+            'strategy': strategy,
+            'rows': args.rows,
+            'batch': args.batch,
+            'single_rows_per_sec': round(args.rows / single),
+            'batch_rows_per_sec': round(args.rows / batched),
+            'speedup': round(single / batched, 1),
+        }
+        results.append(result)
+        print(f"{strategy:>10}: single {result['single_rows_per_sec']:>8,} rows/s   "
+              f"batch {result['batch_rows_per_sec']:>8,} rows/s   x{result['speedup']}")
+
+    conn.close()
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Compare ratings ingestion with binary COPY, CSV COPY and execute_values.
+
+    python benchmarks/bench_copy_formats.py data/ml-10M100K/ratings.dat
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.database import get_connection, use_copy_method, load_with_batch_insert
+
+BENCH_TABLE = 'bench_format_ratings'
+
+def recreate_table(conn):
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    cursor.execute(f"""
+        CREATE UNLOGGED TABLE {BENCH_TABLE} (
+            userid INT NOT NULL,
+            movieid INT NOT NULL,
+            rating FLOAT NOT NULL,
+            PRIMARY KEY (userid, movieid)
+        )
+    """)
+    conn.commit()
+    cursor.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ratingsfile')
+    parser.add_argument('--methods', nargs='+', default=['binary', 'csv', 'execute_values'])
+    args = parser.parse_args()
+
+    conn = get_connection()
+    results = []
+    for method in args.methods:
+        recreate_table(conn)
+        start_time = time.time()
+        if method == 'execute_values':
+            load_with_batch_insert(BENCH_TABLE, args.ratingsfile, conn)
+        else:
+            use_copy_method(BENCH_TABLE, args.ratingsfile, conn, method)
+        elapsed = time.time() - start_time
+
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*), SUM(rating) FROM {BENCH_TABLE}")
+        rows, rating_sum = cursor.fetchone()
+        cursor.close()
+        results.append({'method': method, 'rows': rows, 'rating_sum': rating_sum, 'seconds': round(elapsed, 3),
+                        'rows_per_sec': round(rows / elapsed) if elapsed else None})
+
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    conn.commit()
+    conn.close()
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Fresh-machine load of a MovieLens zip served over HTTP, two ways. "extract" is
+the previous download_movielens_dataset: download the archive in 8 KB chunks,
+extract it, then loadratings. "stream" is stream_movielens_ratings into
+loadratings_stream: ratings.dat is inflated out of the archive while it
+downloads and COPYed as it arrives. Reports time to the first row reaching
+COPY, total time and the disk used by the data directory.
+
+The archive is built from a ratings file (or a generated one of --rows) and
+served by a local HTTP server, optionally limited to --mbps.
+
+    python benchmarks/bench_download.py --rows 1m
+    python benchmarks/bench_download.py data/ml-10M100K/ratings.dat --mbps 200
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.database import get_connection, loadratings, loadratings_stream
+from utils.utils import stream_movielens_ratings, RATINGS_MEMBER
+from generate_ratings import SIZES, parse_rows, ensure_ratings
+
+SYNTHETIC_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'synthetic')
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    """Serves server.archive_path at any URL, at most server.bytes_per_second"""
+
+    def do_GET(self):
+        size = os.path.getsize(self.server.archive_path)
+        self.send_response(200)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        start_time = time.time()
+        sent = 0
+        with open(self.server.archive_path, 'rb') as f:
+            while True:
+                data = f.read(64 * 1024)
+                if not data:
+                    break
+                self.wfile.write(data)
+                sent += len(data)
+                if self.server.bytes_per_second:
+                    ahead = sent / self.server.bytes_per_second - (time.time() - start_time)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+    def log_message(self, format, *args):
+        pass
+
+def disk_usage(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names)
+
+def run_extract(url, data_dir, table, conn):
+    """The previous download_movielens_dataset followed by loadratings"""
+    start_time = time.time()
+    zip_path = os.path.join(data_dir, 'ml-10m.zip')
+    response = requests.get(url, stream=True)
+    response.raise_for_status()
+    with open(zip_path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            f.write(chunk)
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        for name in zip_ref.namelist():
+            zip_ref.extract(name, data_dir)
+    first_row_seconds = time.time() - start_time
+    peak_disk = disk_usage(data_dir)
+    loadratings(table, os.path.join(data_dir, RATINGS_MEMBER), conn)
+    return first_row_seconds, time.time() - start_time, peak_disk
+
+def run_stream(url, data_dir, table, conn, checksum):
+    start_time = time.time()
+    first_row = []
+
+    def timed(chunks):
+        for chunk in chunks:
+            if not first_row:
+                first_row.append(time.time() - start_time)
+            yield chunk
+
+    zip_path = os.path.join(data_dir, 'ml-10m.zip')
+    loadratings_stream(table, timed(stream_movielens_ratings(url, zip_path, checksum)), conn)
+    return first_row[0], time.time() - start_time, disk_usage(data_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ratingsfile', nargs='?', help='ratings.dat to serve (default: generated, see --rows)')
+    parser.add_argument('--rows', default='1m', help=f"rows of the generated file, a number or one of {list(SIZES)}")
+    parser.add_argument('--mbps', type=float, default=0, help='download bandwidth limit in megabits/s (0 = none)')
+    parser.add_argument('--table', default='bench_download_ratings')
+    args = parser.parse_args()
+
+    ratingsfile = args.ratingsfile or ensure_ratings(SYNTHETIC_DIR, parse_rows(args.rows))
+    workdir = tempfile.mkdtemp(prefix='bench_download_')
+    archive_path = os.path.join(workdir, 'ml-10m.zip')
+    with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.write(ratingsfile, RATINGS_MEMBER)
+    with open(archive_path, 'rb') as f:
+        checksum = f"md5:{hashlib.md5(f.read()).hexdigest()}"
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ArchiveHandler)
+    server.archive_path = archive_path
+    server.bytes_per_second = args.mbps * 1000 * 1000 / 8
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/ml-10m.zip"
+
+    conn = get_connection()
+    conn.autocommit = True
+    results = {'archive_bytes': os.path.getsize(archive_path), 'ratings_bytes': os.path.getsize(ratingsfile),
+               'mbps': args.mbps or None, 'modes': []}
+    try:
+        for mode in ('extract', 'stream'):
+            data_dir = os.path.join(workdir, mode)
+            os.makedirs(data_dir)
+            with contextlib.redirect_stdout(io.StringIO()):
+                if mode == 'extract':
+                    first_row, total, disk = run_extract(url, data_dir, args.table, conn)
+                else:
+                    first_row, total, disk = run_stream(url, data_dir, args.table, conn, checksum)
+            results['modes'].append({'mode': mode, 'first_row_seconds': round(first_row, 3),
+                                     'total_seconds': round(total, 3), 'disk_mb': round(disk / 1024 / 1024, 1)})
+        conn.cursor().execute(f"DROP TABLE IF EXISTS {args.table}")
+    finally:
+        server.shutdown()
+        conn.close()
+        shutil.rmtree(workdir)
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Cost of each loadratings durability mode: load time, range and round robin
+partitioning time, and the WAL each step writes. "fast+set_logged" is the
+fast load followed by ALTER TABLE ... SET LOGGED, the rewrite the durable
+mode avoids.
+
+    python benchmarks/bench_durability.py data/ml-10M100K/ratings.dat
+    python benchmarks/bench_durability.py data/ml-10M100K/ratings.dat --modes fast durable
+
+The WAL saving of "durable" depends on wal_level (reported in the output):
+with minimal, the COPY FREEZE and the partition builds write next to no WAL.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.database import get_connection, loadratings
+from partitioning.partitioning import rangepartition, roundrobinpartition
+
+MODES = ('fast', 'fast+set_logged', 'durable', 'auto')
+
+def wal_lsn(cursor):
+    cursor.execute("SELECT pg_current_wal_lsn()")
+    return cursor.fetchone()[0]
+
+def wal_bytes(cursor, since):
+    cursor.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s)::BIGINT", (since,))
+    return cursor.fetchone()[0]
+
+def timed(cursor, step):
+    """Run step(); return (seconds, WAL MB written)"""
+    start_lsn = wal_lsn(cursor)
+    start_time = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        step()
+    return round(time.time() - start_time, 3), round(wal_bytes(cursor, start_lsn) / 1024 / 1024, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ratingsfile')
+    parser.add_argument('--table', default='ratings')
+    parser.add_argument('--partitions', type=int, default=5)
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=MODES)
+    args = parser.parse_args()
+
+    conn = get_connection()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute("SELECT current_setting('wal_level')")
+    results = {'wal_level': cursor.fetchone()[0], 'modes': []}
+
+    for mode in args.modes:
+        durability = 'fast' if mode == 'fast+set_logged' else mode
+        load_seconds, load_wal_mb = timed(cursor, lambda: loadratings(args.table, args.ratingsfile, conn,
+                                                                      durability=durability))
+        result = {'mode': mode, 'load_seconds': load_seconds, 'load_wal_mb': load_wal_mb}
+        if mode == 'fast+set_logged':
+            result['set_logged_seconds'], result['set_logged_wal_mb'] = timed(
+                cursor, lambda: cursor.execute(f"ALTER TABLE {args.table} SET LOGGED"))
+        cursor.execute("SELECT relpersistence = 'p' FROM pg_class WHERE oid = %s::regclass", (args.table,))
+        result['logged'] = cursor.fetchone()[0]
+        result['rangepartition_seconds'], result['rangepartition_wal_mb'] = timed(
+            cursor, lambda: rangepartition(args.table, args.partitions, conn))
+        result['roundrobinpartition_seconds'], result['roundrobinpartition_wal_mb'] = timed(
+            cursor, lambda: roundrobinpartition(args.table, args.partitions, conn))
+        results['modes'].append(result)
+
+    conn.close()
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
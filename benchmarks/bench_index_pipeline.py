@@ -0,0 +1,94 @@
+"""
+COPY a ratings file and index it two ways. "inline" keeps the (userid,
+movieid) primary key during the COPY and then builds the secondary indexes
+one after another with CREATE INDEX CONCURRENTLY. "pipeline" COPYs into a
+bare table and builds the key and the secondary indexes in parallel on
+separate connections (database/indexes.py).
+
+    python benchmarks/bench_index_pipeline.py data/ml-10M100K/ratings.dat
+    python benchmarks/bench_index_pipeline.py data/ml-10M100K/ratings.dat --connections 2 --memory-mb 512
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.database import get_connection, use_copy_method, connection_params_of
+from database.indexes import build_indexes, ratings_index_jobs
+
+def create_table(conn, table, primary_key):
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    primary_key_sql = ", PRIMARY KEY (userid, movieid)" if primary_key else ""
+    cursor.execute(f"CREATE UNLOGGED TABLE {table} (userid INT NOT NULL, movieid INT NOT NULL, "
+                   f"rating FLOAT NOT NULL{primary_key_sql}) WITH (fillfactor = 90)")
+    conn.commit()
+    cursor.close()
+
+def run_inline(conn, table, ratingsfile):
+    create_table(conn, table, primary_key=True)
+    start_time = time.time()
+    use_copy_method(table, ratingsfile, conn)
+    load_seconds = time.time() - start_time
+    conn.autocommit = True
+    cursor = conn.cursor()
+    indexes = {}
+    for job in ratings_index_jobs(table, primary_key=False):
+        index_start = time.time()
+        cursor.execute(job.build_sql.replace("CREATE INDEX IF NOT EXISTS", "CREATE INDEX CONCURRENTLY"))
+        indexes[job.label] = time.time() - index_start
+    cursor.close()
+    conn.autocommit = False
+    return load_seconds, indexes, time.time() - start_time
+
+def run_pipeline(conn, table, ratingsfile, connections):
+    create_table(conn, table, primary_key=False)
+    start_time = time.time()
+    use_copy_method(table, ratingsfile, conn)
+    load_seconds = time.time() - start_time
+    indexes = build_indexes(ratings_index_jobs(table, primary_key=True), connection_params_of(conn), connections)
+    return load_seconds, indexes, time.time() - start_time
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ratingsfile')
+    parser.add_argument('--table', default='bench_index_ratings')
+    parser.add_argument('--connections', type=int, default=None, help='index build connections (default DB_INDEX_CONNECTIONS)')
+    parser.add_argument('--memory-mb', type=int, default=None, help='maintenance_work_mem budget (default DB_INDEX_MEMORY_MB)')
+    args = parser.parse_args()
+    if args.memory_mb:
+        os.environ['DB_INDEX_MEMORY_MB'] = str(args.memory_mb)
+
+    conn = get_connection()
+    results = []
+    try:
+        for mode in ('inline', 'pipeline'):
+            with contextlib.redirect_stdout(io.StringIO()):
+                if mode == 'inline':
+                    load_seconds, indexes, total_seconds = run_inline(conn, args.table, args.ratingsfile)
+                else:
+                    load_seconds, indexes, total_seconds = run_pipeline(conn, args.table, args.ratingsfile, args.connections)
+            results.append({
+                'mode': mode,
+                'copy_seconds': round(load_seconds, 3),
+                'index_seconds': {label: round(seconds, 3) for label, seconds in indexes.items()},
+                'total_seconds': round(total_seconds, 3),
+            })
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {args.table}")
+        conn.commit()
+    finally:
+        conn.close()
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Measure ingest throughput of the parallel byte-range COPY loader as the worker
+count grows. Worker count 1 uses the single-connection streaming COPY path.
+
+    python benchmarks/bench_parallel_copy.py data/ml-10M100K/ratings.dat --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.database import get_connection, use_copy_method, load_with_parallel_copy
+
+BENCH_TABLE = 'bench_parallel_ratings'
+
+def recreate_table(conn):
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    cursor.execute(f"""
+        CREATE UNLOGGED TABLE {BENCH_TABLE} (
+            userid INT NOT NULL,
+            movieid INT NOT NULL,
+            rating FLOAT NOT NULL,
+            PRIMARY KEY (userid, movieid)
+        )
+    """)
+    conn.commit()
+    cursor.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ratingsfile')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    conn = get_connection()
+    results = []
+    for workers in args.workers:
+        recreate_table(conn)
+        start_time = time.time()
+        if workers > 1:
+            ok = load_with_parallel_copy(BENCH_TABLE, args.ratingsfile, conn, workers)
+        else:
+            ok = use_copy_method(BENCH_TABLE, args.ratingsfile, conn)
+        elapsed = time.time() - start_time
+
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {BENCH_TABLE}")
+        rows = cursor.fetchone()[0]
+        cursor.close()
+        results.append({'workers': workers, 'ok': ok, 'rows': rows, 'seconds': round(elapsed, 3),
+                        'rows_per_sec': round(rows / elapsed) if elapsed else None})
+
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    conn.commit()
+    conn.close()
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Compare the per-line split/int/float loop the loaders used to run with the
+shared memory-mapped columnar parser in utils.ratings_parser. No database needed.
+
+    python benchmarks/bench_parser.py data/ml-10M100K/ratings.dat
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from utils import ratings_parser
+from utils.ratings_parser import iter_rating_batches
+
+def legacy_parse(ratingsfilepath):
+    rows = []
+    with open(ratingsfilepath, 'r', encoding='utf-8', buffering=8192*8) as f:
+        for line in f:
+            parts = line.strip().split('::')
+            if len(parts) >= 3:
+                rows.append((int(parts[0]), int(parts[1]), float(parts[2])))
+    return len(rows)
+
+def columnar_parse(ratingsfilepath):
+    batches = list(iter_rating_batches(ratingsfilepath))
+    return sum(len(batch.userid) for batch in batches)
+
+def measure(name, func, ratingsfilepath):
+    start_time = time.time()
+    rows = func(ratingsfilepath)
+    elapsed = time.time() - start_time
+
+    # Second pass under tracemalloc, which would distort the timing above
+    tracemalloc.start()
+    func(ratingsfilepath)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'parser': name, 'rows': rows, 'seconds': round(elapsed, 3), 'peak_alloc_mb': round(peak / 1024 / 1024, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ratingsfile')
+    args = parser.parse_args()
+
+    results = [measure('legacy', legacy_parse, args.ratingsfile), measure('columnar', columnar_parse, args.ratingsfile)]
+    print(json.dumps({'numpy': ratings_parser.np is not None, 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Time rangepartition and roundrobinpartition for several partition counts on
+a loaded ratings table.
+
+    python benchmarks/bench_partitioning.py data/ml-10M100K/ratings.dat --partitions 5 50 500
+    python benchmarks/bench_partitioning.py --skip-load --partitions 5 50 500
+    python benchmarks/bench_partitioning.py --skip-load --partitions 8 --workers 1 2 4 8
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.database import get_connection, loadratings
+from partitioning.partitioning import (rangepartition, roundrobinpartition,
+                                       RANGE_TABLE_PREFIX, RROBIN_TABLE_PREFIX)
+
+STRATEGIES = {
+    'range': (rangepartition, RANGE_TABLE_PREFIX),
+    'roundrobin': (roundrobinpartition, RROBIN_TABLE_PREFIX),
+}
+
+def drop_partitions(conn, prefix):
+    cursor = conn.cursor()
+    cursor.execute("SELECT tablename FROM pg_tables WHERE schemaname = 'public' AND tablename LIKE %s",
+                   (prefix.replace('_', r'\_') + '%',))
+    for (tablename,) in cursor.fetchall():
+        cursor.execute(f"DROP TABLE IF EXISTS {tablename} CASCADE")
+    conn.commit()
+    cursor.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ratingsfile', nargs='?')
+    parser.add_argument('--table', default='ratings')
+    parser.add_argument('--skip-load', action='store_true', help='reuse an already loaded ratings table')
+    parser.add_argument('--partitions', type=int, nargs='+', default=[5, 50, 500])
+    parser.add_argument('--strategies', nargs='+', default=list(STRATEGIES), choices=list(STRATEGIES))
+    parser.add_argument('--workers', type=int, nargs='+', default=[1], help='parallel build connections')
+    args = parser.parse_args()
+
+    conn = get_connection()
+    if not args.skip_load:
+        with contextlib.redirect_stdout(io.StringIO()):
+            loadratings(args.table, args.ratingsfile, conn)
+        conn.commit()
+
+    results = []
+    for strategy in args.strategies:
+        partition_func, prefix = STRATEGIES[strategy]
+        for n in args.partitions:
+            for workers in args.workers:
+                drop_partitions(conn, prefix)
+                start_time = time.time()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    partition_func(args.table, n, conn, workers=workers)
+                elapsed = time.time() - start_time
+                results.append({'strategy': strategy, 'partitions': n, 'workers': workers,
+                                'seconds': round(elapsed, 3)})
+        drop_partitions(conn, prefix)
+
+    conn.close()
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
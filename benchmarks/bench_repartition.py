@@ -0,0 +1,80 @@
+"""
+Change the partition count with repartition() versus rebuilding every
+partition from the ratings table, and report how much of the data moved.
+
+    python benchmarks/bench_repartition.py data/ml-10M100K/ratings.dat --from 5 --to 10
+    python benchmarks/bench_repartition.py --skip-load --strategies range hash --from 10 --to 5
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.database import get_connection, loadratings
+from partitioning.partitioning import rangepartition, roundrobinpartition, hashpartition
+from partitioning.repartition import repartition, REPARTITION_BATCH_ROWS
+
+BUILDERS = {
+    'range': lambda table, n, conn: rangepartition(table, n, conn),
+    'roundrobin': lambda table, n, conn: roundrobinpartition(table, n, conn),
+    'hash': lambda table, n, conn: hashpartition(table, n, 'userid', conn),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ratingsfile', nargs='?')
+    parser.add_argument('--table', default='ratings')
+    parser.add_argument('--skip-load', action='store_true', help='reuse an already loaded ratings table')
+    parser.add_argument('--strategies', nargs='+', default=list(BUILDERS), choices=list(BUILDERS))
+    parser.add_argument('--from', dest='from_n', type=int, default=5)
+    parser.add_argument('--to', dest='to_n', type=int, default=10)
+    parser.add_argument('--batch-rows', type=int, default=REPARTITION_BATCH_ROWS)
+    args = parser.parse_args()
+
+    conn = get_connection()
+    if not args.skip_load:
+        with contextlib.redirect_stdout(io.StringIO()):
+            loadratings(args.table, args.ratingsfile, conn)
+        conn.commit()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {args.table}")
+    total_rows = cursor.fetchone()[0]
+    cursor.close()
+
+    results = []
+    for strategy in args.strategies:
+        build = BUILDERS[strategy]
+        with contextlib.redirect_stdout(io.StringIO()):
+            build(args.table, args.from_n, conn)
+        start_time = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            build(args.table, args.to_n, conn)
+        rebuild_seconds = time.time() - start_time
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            build(args.table, args.from_n, conn)
+            result = repartition(strategy, args.to_n, conn, ratingstablename=args.table, batch_rows=args.batch_rows)
+        results.append({
+            'strategy': strategy,
+            'from_partitions': args.from_n,
+            'to_partitions': args.to_n,
+            'rows': total_rows,
+            'rebuild_seconds': round(rebuild_seconds, 3),
+            'repartition_seconds': round(result['seconds'], 3),
+            'rows_moved': result['rows_moved'],
+            'moved_fraction': round(result['rows_moved'] / total_rows, 3) if total_rows else 0,
+        })
+
+    conn.close()
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
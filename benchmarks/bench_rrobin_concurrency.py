@@ -0,0 +1,126 @@
+"""
+Round robin insert throughput with 1, 8 and 32 concurrent writers, each on its
+own connection. Compares roundrobininsert (sequence + rrobin_insert()) with
+the previous scheme, a counter row read with SELECT ... FOR UPDATE and
+advanced with an UPDATE on every insert, and reports how evenly the rows
+were spread over the partitions.
+
+    python benchmarks/bench_rrobin_concurrency.py data/ml-10M100K/ratings.dat --rows 4000
+    python benchmarks/bench_rrobin_concurrency.py --skip-load --threads 1 8 32
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.database import get_connection, loadratings
+from partitioning.partitioning import roundrobinpartition, roundrobininsert, RROBIN_TABLE_PREFIX
+
+# New rows use user ids above any MovieLens user so they never collide with loaded data
+FIRST_USERID = 10000000
+COUNTER_TABLE = 'bench_rrobin_counter'
+
+def locked_counter_insert(ratingstablename, userid, movieid, rating, conn):
+    """The row-lock counter scheme roundrobininsert used before rrobin_insert_seq"""
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT current_insert_index, num_partitions FROM {COUNTER_TABLE} WHERE id = 1 FOR UPDATE")
+    current_insert_index, N = cursor.fetchone()
+    cursor.execute(f"INSERT INTO {RROBIN_TABLE_PREFIX}{current_insert_index % N} (UserID, MovieID, Rating) "
+                   f"VALUES (%s, %s, %s)", (userid, movieid, rating))
+    cursor.execute(f"UPDATE {COUNTER_TABLE} SET current_insert_index = %s WHERE id = 1", (current_insert_index + 1,))
+    conn.commit()
+    cursor.close()
+
+def run_writers(insert_func, table, threads, rows, first_userid):
+    connections = [get_connection() for _ in range(threads)]
+    per_thread = rows // threads
+
+    def writer(index):
+        conn = connections[index]
+        userid = first_userid + index * per_thread
+        for i in range(per_thread):
+            insert_func(table, userid + i, 1, 3.0, conn)
+
+    workers = [threading.Thread(target=writer, args=(i,)) for i in range(threads)]
+    start_time = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start_time
+
+    for conn in connections:
+        conn.close()
+    return per_thread * threads, elapsed
+
+def partition_spread(conn, partitions, first_userid):
+    cursor = conn.cursor()
+    counts = []
+    for i in range(partitions):
+        cursor.execute(f"SELECT COUNT(*) FROM {RROBIN_TABLE_PREFIX}{i} WHERE userid >= %s", (first_userid,))
+        counts.append(cursor.fetchone()[0])
+    cursor.close()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ratingsfile', nargs='?')
+    parser.add_argument('--table', default='ratings')
+    parser.add_argument('--skip-load', action='store_true', help='reuse an already loaded ratings table')
+    parser.add_argument('--partitions', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=4000, help='rows inserted per run, split across the writers')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32])
+    args = parser.parse_args()
+
+    conn = get_connection()
+    if not args.skip_load:
+        with contextlib.redirect_stdout(io.StringIO()):
+            loadratings(args.table, args.ratingsfile, conn)
+        conn.commit()
+
+    methods = {'row_lock_counter': locked_counter_insert, 'sequence': roundrobininsert}
+    results = []
+    for method, insert_func in methods.items():
+        for threads in args.threads:
+            with contextlib.redirect_stdout(io.StringIO()):
+                roundrobinpartition(args.table, args.partitions, conn)
+                cursor = conn.cursor()
+                cursor.execute(f"DROP TABLE IF EXISTS {COUNTER_TABLE}")
+                cursor.execute(f"CREATE TABLE {COUNTER_TABLE} AS SELECT 1 AS id, 0::BIGINT AS current_insert_index, "
+                               f"{args.partitions} AS num_partitions")
+                conn.commit()
+                cursor.close()
+                rows, elapsed = run_writers(insert_func, args.table, threads, args.rows, FIRST_USERID)
+
+            spread = partition_spread(conn, args.partitions, FIRST_USERID)
+            result = {
+                'method': method,
+                'threads': threads,
+                'rows': rows,
+                'seconds': round(elapsed, 3),
+                'rows_per_sec': round(rows / elapsed),
+                'partition_rows': spread,
+            }
+            results.append(result)
+            print(f"{method:>16} threads={threads:<3} {result['rows_per_sec']:>7,} rows/s  "
+                  f"partition rows min/max {min(spread)}/{max(spread)}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {COUNTER_TABLE}")
+        conn.commit()
+        cursor.close()
+    conn.close()
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare the legacy join-everything COPY path with the streaming COPY adapter.
+
+Each mode runs in its own subprocess so peak RSS (ru_maxrss) is measured
+independently. Use --dry-run to drain the CSV stream without a database.
+
+    python benchmarks/bench_streaming_copy.py data/ml-10M100K/ratings.dat
+    python benchmarks/bench_streaming_copy.py data/ml-10M100K/ratings.dat --dry-run
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from database.copy_stream import RatingsCopyStream
+
+BENCH_TABLE = 'bench_copy_ratings'
+
+def legacy_buffer(ratingsfilepath):
+    """The previous use_copy_method behaviour: build the whole CSV in memory."""
+    def data_generator():
+        with open(ratingsfilepath, 'r', encoding='utf-8', buffering=8192*8) as infile:
+            for line in infile:
+                parts = line.strip().split('::')
+                if len(parts) >= 3:
+                    yield f"{parts[0]},{parts[1]},{parts[2]}\n"
+    return io.StringIO(''.join(data_generator()))
+
+def run_mode(mode, ratingsfilepath, dry_run):
+    start_time = time.time()
+    if mode == 'legacy':
+        source = legacy_buffer(ratingsfilepath)
+    else:
+        source = RatingsCopyStream(ratingsfilepath, progress_every=0)
+
+    if dry_run:
+        while source.read(256 * 1024):
+            pass
+    else:
+        from dotenv import load_dotenv
+        load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+        from database.database import get_connection
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        cursor.execute(f"CREATE UNLOGGED TABLE {BENCH_TABLE} (userid INT, movieid INT, rating FLOAT)")
+        cursor.copy_expert(f"COPY {BENCH_TABLE} (userid, movieid, rating) FROM STDIN WITH (FORMAT CSV)",
+                           source, size=256 * 1024)
+        cursor.execute(f"DROP TABLE {BENCH_TABLE}")
+        conn.commit()
+        conn.close()
+
+    elapsed = time.time() - start_time
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'mode': mode, 'seconds': round(elapsed, 3), 'peak_rss_mb': round(peak_rss_kb / 1024, 1)}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('ratingsfile')
+    parser.add_argument('--dry-run', action='store_true', help='drain the stream instead of running COPY')
+    parser.add_argument('--mode', choices=['legacy', 'streaming'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.ratingsfile, args.dry_run)
+        return
+
+    print(f"File: {args.ratingsfile} ({os.path.getsize(args.ratingsfile) / 1024 / 1024:.1f} MB)")
+    for mode in ('legacy', 'streaming'):
+        cmd = [sys.executable, __file__, args.ratingsfile, '--mode', mode]
+        if args.dry_run:
+            cmd.append('--dry-run')
+        subprocess.run(cmd, check=True)
+
+if __name__ == '__main__':
+    main()
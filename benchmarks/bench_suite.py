@@ -0,0 +1,159 @@
+"""
+End-to-end benchmark on deterministic synthetic MovieLens-shaped files
+(generate_ratings.py): for each size, time loadratings, rangepartition,
+roundrobinpartition and the single-row and batch insert paths against the
+database in .env, and write the timings as JSON.
+
+With --baseline the run is compared with an earlier results file, and the
+script exits with status 1 if any step got slower by more than --threshold.
+--compare does the same for two existing files without touching the database,
+e.g. for results saved on two commits.
+
+    python benchmarks/bench_suite.py --sizes 10k 1m --output results.json
+    python benchmarks/bench_suite.py --sizes 10k 1m 10m --baseline main.json --threshold 0.2
+    python benchmarks/bench_suite.py --compare main.json results.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.database import get_connection, loadratings
+from partitioning.partitioning import (rangepartition, roundrobinpartition, rangeinsert, roundrobininsert,
+                                       rangeinsert_many, roundrobininsert_many)
+from generate_ratings import SIZES, parse_rows, ensure_ratings
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'synthetic')
+
+# Inserted rows use user ids above any generated user, so they never collide with loaded data
+FIRST_INSERT_USERID = 100000000
+
+# Steps faster than this in both runs are too noisy to flag
+MIN_REGRESSION_SECONDS = 0.05
+
+def insert_rows(count, offset, seed):
+    rng = random.Random(seed)
+    return [(FIRST_INSERT_USERID + offset + i, rng.randint(1, 60000), rng.randint(1, 10) / 2) for i in range(count)]
+
+def run_steps(table, path, conn, args):
+    """One pass over every step; returns {step: seconds}"""
+    steps = [
+        ('loadratings', lambda: (loadratings(table, path, conn), conn.commit())),
+        ('rangepartition', lambda: rangepartition(table, args.partitions, conn)),
+        ('roundrobinpartition', lambda: roundrobinpartition(table, args.partitions, conn)),
+        ('rangeinsert', lambda: [rangeinsert(table, *row, conn) for row in insert_rows(args.inserts, 0, 1)]),
+        ('roundrobininsert', lambda: [roundrobininsert(table, *row, conn) for row in insert_rows(args.inserts, 0, 2)]),
+        ('rangeinsert_many', lambda: rangeinsert_many(table, insert_rows(args.batch_rows, args.inserts, 3), conn)),
+        ('roundrobininsert_many', lambda: roundrobininsert_many(table, insert_rows(args.batch_rows, args.inserts, 4), conn)),
+    ]
+    timings = {}
+    for name, step in steps:
+        start_time = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            step()
+        timings[name] = round(time.time() - start_time, 3)
+    return timings
+
+def environment(conn):
+    cursor = conn.cursor()
+    cursor.execute("SHOW server_version")
+    server_version = cursor.fetchone()[0]
+    cursor.close()
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'postgres': server_version,
+        'cpus': multiprocessing.cpu_count(),
+    }
+
+def compare(baseline, current, threshold):
+    """Print step timings of both runs; returns the (size, step) pairs that regressed"""
+    regressions = []
+    for size, result in current['results'].items():
+        baseline_steps = baseline.get('results', {}).get(size, {}).get('steps', {})
+        for step, seconds in result['steps'].items():
+            if step not in baseline_steps:
+                continue
+            before = baseline_steps[step]
+            change = (seconds - before) / before if before else 0.0
+            regressed = seconds > before * (1 + threshold) and seconds - before > MIN_REGRESSION_SECONDS
+            print(f"{size:>5} {step:<22} {before:9.3f}s -> {seconds:9.3f}s {change:+7.1%}"
+                  + ("  REGRESSION" if regressed else ""))
+            if regressed:
+                regressions.append((size, step))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', default=['10k', '1m'], help=f"row counts or names from {list(SIZES)}")
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated files')
+    parser.add_argument('--data-dir', default=DATA_DIR, help='where generated files are kept between runs')
+    parser.add_argument('--table', default='ratings')
+    parser.add_argument('--partitions', type=int, default=5)
+    parser.add_argument('--inserts', type=int, default=1000, help='rows written through each single-row insert path')
+    parser.add_argument('--batch-rows', type=int, default=100000, help='rows written through each batch insert path')
+    parser.add_argument('--repeat', type=int, default=1, help='passes per size; the fastest time of each step is kept')
+    parser.add_argument('--output', help='write the results JSON here as well as to stdout')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown per step, 0.2 = 20%%')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'RESULTS'), help='only compare two results files')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.threshold) else 0)
+
+    conn = get_connection()
+    results = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(conn),
+        'settings': {'seed': args.seed, 'partitions': args.partitions, 'inserts': args.inserts,
+                     'batch_rows': args.batch_rows, 'repeat': args.repeat},
+        'results': {},
+    }
+    try:
+        for size in args.sizes:
+            rows = parse_rows(size)
+            path = ensure_ratings(args.data_dir, rows, args.seed)
+            passes = [run_steps(args.table, path, conn, args) for _ in range(max(1, args.repeat))]
+            results['results'][size] = {
+                'rows': rows,
+                'steps': {step: min(timings[step] for timings in passes) for step in passes[0]},
+            }
+    finally:
+        conn.close()
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.baseline} (threshold {args.threshold:.0%}):")
+        sys.exit(1 if compare(baseline, results, args.threshold) else 0)
+
+if __name__ == '__main__':
+    main()
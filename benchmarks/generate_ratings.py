@@ -0,0 +1,120 @@
+"""
+Write a deterministic synthetic ratings.dat shaped like MovieLens: UserID::
+MovieID::Rating::Timestamp lines grouped by user, power-law (Zipf) movie
+popularity, power-law ratings per user with MovieLens' minimum of 20,
+half-star ratings with the MovieLens 10M distribution and no repeated
+(user, movie) pair. The same rows and seed always give the same file.
+
+    python benchmarks/generate_ratings.py data/synthetic_1m.dat --rows 1m
+    python benchmarks/generate_ratings.py data/synthetic_10m.dat --rows 10000000 --seed 7
+"""
+import argparse
+import itertools
+import os
+import random
+
+# MovieLens 10M: about 937 ratings per movie and 143 per user, at least 20 per user
+RATINGS_PER_MOVIE = 937
+RATINGS_PER_USER = 143
+MIN_RATINGS_PER_USER = 20
+
+# Share of each half-star rating in MovieLens 10M
+RATING_WEIGHTS = {
+    0.5: 0.9, 1.0: 3.8, 1.5: 1.2, 2.0: 7.9, 2.5: 3.7,
+    3.0: 23.6, 3.5: 8.8, 4.0: 28.8, 4.5: 5.8, 5.0: 15.4,
+}
+
+# Zipf exponent of movie popularity and Pareto shape of ratings per user
+MOVIE_ZIPF_EXPONENT = 0.9
+USER_PARETO_SHAPE = 1.2
+
+FIRST_TIMESTAMP = 789652009
+LAST_TIMESTAMP = 1231131736
+
+# Named sizes accepted wherever a row count is
+SIZES = {'10k': 10000, '1m': 1000000, '10m': 10000000}
+
+def parse_rows(value):
+    """Row count from a number or one of the SIZES names"""
+    value = str(value).lower()
+    return SIZES[value] if value in SIZES else int(value)
+
+def _ratings_per_user(rng, rows, users, movies):
+    """Power-law number of ratings of each user, summing to exactly `rows`"""
+    cap = max(1, movies // 2)
+    floor = min(MIN_RATINGS_PER_USER, rows // users, cap)
+    # Shifted to start at 0, so the lightest users sit at the floor as in MovieLens
+    weights = [rng.paretovariate(USER_PARETO_SHAPE) - 1 for _ in range(users)]
+    counts = [floor] * users
+    # Share the rows above the floor by weight; rows cut off by the cap go round again
+    missing = rows - floor * users
+    open_users = list(range(users))
+    while missing > 0 and open_users:
+        total_weight = sum(weights[i] for i in open_users) or 1
+        spare = missing
+        for i in open_users:
+            added = min(cap - counts[i], int(spare * weights[i] / total_weight))
+            counts[i] += added
+            missing -= added
+        still_open = [i for i in open_users if counts[i] < cap]
+        if len(still_open) == len(open_users):
+            break
+        open_users = still_open
+    # Hand the rows lost to rounding to the users with room left
+    for i in itertools.cycle(range(users)):
+        if missing <= 0:
+            break
+        if counts[i] < cap:
+            counts[i] += 1
+            missing -= 1
+    return counts
+
+def generate_ratings(path, rows, seed=0):
+    """Write `rows` synthetic ratings to `path`; returns the number of users"""
+    rng = random.Random(seed)
+    users = max(1, rows // RATINGS_PER_USER)
+    # Small files need more movies than the MovieLens ratio so heavy users still fit (at most half of them each)
+    movies = max(rows // RATINGS_PER_MOVIE, 4 * -(-rows // users))
+
+    # Popularity rank -> sparse movie id, so popular movies are spread over the id range
+    movie_ids = rng.sample(range(1, 6 * movies + 1), movies)
+    movie_weights = list(itertools.accumulate(1 / (rank ** MOVIE_ZIPF_EXPONENT) for rank in range(1, movies + 1)))
+    rating_values = list(RATING_WEIGHTS)
+    rating_weights = list(itertools.accumulate(RATING_WEIGHTS.values()))
+
+    with open(path, 'w') as f:
+        for userid, count in enumerate(_ratings_per_user(rng, rows, users, movies), start=1):
+            # Distinct movies, drawn by popularity
+            ranks = set()
+            while len(ranks) < count:
+                ranks.update(rng.choices(range(movies), cum_weights=movie_weights, k=count - len(ranks)))
+            ratings = rng.choices(rating_values, cum_weights=rating_weights, k=count)
+            timestamp = rng.randint(FIRST_TIMESTAMP, LAST_TIMESTAMP - 86400 * 30)
+            lines = []
+            for rank, rating in zip(sorted(ranks), ratings):
+                timestamp += rng.randint(0, 3600)
+                lines.append(f"{userid}::{movie_ids[rank]}::{rating:g}::{timestamp}\n")
+            f.write(''.join(lines))
+    return users
+
+def ensure_ratings(directory, rows, seed=0):
+    """Path of the synthetic file for (rows, seed) under `directory`, generated on first use"""
+    path = os.path.join(directory, f"synthetic_{rows}_{seed}.dat")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        partial_path = f"{path}.partial"
+        generate_ratings(partial_path, rows, seed)
+        os.replace(partial_path, path)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=parse_rows, default=SIZES['1m'], help=f"row count or one of {list(SIZES)}")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    users = generate_ratings(args.path, args.rows, args.seed)
+    print(f"Wrote {args.rows:,} ratings of {users:,} users to {args.path}")
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+import multiprocessing
 
 class DatabaseConfig:
     @classmethod
@@ -10,9 +11,71 @@ class DatabaseConfig:
             'password': os.getenv('DB_PASSWORD'),
             'port': os.getenv('DB_PORT')
         }
-        print("[DatabaseConfig] Loaded params:", params)
         return params
 
+    @classmethod
+    def get_load_workers(cls):
+        """Number of parallel COPY workers used by loadratings (DB_LOAD_WORKERS)"""
+        workers = os.getenv('DB_LOAD_WORKERS')
+        if workers:
+            return max(1, int(workers))
+        return min(multiprocessing.cpu_count(), 8)
+
+    @classmethod
+    def get_pool_size(cls):
+        """(min, max) connections of the shared connection pool (DB_POOL_MIN, DB_POOL_MAX)"""
+        minconn = int(os.getenv('DB_POOL_MIN') or 1)
+        maxconn = int(os.getenv('DB_POOL_MAX') or max(4, cls.get_load_workers()))
+        return max(0, minconn), max(1, minconn, maxconn)
+
+    @classmethod
+    def get_partition_workers(cls):
+        """Connections used to build partitions concurrently (DB_PARTITION_WORKERS, 1 = serial)"""
+        return max(1, int(os.getenv('DB_PARTITION_WORKERS') or 1))
+
+    @classmethod
+    def get_copy_format(cls):
+        """COPY wire format used by loadratings: 'csv' or 'binary' (DB_COPY_FORMAT)"""
+        return (os.getenv('DB_COPY_FORMAT') or 'csv').lower()
+
+    @classmethod
+    def get_index_connections(cls):
+        """Connections building indexes side by side after a load or partitioning (DB_INDEX_CONNECTIONS)"""
+        connections = os.getenv('DB_INDEX_CONNECTIONS')
+        if connections:
+            return max(1, int(connections))
+        return min(multiprocessing.cpu_count(), 4)
+
+    @classmethod
+    def get_index_memory_mb(cls):
+        """maintenance_work_mem budget in MB shared by the index build connections (DB_INDEX_MEMORY_MB)"""
+        return max(64, int(os.getenv('DB_INDEX_MEMORY_MB') or 1024))
+
+    @classmethod
+    def get_durability(cls):
+        """Durability mode of loadratings and the partitions: 'fast', 'durable' or 'auto' (DB_DURABILITY)"""
+        return (os.getenv('DB_DURABILITY') or 'auto').lower()
+
+    @classmethod
+    def get_checkpoint_bytes(cls):
+        """Chunk size of the checkpointed, resumable load (DB_LOAD_CHECKPOINT_MB, unset or 0 = off)"""
+        return int(float(os.getenv('DB_LOAD_CHECKPOINT_MB') or 0) * 1024 * 1024)
+
+    @classmethod
+    def use_ratings_cache(cls):
+        """Whether loadratings reads through the columnar ratings cache (DB_RATINGS_CACHE)"""
+        return (os.getenv('DB_RATINGS_CACHE') or '').lower() in ('1', 'true', 'yes', 'on')
+
+    @classmethod
+    def get_metrics_sinks(cls):
+        """Where metrics are written: comma-separated 'log', 'jsonl:<path>', 'prometheus:<path>' (DB_METRICS)"""
+        return [spec.strip() for spec in (os.getenv('DB_METRICS') or '').split(',') if spec.strip()]
+
+    @classmethod
+    def is_quiet(cls):
+        """Whether per-row and progress messages of the load and insert paths are suppressed (DB_QUIET)"""
+        return (os.getenv('DB_QUIET') or '').lower() in ('1', 'true', 'yes', 'on')
+
     @classmethod
     def get_instance(cls):
         """Singleton pattern to get DatabaseConfig instance"""
@@ -0,0 +1,124 @@
+from config.config import DatabaseConfig
+from database.copy_stream import open_copy_stream, copy_statement
+from database.database import loadratings, count_streamed, COPY_READ_SIZE
+from partitioning.partitioning import append_to_partitions, update_in_partitions
+from utils import metrics
+
+def appendratings(ratingstablename, ratingsfilepath, openconnection, copy_format=None):
+    """
+    Append mode of loadratings for delta files in the same '::' format.
+
+    The file is streamed with COPY into a temporary staging table, and one
+    INSERT ... ON CONFLICT DO UPDATE upserts it: pairs not in the ratings
+    table yet are added, pairs whose rating changed get the new rating, and
+    unchanged pairs are left alone (the last occurrence wins when the delta
+    repeats a pair). The new rows are routed into the existing range, round
+    robin and hash partitions, and the changed ones are updated there, moving
+    range rows whose new rating belongs to another partition. Nothing is
+    dropped, re-indexed or re-analyzed, and the whole append is one
+    transaction, so a failed append leaves the table and its partitions as
+    they were.
+
+    Falls back to a full loadratings when the table does not exist yet; the
+    loaded row count is then reported as both read and added.
+    Returns {'rows_read', 'rows_added', 'rows_updated',
+    'partitions': {strategy: rows added}, 'updated_partitions': {strategy: rows updated}}.
+    """
+    if copy_format is None:
+        copy_format = DatabaseConfig.get_copy_format()
+    staging_table = f"{ratingstablename}_delta"
+    appended_table = f"{ratingstablename}_appended"
+    updated_table = f"{ratingstablename}_updated"
+    metrics.info(f"\nStarting append of {ratingsfilepath} into '{ratingstablename}'...")
+
+    old_autocommit = openconnection.autocommit
+    cursor = None
+    try:
+        with metrics.span('append', table=ratingstablename) as append_span:
+            # One transaction for staging, upsert and partition routing
+            if old_autocommit:
+                openconnection.autocommit = False
+            cursor = openconnection.cursor()
+
+            cursor.execute(f"SELECT to_regclass('{ratingstablename}') IS NOT NULL")
+            if not cursor.fetchone()[0]:
+                openconnection.rollback()
+                if old_autocommit:
+                    openconnection.autocommit = True
+                metrics.info(f"Table {ratingstablename} does not exist yet, running a full load")
+                append_span.label(method='full_load')
+                loadratings(ratingstablename, ratingsfilepath, openconnection, copy_format)
+                cursor = openconnection.cursor()
+                cursor.execute(f"SELECT COUNT(*) FROM {ratingstablename}")
+                rows_loaded = cursor.fetchone()[0]
+                return {'rows_read': rows_loaded, 'rows_added': rows_loaded, 'rows_updated': 0,
+                        'partitions': {}, 'updated_partitions': {}}
+
+            # Session-private tables that go away with the transaction, committed or not
+            cursor.execute(f"""CREATE TEMP TABLE {staging_table} (userid INT NOT NULL, movieid INT NOT NULL, rating FLOAT NOT NULL)
+                               ON COMMIT DROP""")
+            cursor.execute(f"CREATE TEMP TABLE {appended_table} (userid INT, movieid INT, rating FLOAT) ON COMMIT DROP")
+            cursor.execute(f"CREATE TEMP TABLE {updated_table} (userid INT, movieid INT, rating FLOAT) ON COMMIT DROP")
+
+            with metrics.span('copy', table=staging_table, format=copy_format), \
+                    open_copy_stream(ratingsfilepath, copy_format) as stream:
+                cursor.copy_expert(copy_statement(staging_table, copy_format), stream, size=COPY_READ_SIZE)
+                rows_read = stream.rows
+                count_streamed(stream, copy_format)
+            metrics.info(f"Staged {rows_read:,} rows ({stream.bytes_read:,} bytes) through COPY")
+
+            # Set-based upsert against the primary key. The delta is reduced to the last occurrence
+            # of each pair (ON CONFLICT cannot touch a row twice) and kept in file order for the
+            # round robin rotation. RETURNING yields only rows added or changed; xmax = 0 tells
+            # a freshly inserted row from an updated one
+            cursor.execute(f"""
+                WITH upserted AS (
+                    INSERT INTO {ratingstablename} AS target (userid, movieid, rating)
+                    SELECT userid, movieid, rating FROM (
+                        SELECT DISTINCT ON (userid, movieid) userid, movieid, rating, ctid AS position
+                        FROM {staging_table} ORDER BY userid, movieid, ctid DESC
+                    ) latest ORDER BY position
+                    ON CONFLICT (userid, movieid) DO UPDATE SET rating = EXCLUDED.rating
+                    WHERE target.rating IS DISTINCT FROM EXCLUDED.rating
+                    RETURNING userid, movieid, rating, xmax = 0 AS inserted
+                ),
+                added AS (
+                    INSERT INTO {appended_table} (userid, movieid, rating)
+                    SELECT userid, movieid, rating FROM upserted WHERE inserted RETURNING 1
+                ),
+                changed AS (
+                    INSERT INTO {updated_table} (userid, movieid, rating)
+                    SELECT userid, movieid, rating FROM upserted WHERE NOT inserted RETURNING 1
+                )
+                SELECT (SELECT COUNT(*) FROM added), (SELECT COUNT(*) FROM changed)
+            """)
+            rows_added, rows_updated = cursor.fetchone()
+            metrics.info(f"Added {rows_added:,} new ratings, updated {rows_updated:,}, "
+                         f"skipped {rows_read - rows_added - rows_updated:,} unchanged")
+
+            partitions = append_to_partitions(ratingstablename, appended_table, openconnection)
+            for strategy, rows in partitions.items():
+                metrics.info(f"Routed {rows:,} rows into the {strategy} partitions")
+            updated_partitions = update_in_partitions(ratingstablename, updated_table, openconnection)
+            for strategy, rows in updated_partitions.items():
+                metrics.info(f"Updated {rows:,} rows in the {strategy} partitions")
+
+            openconnection.commit()
+            metrics.count('rows_loaded', rows_added, table=ratingstablename)
+            for strategy, rows in partitions.items():
+                metrics.count('rows_inserted', rows, path='append', strategy=strategy)
+            for strategy, rows in updated_partitions.items():
+                metrics.count('rows_updated', rows, path='append', strategy=strategy)
+            metrics.info(f"Append completed in {append_span.elapsed():.2f} seconds")
+            return {'rows_read': rows_read, 'rows_added': rows_added, 'rows_updated': rows_updated,
+                    'partitions': partitions, 'updated_partitions': updated_partitions}
+
+    except Exception as e:
+        openconnection.rollback()
+        print(f"Error appending ratings: {e}")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if old_autocommit:
+            openconnection.autocommit = True
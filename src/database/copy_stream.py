@@ -0,0 +1,191 @@
+import os
+from database.pgcopy import BinaryCopyEncoder, PGCOPY_HEADER, PGCOPY_TRAILER
+from utils.ratings_parser import iter_line_blocks, iter_stream_blocks, parse_block
+from utils.ratings_cache import iter_cached_rating_batches
+from utils import metrics
+
+# Rows encoded per chunk when streaming from the columnar cache
+CACHED_BATCH_ROWS = 65536
+
+class RatingsCopyStream:
+    """
+    Read-only file-like adapter that feeds a MovieLens '::' file to COPY as CSV.
+
+    The file is read and reformatted in blocks of roughly `chunk_bytes`, so memory
+    stays bounded by one block no matter how large the input file is. `start` and
+    `end` restrict the stream to a byte range whose edges fall on line starts
+    (see split_file_ranges). Instead of a path, `ratingsfilepath` can be an
+    iterator of raw byte chunks, such as a zip member streamed while it
+    downloads (utils.download.iter_zip_member); it is then read once, in full.
+    """
+
+    def __init__(self, ratingsfilepath, chunk_bytes=1024 * 1024, progress_every=1000000, start=0, end=None):
+        self._blocks = self.open_blocks(ratingsfilepath, chunk_bytes, start, end)
+        self._progress_every = progress_every
+        self._buffer = self.header()
+        self._offset = 0
+        self._eof = False
+        self.rows = 0
+        self.bytes_read = 0
+        # Exception raised while reading the source; COPY only reports it as cancelled
+        self.error = None
+
+    def open_blocks(self, ratingsfilepath, chunk_bytes, start, end):
+        """Iterator of source chunks handed to encode_block()"""
+        if not isinstance(ratingsfilepath, (str, bytes, os.PathLike)):
+            return iter_stream_blocks(ratingsfilepath, chunk_bytes)
+        return iter_line_blocks(ratingsfilepath, chunk_bytes, start, end)
+
+    def header(self):
+        """Bytes sent before the first row"""
+        return b''
+
+    def trailer(self):
+        """Bytes sent after the last row"""
+        return b''
+
+    def encode_block(self, block):
+        """Turn a block of raw '::' lines into COPY data. Returns (data, row_count)."""
+        out = [b'%s,%s,%s\n' % (parts[0], parts[1], parts[2])
+               for parts in (line.split(b'::', 3) for line in block.splitlines())
+               if len(parts) >= 3]
+        return b''.join(out), len(out)
+
+    def _fill(self):
+        try:
+            block = next(self._blocks, None)
+        except Exception as e:
+            self.error = e
+            raise
+        if block is None:
+            self._eof = True
+            self._buffer = self.trailer()
+            self._offset = 0
+            return
+
+        data, rows = self.encode_block(block)
+
+        previous = self.rows
+        self.rows += rows
+        if self._progress_every and self.rows // self._progress_every > previous // self._progress_every:
+            metrics.info(f"Processed {self.rows // self._progress_every * self._progress_every:,} lines...")
+
+        self._buffer = data
+        self._offset = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            parts = [bytes(self._buffer[self._offset:])]
+            while not self._eof:
+                self._fill()
+                parts.append(bytes(self._buffer))
+            self._buffer, self._offset = b'', 0
+            data = b''.join(parts)
+        else:
+            while self._offset >= len(self._buffer) and not self._eof:
+                self._fill()
+            data = bytes(self._buffer[self._offset:self._offset + size])
+            self._offset += len(data)
+        self.bytes_read += len(data)
+        return data
+
+    def close(self):
+        self._blocks.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class BinaryRatingsCopyStream(RatingsCopyStream):
+    """
+    Same as RatingsCopyStream but produces PostgreSQL binary COPY data
+    (FORMAT BINARY), so the server skips text parsing of every value.
+    """
+
+    def __init__(self, ratingsfilepath, **kwargs):
+        self._encoder = BinaryCopyEncoder()
+        super().__init__(ratingsfilepath, **kwargs)
+
+    def header(self):
+        return PGCOPY_HEADER
+
+    def trailer(self):
+        return PGCOPY_TRAILER
+
+    def encode_block(self, block):
+        batch = parse_block(block)
+        return self._encoder.encode_columns(batch), len(batch.userid)
+
+class CachedBinaryCopyStream(BinaryRatingsCopyStream):
+    """
+    Binary COPY stream fed from the columnar cache (utils.ratings_cache) instead
+    of the text file. `start`/`end` are row numbers here, not byte offsets.
+    """
+
+    def open_blocks(self, ratingsfilepath, chunk_bytes, start, end):
+        return iter_cached_rating_batches(ratingsfilepath, batch_size=CACHED_BATCH_ROWS, start=start, end=end)
+
+    def encode_block(self, batch):
+        return self._encoder.encode_columns(batch), len(batch.userid)
+
+COPY_STREAMS = {
+    'csv': RatingsCopyStream,
+    'binary': BinaryRatingsCopyStream,
+    'cached': CachedBinaryCopyStream,
+}
+
+def open_copy_stream(ratingsfilepath, copy_format='csv', **kwargs):
+    """Open the COPY stream class matching `copy_format` ('csv', 'binary' or 'cached')"""
+    if copy_format not in COPY_STREAMS:
+        raise ValueError(f"Unknown COPY format '{copy_format}', expected one of {sorted(COPY_STREAMS)}")
+    return COPY_STREAMS[copy_format](ratingsfilepath, **kwargs)
+
+def copy_statement(tablename, copy_format='csv', freeze=False):
+    """
+    COPY ... FROM STDIN statement matching the data produced by open_copy_stream.
+    freeze=True writes the rows already frozen, which PostgreSQL only accepts
+    when the table was created or truncated in the same transaction.
+    """
+    if copy_format in ('binary', 'cached'):
+        options = "FORMAT BINARY"
+    else:
+        options = "FORMAT CSV, DELIMITER ','"
+    if freeze:
+        options += ", FREEZE"
+    return f"COPY {tablename} (userid, movieid, rating) FROM STDIN WITH ({options})"
+
+def split_file_ranges(filepath, parts):
+    """
+    Split a file into at most `parts` contiguous (start, end) byte ranges whose
+    boundaries are moved forward to the next line start.
+    """
+    file_size = os.path.getsize(filepath)
+    if file_size == 0:
+        return []
+    parts = max(1, min(parts, file_size))
+
+    boundaries = [0]
+    with open(filepath, 'rb') as f:
+        for i in range(1, parts):
+            f.seek(max(file_size * i // parts, boundaries[-1]))
+            f.readline()
+            boundaries.append(min(f.tell(), file_size))
+    boundaries.append(file_size)
+
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+def iter_file_chunks(filepath, chunk_bytes, start=0):
+    """
+    Yield consecutive (start, end) byte ranges of about `chunk_bytes` from
+    `start` to the end of the file, each ending on a line boundary.
+    """
+    file_size = os.path.getsize(filepath)
+    with open(filepath, 'rb') as f:
+        while start < file_size:
+            f.seek(min(start + chunk_bytes, file_size) - 1)
+            f.readline()
+            end = min(f.tell(), file_size)
+            yield start, end
+            start = end
@@ -1,11 +1,28 @@
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
 import time
 import os
 import threading
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import multiprocessing
 from config.config import DatabaseConfig
+from database.copy_stream import open_copy_stream, copy_statement, split_file_ranges, iter_file_chunks
+from database.indexes import build_indexes, ratings_index_jobs
+from database.pool import get_pool, set_bulk_settings
+from utils.ratings_parser import iter_rating_batches, batch_rows
+from utils.ratings_cache import ensure_cache, iter_cached_rating_batches, split_cached_rows
+from utils import metrics
+
+# Bytes handed to the server per COPY read call
+COPY_READ_SIZE = 256 * 1024
+
+# Durability modes of loadratings and the partitions (see resolve_durability)
+DURABILITY_MODES = ('fast', 'durable', 'auto')
+
+# Offset and row count reached by checkpointed loads, one row per table
+LOAD_PROGRESS_TABLE = 'load_progress'
 
 def get_connection():
     """Create connection to PostgreSQL database"""
@@ -17,101 +34,148 @@ def get_connection():
         print(f"Database connection error: {e}")
         raise
 
-def loadratings(ratingstablename, ratingsfilepath, openconnection):
+def connection_params_of(openconnection):
+    """
+    Build psycopg2.connect() keyword arguments that reach the same database
+    as an already open connection, including its password.
+    """
+    dsn = openconnection.get_dsn_parameters()
+    params = {key: dsn[key] for key in ('host', 'port', 'dbname', 'user') if dsn.get(key)}
+    if openconnection.info.password:
+        params['password'] = openconnection.info.password
+    return params
+
+def rating_batches(ratingsfilepath, batch_size):
+    """Column batches of the ratings file, read from the columnar cache when enabled"""
+    if DatabaseConfig.use_ratings_cache():
+        return iter_cached_rating_batches(ratingsfilepath, batch_size)
+    return iter_rating_batches(ratingsfilepath, batch_size)
+
+def loadratings(ratingstablename, ratingsfilepath, openconnection, copy_format=None, checkpoint_bytes=None,
+                durability=None):
     """
     Optimized version for loading large datasets (10M+ records)
     Uses COPY command, multi-threading, and optimized PostgreSQL settings
+
+    copy_format selects the COPY wire format ('csv' or 'binary') and defaults
+    to DatabaseConfig.get_copy_format().
+
+    checkpoint_bytes > 0 (default DatabaseConfig.get_checkpoint_bytes()) loads
+    in committed chunks of that size and resumes an interrupted load of the
+    same file from its last committed chunk (see load_with_checkpoints).
+
+    durability ('fast', 'durable' or 'auto', default
+    DatabaseConfig.get_durability()) decides whether the table is logged; see
+    resolve_durability. The partitions built from it follow the same mode.
     """
-    cursor = openconnection.cursor()
+    if copy_format is None:
+        copy_format = DatabaseConfig.get_copy_format()
+    if checkpoint_bytes is None:
+        checkpoint_bytes = DatabaseConfig.get_checkpoint_bytes()
+    if durability is None:
+        durability = DatabaseConfig.get_durability()
+    cursor = None
+    old_autocommit = openconnection.autocommit
     print("\nStarting data loading into main 'ratings' table...")
     
     try:
-        # Optimize PostgreSQL settings for bulk insert - only runtime changeable parameters
-        optimization_settings = [
-            "SET maintenance_work_mem = '512MB'",
-            "SET work_mem = '128MB'", 
-            "SET synchronous_commit = OFF",
-            "SET commit_delay = 0",
-            "SET commit_siblings = 5",
-            "SET temp_buffers = '32MB'",
-            "SET effective_cache_size = '512MB'"
-        ]
-        
-        # Apply settings one by one with individual error handling
-        for setting in optimization_settings:
-            try:
-                cursor.execute(setting)
-            except Exception as e:
-                print(f"Warning: Could not apply '{setting}': {e}")
-                # Rollback the failed command and continue
-                openconnection.rollback()
-                cursor = openconnection.cursor()  # Get a fresh cursor
-        
-        print("PostgreSQL settings optimization completed")
-        
-        # Create table with optimized structure
-        cursor.execute(f"""
-            DROP TABLE IF EXISTS {ratingstablename}
-        """)
-        
-        cursor.execute(f"""
-            CREATE UNLOGGED TABLE {ratingstablename} (
-                userid INT NOT NULL,
-                movieid INT NOT NULL,
-                rating FLOAT NOT NULL,
-                PRIMARY KEY (userid, movieid)
-            ) WITH (fillfactor = 90)
-        """)
-        
-        print(f"Starting to load data from {ratingsfilepath}...")
-        start_time = time.time()
+        # The loading transactions SET LOCAL the bulk settings (see set_bulk_settings)
+        with metrics.span('load', table=ratingstablename) as load_span:
+            cursor = openconnection.cursor()
         
-        # Determine file size to choose optimal method
-        file_size = os.path.getsize(ratingsfilepath)
-        
-        # Method 1: Use COPY command (fastest for large datasets)
-        if file_size > 50 * 1024 * 1024:  # Files larger than 50MB
-            if use_copy_method(ratingstablename, ratingsfilepath, openconnection):
-                end_time = time.time()
-                print(f"Data loaded successfully using COPY in {end_time - start_time:.2f} seconds")
+            if checkpoint_bytes:
+                # Chunks are committed one by one into a logged, keyed table, so a rerun can resume
+                defer_primary_key = False
+                print(f"Starting checkpointed load from {ratingsfilepath}...")
+                copy_format = 'csv' if copy_format == 'cached' else copy_format
+                load_span.label(method='checkpoint')
+                load_with_checkpoints(ratingstablename, ratingsfilepath, openconnection, checkpoint_bytes, copy_format)
+                print(f"Data loaded successfully using checkpointed {copy_format} COPY in {load_span.elapsed():.2f} seconds")
             else:
-                # Method 2: Fallback to parallel batch insert
-                load_with_parallel_insert(ratingstablename, ratingsfilepath, openconnection)
-                end_time = time.time()
-                print(f"Data loaded successfully using parallel batch insert in {end_time - start_time:.2f} seconds")
-        else:
-            # Method 3: Optimized batch insert for smaller files
-            load_with_batch_insert(ratingstablename, ratingsfilepath, openconnection)
-            end_time = time.time()
-            print(f"Data loaded successfully using batch insert in {end_time - start_time:.2f} seconds")
+                print(f"Starting to load data from {ratingsfilepath}...")
         
-        # Convert UNLOGGED table to LOGGED after data loading
-        cursor.execute(f"ALTER TABLE {ratingstablename} SET LOGGED")
+                # Determine file size to choose optimal method
+                file_size = os.path.getsize(ratingsfilepath)
+        
+                # Reuse the parsed columnar cache when enabled; COPY then streams binary columns
+                use_cache = DatabaseConfig.use_ratings_cache()
+                if use_cache:
+                    ensure_cache(ratingsfilepath)
+                    copy_format = 'cached'
 
-        # Commit current transaction before creating indexes, only if not autocommit
-        if not getattr(openconnection, 'autocommit', False):
-            openconnection.commit()
+                # COPY loads go into a bare table and the index pipeline builds the key afterwards;
+                # the insert methods need it up front for ON CONFLICT
+                use_copy = use_cache or file_size > 50 * 1024 * 1024  # Files larger than 50MB
+                defer_primary_key = use_copy
 
-        # Create indexes after data loading for better performance
-        print("Creating indexes...")
-        create_indexes_safely(ratingstablename, openconnection)
+                durability = resolve_durability(durability, cursor)
+                unlogged = durability == 'fast'
+                # COPY FREEZE only works on a table created in the COPY's own transaction
+                freeze = use_copy and durability == 'durable'
+                print(f"Durability mode: {durability}" + (" (COPY FREEZE)" if freeze else ""))
+                if freeze and old_autocommit:
+                    openconnection.autocommit = False
 
-        # Analyze table for query optimization
-        cursor = openconnection.cursor()  # Get fresh cursor after index creation
-        cursor.execute(f"ANALYZE {ratingstablename}")
+                create_ratings_table(cursor, ratingstablename, unlogged, primary_key=not defer_primary_key)
+                if not freeze:
+                    # COPY workers and a failed COPY's rollback must both see the table
+                    openconnection.commit()
         
-        # Get final count
-        cursor.execute(f"SELECT COUNT(*) FROM {ratingstablename}")
-        total_records = cursor.fetchone()[0]
-        print(f"Successfully loaded {total_records:,} records into table {ratingstablename}")
+                # Method 1: Use COPY command (fastest for large datasets)
+                if use_copy:
+                    # Parallel workers cannot FREEZE: the table was not created in their transactions
+                    num_workers = 1 if freeze else DatabaseConfig.get_load_workers()
+                    if num_workers > 1 and load_with_parallel_copy(ratingstablename, ratingsfilepath, openconnection, num_workers, copy_format,
+                                                                   direct=defer_primary_key):
+                        load_span.label(method='parallel_copy')
+                        print(f"Data loaded successfully using parallel COPY ({num_workers} workers) in {load_span.elapsed():.2f} seconds")
+                    elif use_copy_method(ratingstablename, ratingsfilepath, openconnection, copy_format, freeze=freeze):
+                        load_span.label(method='copy')
+                        print(f"Data loaded successfully using {copy_format} COPY in {load_span.elapsed():.2f} seconds")
+                    else:
+                        # Method 2: Fallback to parallel batch insert, which needs the key now
+                        create_ratings_table(cursor, ratingstablename, unlogged, primary_key=True)
+                        openconnection.commit()
+                        defer_primary_key = False
+                        load_with_parallel_insert(ratingstablename, ratingsfilepath, openconnection)
+                        load_span.label(method='parallel_insert')
+                        print(f"Data loaded successfully using parallel batch insert in {load_span.elapsed():.2f} seconds")
+                else:
+                    # Method 3: Optimized batch insert for smaller files
+                    load_with_batch_insert(ratingstablename, ratingsfilepath, openconnection)
+                    load_span.label(method='batch_insert')
+                    print(f"Data loaded successfully using batch insert in {load_span.elapsed():.2f} seconds")
+
+                if freeze and old_autocommit:
+                    openconnection.autocommit = True
+
+            # Commit current transaction before creating indexes, only if not autocommit
+            if not getattr(openconnection, 'autocommit', False):
+                openconnection.commit()
+
+            # Create indexes after data loading for better performance
+            print("Creating indexes...")
+            create_indexes_safely(ratingstablename, openconnection, primary_key=defer_primary_key)
+
+            # Analyze table for query optimization
+            cursor = openconnection.cursor()  # Get fresh cursor after index creation
+            cursor.execute(f"ANALYZE {ratingstablename}")
         
-        # Reset PostgreSQL settings
-        reset_db_settings(cursor)
+            # Get final count
+            cursor.execute(f"SELECT COUNT(*) FROM {ratingstablename}")
+            total_records = cursor.fetchone()[0]
+            print(f"Successfully loaded {total_records:,} records into table {ratingstablename}")
+            metrics.count('rows_loaded', total_records, table=ratingstablename)
+
+            # A later load of the same file starts over instead of resuming
+            if checkpoint_bytes:
+                cursor.execute(f"UPDATE {LOAD_PROGRESS_TABLE} SET completed = TRUE WHERE tablename = %s",
+                               (ratingstablename,))
         
-        # Final commit to ensure all changes are saved - Tester will handle this.
-        # openconnection.commit()
+            # Final commit to ensure all changes are saved - Tester will handle this.
+            # openconnection.commit()
         
-        print("Data loading completed successfully!")
+            print("Data loading completed successfully!")
         
     except Exception as e:
         try:
@@ -123,47 +187,138 @@ def loadratings(ratingstablename, ratingsfilepath, openconnection):
     finally:
         if cursor:
             cursor.close()
+        if old_autocommit and not openconnection.closed and not openconnection.autocommit:
+            openconnection.autocommit = True
+
+def loadratings_stream(ratingstablename, chunks, openconnection, copy_format=None, durability=None):
+    """
+    Load ratings from an iterator of raw '::' bytes instead of a file, e.g.
+    ratings.dat streamed out of the MovieLens zip while it downloads
+    (utils.utils.stream_movielens_ratings), so nothing is extracted to disk and
+    the first rows reach the server as soon as the first block is inflated.
+
+    The input can only be read once, so it goes through one serial COPY into a
+    bare table created in the same transaction (with COPY FREEZE in the
+    durable mode), and the key and indexes are built afterwards by the index
+    pipeline. Nothing is committed until the iterator is exhausted, so a
+    download that fails or does not match its checksum leaves no table behind.
+    copy_format is 'csv' or 'binary' (default DatabaseConfig.get_copy_format()).
+    """
+    if copy_format is None:
+        copy_format = DatabaseConfig.get_copy_format()
+    if copy_format == 'cached':
+        copy_format = 'csv'
+    if durability is None:
+        durability = DatabaseConfig.get_durability()
+    cursor = None
+    old_autocommit = openconnection.autocommit
+    print(f"\nStarting streamed data loading into '{ratingstablename}'...")
+
+    try:
+        with metrics.span('load', table=ratingstablename, method='stream') as load_span:
+            cursor = openconnection.cursor()
+
+            durability = resolve_durability(durability, cursor)
+            freeze = durability == 'durable'
+            print(f"Durability mode: {durability}" + (" (COPY FREEZE)" if freeze else ""))
+            if old_autocommit:
+                openconnection.autocommit = False
+            set_bulk_settings(cursor)
+            create_ratings_table(cursor, ratingstablename, durability == 'fast', primary_key=False)
+
+            with metrics.span('copy', table=ratingstablename, format=copy_format), \
+                    open_copy_stream(chunks, copy_format) as stream:
+                try:
+                    cursor.copy_expert(copy_statement(ratingstablename, copy_format, freeze), stream, size=COPY_READ_SIZE)
+                except psycopg2.errors.QueryCanceled:
+                    # A failed download or checksum reaches psycopg2 as a cancelled COPY
+                    if stream.error is None:
+                        raise
+                    raise stream.error
+                count_streamed(stream, copy_format)
+            openconnection.commit()
+            print(f"Streamed {stream.rows:,} rows ({stream.bytes_read:,} bytes) through {copy_format} COPY "
+                  f"in {load_span.elapsed():.2f} seconds")
+
+            print("Creating indexes...")
+            create_indexes_safely(ratingstablename, openconnection, primary_key=True)
+            cursor.execute(f"ANALYZE {ratingstablename}")
+            cursor.execute(f"SELECT COUNT(*) FROM {ratingstablename}")
+            total_records = cursor.fetchone()[0]
+            metrics.count('rows_loaded', total_records, table=ratingstablename)
+            openconnection.commit()
+            print(f"Successfully loaded {total_records:,} records into table {ratingstablename}")
+
+    except Exception as e:
+        if not openconnection.closed:
+            openconnection.rollback()
+        print(f"Error loading ratings: {e}")
+        raise
+    finally:
+        if cursor and not cursor.closed:
+            cursor.close()
+        if old_autocommit and not openconnection.closed:
+            openconnection.autocommit = True
+
+def resolve_durability(durability, cursor):
+    """
+    Turn a durability mode into 'fast', 'durable' or 'logged' for this server.
+
+    fast:    the table stays UNLOGGED. Loading writes no WAL, but PostgreSQL
+             empties the table after a crash and does not replicate it.
+    durable: a logged table is created in the loading transaction and filled
+             by one serial COPY ... FREEZE. With wal_level = minimal PostgreSQL
+             skips WAL for it and only syncs the files at commit; with replica
+             or higher the data is WAL-logged as it is loaded. Either way there
+             is no UNLOGGED -> LOGGED rewrite, and the frozen rows need no later
+             VACUUM freeze pass.
+    auto:    fast when fsync = off, where the server gives no crash guarantee to
+             begin with. Otherwise durable when wal_level = minimal, where the
+             FREEZE load skips WAL, and 'logged' on any other wal_level: a
+             logged table filled by the parallel COPY workers without FREEZE,
+             since FREEZE would write the same WAL there and cost the
+             parallelism.
+    """
+    if durability not in DURABILITY_MODES:
+        raise ValueError(f"Unknown durability mode '{durability}', expected one of {DURABILITY_MODES}")
+    if durability != 'auto':
+        return durability
+    cursor.execute("SELECT current_setting('fsync'), current_setting('wal_level')")
+    fsync, wal_level = cursor.fetchone()
+    if fsync == 'off':
+        return 'fast'
+    return 'durable' if wal_level == 'minimal' else 'logged'
+
+def create_ratings_table(cursor, ratingstablename, unlogged, primary_key=True):
+    """(Re)create the empty ratings table, UNLOGGED in the fast durability mode"""
+    primary_key_sql = ", PRIMARY KEY (userid, movieid)" if primary_key else ""
+    cursor.execute(f"DROP TABLE IF EXISTS {ratingstablename}")
+    cursor.execute(f"""
+        CREATE {"UNLOGGED " if unlogged else ""}TABLE {ratingstablename} (
+            userid INT NOT NULL,
+            movieid INT NOT NULL,
+            rating FLOAT NOT NULL{primary_key_sql}
+        ) WITH (fillfactor = 90)
+    """)
 
-def use_copy_method(ratingstablename, ratingsfilepath, openconnection):
+def use_copy_method(ratingstablename, ratingsfilepath, openconnection, copy_format='csv', freeze=False):
     """
-    Use PostgreSQL COPY command for maximum performance with streaming
+    Use PostgreSQL COPY command for maximum performance with streaming.
+    The file is reformatted chunk by chunk while COPY consumes it, so memory
+    use stays flat regardless of file size. freeze=True requires the table to
+    have been created in the current transaction.
     """
     try:
         cursor = openconnection.cursor()
         
-        print("Starting optimized COPY operation...")
-        
-        # Create a generator for streaming data processing
-        def data_generator():
-            with open(ratingsfilepath, 'r', encoding='utf-8', buffering=8192*8) as infile:
-                line_count = 0
-                for line in infile:
-                    line_count += 1
-                    if line_count % 1000000 == 0:
-                        print(f"Processed {line_count:,} lines...")
-                    
-                    try:
-                        parts = line.strip().split('::')
-                        if len(parts) >= 3:
-                            userid, movieid, rating = parts[0], parts[1], parts[2]
-                            yield f"{userid},{movieid},{rating}\n"
-                    except (ValueError, IndexError):
-                        continue  # Skip malformed lines
-        
-        # Use copy_expert with generator-based streaming
-        import io
-        
-        def generate_csv_data():
-            return ''.join(data_generator())
+        print(f"Starting streaming {copy_format} COPY operation...")
+        set_bulk_settings(cursor)
         
-        csv_data = generate_csv_data()
-        csv_buffer = io.StringIO(csv_data)
-        
-        # Use COPY command for bulk insert
-        cursor.copy_expert(f"""
-            COPY {ratingstablename} (userid, movieid, rating)
-            FROM STDIN WITH (FORMAT CSV, DELIMITER ',')
-        """, csv_buffer)
+        with metrics.span('copy', table=ratingstablename, format=copy_format), \
+                open_copy_stream(ratingsfilepath, copy_format) as stream:
+            cursor.copy_expert(copy_statement(ratingstablename, copy_format, freeze), stream, size=COPY_READ_SIZE)
+            count_streamed(stream, copy_format)
+            print(f"Streamed {stream.rows:,} rows ({stream.bytes_read:,} bytes) through COPY")
         
         openconnection.commit()
         return True
@@ -176,6 +331,190 @@ def use_copy_method(ratingstablename, ratingsfilepath, openconnection):
             pass
         return False
 
+def count_streamed(stream, copy_format):
+    """Add a finished COPY stream's rows and bytes to the streaming counters"""
+    metrics.count('rows_streamed', stream.rows, format=copy_format)
+    metrics.count('bytes_streamed', stream.bytes_read, format=copy_format)
+
+def load_with_checkpoints(ratingstablename, ratingsfilepath, openconnection, checkpoint_bytes, copy_format='csv'):
+    """
+    COPY the file in newline-aligned chunks of about `checkpoint_bytes`. Each
+    chunk commits together with the byte offset and row count it reached in
+    load_progress, so after a crash or connection reset the table holds
+    exactly the committed chunks. If the previous load into the table was of
+    the same file (path, size and mtime) and did not complete, loading
+    resumes at its offset; otherwise the table is recreated, logged so the
+    committed chunks also survive a server crash.
+    """
+    filepath = os.path.abspath(ratingsfilepath)
+    file_stat = os.stat(filepath)
+    file_size, file_mtime = file_stat.st_size, int(file_stat.st_mtime)
+
+    old_autocommit = openconnection.autocommit
+    cursor = None
+    try:
+        # Each chunk's COPY and checkpoint must commit together
+        if old_autocommit:
+            openconnection.autocommit = False
+        cursor = openconnection.cursor()
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {LOAD_PROGRESS_TABLE} (
+                tablename TEXT PRIMARY KEY,
+                filepath TEXT NOT NULL,
+                file_size BIGINT NOT NULL,
+                file_mtime BIGINT NOT NULL,
+                byte_offset BIGINT NOT NULL DEFAULT 0,
+                rows_loaded BIGINT NOT NULL DEFAULT 0,
+                completed BOOLEAN NOT NULL DEFAULT FALSE,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        """)
+        cursor.execute(f"""
+            SELECT byte_offset, rows_loaded FROM {LOAD_PROGRESS_TABLE}
+            WHERE tablename = %s AND filepath = %s AND file_size = %s AND file_mtime = %s
+              AND NOT completed AND to_regclass(%s) IS NOT NULL
+        """, (ratingstablename, filepath, file_size, file_mtime, ratingstablename))
+        checkpoint = cursor.fetchone()
+
+        if checkpoint:
+            offset, rows_loaded = checkpoint
+            print(f"Resuming load at byte {offset:,} of {file_size:,} ({rows_loaded:,} rows already committed)")
+        else:
+            offset, rows_loaded = 0, 0
+            cursor.execute(f"DROP TABLE IF EXISTS {ratingstablename}")
+            cursor.execute(f"""
+                CREATE TABLE {ratingstablename} (
+                    userid INT NOT NULL,
+                    movieid INT NOT NULL,
+                    rating FLOAT NOT NULL,
+                    PRIMARY KEY (userid, movieid)
+                ) WITH (fillfactor = 90)
+            """)
+            cursor.execute(f"DELETE FROM {LOAD_PROGRESS_TABLE} WHERE tablename = %s", (ratingstablename,))
+            cursor.execute(f"INSERT INTO {LOAD_PROGRESS_TABLE} (tablename, filepath, file_size, file_mtime) "
+                           f"VALUES (%s, %s, %s, %s)", (ratingstablename, filepath, file_size, file_mtime))
+        openconnection.commit()
+
+        for start, end in iter_file_chunks(filepath, checkpoint_bytes, offset):
+            chunk_start = time.perf_counter()
+            set_bulk_settings(cursor)
+            with open_copy_stream(filepath, copy_format, start=start, end=end, progress_every=0) as stream:
+                cursor.copy_expert(copy_statement(ratingstablename, copy_format), stream, size=COPY_READ_SIZE)
+                rows_loaded += stream.rows
+            metrics.observe('statement_seconds', time.perf_counter() - chunk_start, statement='copy_chunk')
+            count_streamed(stream, copy_format)
+            cursor.execute(f"""
+                UPDATE {LOAD_PROGRESS_TABLE}
+                SET byte_offset = %s, rows_loaded = %s, updated_at = now()
+                WHERE tablename = %s
+            """, (end, rows_loaded, ratingstablename))
+            openconnection.commit()
+            metrics.info(f"Checkpoint: {end:,}/{file_size:,} bytes, {rows_loaded:,} rows committed")
+        return rows_loaded
+
+    except Exception:
+        # The connection itself may be gone; the committed chunks are safe either way
+        if not openconnection.closed:
+            openconnection.rollback()
+        print("Load interrupted; rerun loadratings to resume from the last checkpoint")
+        raise
+    finally:
+        if cursor and not cursor.closed:
+            cursor.close()
+        if old_autocommit and not openconnection.closed:
+            openconnection.autocommit = True
+
+def copy_file_range(tablename, ratingsfilepath, start, end, conn_params, copy_format='csv'):
+    """
+    Worker for load_with_parallel_copy: stream one byte range of the file into
+    `tablename` over its own connection. Returns (rows, bytes) copied.
+    """
+    conn = psycopg2.connect(**conn_params)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SET synchronous_commit = OFF")
+        with open_copy_stream(ratingsfilepath, copy_format, start=start, end=end, progress_every=0) as stream:
+            cursor.copy_expert(copy_statement(tablename, copy_format), stream, size=COPY_READ_SIZE)
+            rows, bytes_read = stream.rows, stream.bytes_read
+        conn.commit()
+        cursor.close()
+        return rows, bytes_read
+    finally:
+        conn.close()
+
+def load_with_parallel_copy(ratingstablename, ratingsfilepath, openconnection, num_workers, copy_format='csv', direct=False):
+    """
+    Split the file into newline-aligned byte ranges (row ranges when reading
+    from the columnar cache) and COPY them concurrently, one process and
+    connection per range, into an unlogged staging table.
+    The staging rows are merged into the ratings table in a single statement.
+
+    With direct=True the ranges are copied straight into the ratings table,
+    which must be committed and have no primary key yet (duplicates are then
+    removed when the index pipeline builds the key).
+    """
+    staging_table = ratingstablename if direct else f"{ratingstablename}_staging"
+    cursor = openconnection.cursor()
+    try:
+        if copy_format == 'cached':
+            ranges = split_cached_rows(ratingsfilepath, num_workers)
+        else:
+            ranges = split_file_ranges(ratingsfilepath, num_workers)
+        print(f"Starting parallel COPY with {len(ranges)} workers...")
+
+        # Workers use their own connections, so the staging table must be committed first
+        if not direct:
+            cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+            cursor.execute(f"""
+                CREATE UNLOGGED TABLE {staging_table} (
+                    userid INT NOT NULL,
+                    movieid INT NOT NULL,
+                    rating FLOAT NOT NULL
+                )
+            """)
+            openconnection.commit()
+
+        conn_params = connection_params_of(openconnection)
+        total_rows = 0
+        copy_span = metrics.span('copy', table=staging_table, format=copy_format, workers=len(ranges))
+        with copy_span, ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [executor.submit(copy_file_range, staging_table, ratingsfilepath, start, end, conn_params, copy_format)
+                       for start, end in ranges]
+            for i, future in enumerate(futures):
+                rows, bytes_read = future.result()
+                total_rows += rows
+                metrics.count('rows_streamed', rows, format=copy_format)
+                metrics.count('bytes_streamed', bytes_read, format=copy_format)
+                metrics.info(f"Range {i+1}/{len(ranges)} copied: {rows:,} records")
+
+        if direct:
+            print(f"Copied {total_rows:,} records straight into {ratingstablename}")
+            return True
+
+        set_bulk_settings(cursor)
+        cursor.execute(f"""
+            INSERT INTO {ratingstablename} (userid, movieid, rating)
+            SELECT userid, movieid, rating FROM {staging_table}
+            ON CONFLICT (userid, movieid) DO NOTHING
+        """)
+        print(f"Merged {cursor.rowcount:,} of {total_rows:,} staged records")
+        cursor.execute(f"DROP TABLE {staging_table}")
+        openconnection.commit()
+        return True
+
+    except Exception as e:
+        print(f"Parallel COPY failed: {e}")
+        try:
+            openconnection.rollback()
+            # Ranges that did commit must not be loaded twice by the fallback
+            cursor.execute(f"TRUNCATE {staging_table}" if direct else f"DROP TABLE IF EXISTS {staging_table}")
+            openconnection.commit()
+        except:
+            pass
+        return False
+    finally:
+        cursor.close()
+
 def load_with_parallel_insert(ratingstablename, ratingsfilepath, openconnection):
     """
     Parallel processing method using multiple threads for batch inserts
@@ -186,75 +525,66 @@ def load_with_parallel_insert(ratingstablename, ratingsfilepath, openconnection)
     num_threads = min(multiprocessing.cpu_count(), 4)  # Limit to 4 threads to avoid overwhelming DB
     batch_size = 100000  # Larger batch size for parallel processing
     
-    # First, read file and split into chunks
-    chunks = []
-    current_chunk = []
+    # Parse the file into compact column batches as the workers need them; tuples are
+    # only built per chunk in the workers
+    chunks = rating_batches(ratingsfilepath, batch_size)
     
-    with open(ratingsfilepath, 'r', encoding='utf-8', buffering=8192*8) as f:
-        for line_num, line in enumerate(f, 1):
-            if line_num % 1000000 == 0:
-                print(f"Reading: {line_num:,} lines...")
-            
-            try:
-                parts = line.strip().split('::')
-                if len(parts) >= 3:
-                    userid, movieid, rating = parts[0], parts[1], parts[2]
-                    current_chunk.append((int(userid), int(movieid), float(rating)))
-                    
-                    if len(current_chunk) >= batch_size:
-                        chunks.append(current_chunk)
-                        current_chunk = []
-            except (ValueError, IndexError):
-                continue  # Skip malformed lines
+    # Threads insert over their own connections, so the table must be committed first
+    openconnection.commit()
     
-    # Add remaining chunk
-    if current_chunk:
-        chunks.append(current_chunk)
-    
-    print(f"Created {len(chunks)} chunks for parallel processing")
+    # Threads check connections out of a pool for the same database as openconnection
+    pool = get_pool(connection_params_of(openconnection))
     
     # Process chunks in parallel
-    def process_chunk(chunk_data):
+    def process_chunk(chunk):
         try:
-            # Create a new connection for this thread
-            conn_params = openconnection.get_dsn_parameters()
-            thread_conn = psycopg2.connect(**conn_params)
-            thread_cursor = thread_conn.cursor()
-            
-            # Insert the chunk
-            psycopg2.extras.execute_values(
-                thread_cursor,
-                f"""
-                INSERT INTO {ratingstablename} (userid, movieid, rating)
-                VALUES %s
-                ON CONFLICT (userid, movieid) DO UPDATE 
-                SET rating = EXCLUDED.rating
-                """,
-                chunk_data,
-                template=None,
-                page_size=10000
-            )
+            chunk_data = batch_rows(chunk)
             
-            thread_conn.commit()
-            thread_cursor.close()
-            thread_conn.close()
+            with pool.connection() as thread_conn, thread_conn.cursor() as thread_cursor:
+                # Insert the chunk
+                statement_start = time.perf_counter()
+                set_bulk_settings(thread_cursor)
+                psycopg2.extras.execute_values(
+                    thread_cursor,
+                    f"""
+                    INSERT INTO {ratingstablename} (userid, movieid, rating)
+                    VALUES %s
+                    ON CONFLICT (userid, movieid) DO UPDATE 
+                    SET rating = EXCLUDED.rating
+                    """,
+                    chunk_data,
+                    template=None,
+                    page_size=10000
+                )
+            metrics.observe('statement_seconds', time.perf_counter() - statement_start, statement='insert_batch')
             return len(chunk_data)
             
         except Exception as e:
             print(f"Error in thread processing: {e}")
             return 0
     
-    # Execute parallel processing
+    # Execute parallel processing, with at most one chunk in flight per thread so that
+    # only num_threads parsed chunks are held in memory at a time
     total_processed = 0
+    completed = 0
+    in_flight = deque()
+    
+    def collect(future):
+        nonlocal total_processed, completed
+        processed = future.result()
+        total_processed += processed
+        completed += 1
+        metrics.info(f"Chunk {completed} processed: {processed:,} records")
+    
     with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        futures = [executor.submit(process_chunk, chunk) for chunk in chunks]
-        
-        for i, future in enumerate(futures):
-            processed = future.result()
-            total_processed += processed
-            print(f"Chunk {i+1}/{len(chunks)} processed: {processed:,} records")
+        for chunk in chunks:
+            if len(in_flight) >= num_threads:
+                collect(in_flight.popleft())
+            in_flight.append(executor.submit(process_chunk, chunk))
+        while in_flight:
+            collect(in_flight.popleft())
     
-    print(f"Parallel processing completed: {total_processed:,} records")
+    print(f"Parallel processing completed: {completed} chunks, {total_processed:,} records")
 
 def load_with_batch_insert(ratingstablename, ratingsfilepath, openconnection):
     """
@@ -262,36 +592,30 @@ def load_with_batch_insert(ratingstablename, ratingsfilepath, openconnection):
     """
     cursor = openconnection.cursor()
     batch_size = 75000  # Optimized batch size
-    batch = []
     count = 0
+    old_autocommit = openconnection.autocommit
     
     print("Using optimized batch insert method...")
     
-    with open(ratingsfilepath, 'r', encoding='utf-8', buffering=8192*8) as f:
-        for line_num, line in enumerate(f, 1):
-            if line_num % 500000 == 0:
-                print(f"Processed {line_num:,} lines...")
-            
-            try:
-                parts = line.strip().split('::')
-                if len(parts) >= 3:
-                    userid, movieid, rating = parts[0], parts[1], parts[2]
-                    batch.append((int(userid), int(movieid), float(rating)))
-                    count += 1
-                    
-                    # Insert in optimized batches
-                    if len(batch) >= batch_size:
-                        insert_batch_optimized(cursor, ratingstablename, batch)
-                        openconnection.commit()  # Commit each batch
-                        batch = []
-                        
-            except (ValueError, IndexError):
-                continue  # Skip malformed lines
-        
-        # Insert remaining batch
-        if batch:
-            insert_batch_optimized(cursor, ratingstablename, batch)
-            openconnection.commit()
+    try:
+        # One transaction per batch, so its pages share the bulk settings and one commit
+        if old_autocommit:
+            openconnection.autocommit = False
+        for batch in rating_batches(ratingsfilepath, batch_size):
+            statement_start = time.perf_counter()
+            set_bulk_settings(cursor)
+            insert_batch_optimized(cursor, ratingstablename, batch_rows(batch))
+            metrics.observe('statement_seconds', time.perf_counter() - statement_start, statement='insert_batch')
+            openconnection.commit()  # Commit each batch
+            previous, count = count, count + len(batch.userid)
+            if count // 500000 > previous // 500000:
+                metrics.info(f"Processed {count:,} lines...")
+    except Exception:
+        openconnection.rollback()
+        raise
+    finally:
+        if old_autocommit:
+            openconnection.autocommit = True
     
     print(f"Processed {count:,} records using optimized batch insert")
 
@@ -312,61 +636,17 @@ def insert_batch_optimized(cursor, table_name, batch):
         page_size=15000  # Larger page size for better performance
     )
 
-def create_indexes_safely(ratingstablename, openconnection):
+def create_indexes_safely(ratingstablename, openconnection, primary_key=False):
     """
-    Create indexes safely, handling CONCURRENTLY requirement
+    Build the ratings table indexes in parallel through the index pipeline,
+    including the (userid, movieid) primary key when the load deferred it.
+    Returns {index: seconds}. A failed secondary index is reported and
+    skipped; a primary key that cannot be built is an error.
     """
-    old_autocommit = getattr(openconnection, 'autocommit', False)
     try:
-        # Set autocommit mode for CONCURRENT index creation
-        openconnection.autocommit = True
-        cursor = openconnection.cursor()
-        indexes = [
-            f"CREATE INDEX CONCURRENTLY idx_{ratingstablename}_userid ON {ratingstablename}(userid)",
-            f"CREATE INDEX CONCURRENTLY idx_{ratingstablename}_movieid ON {ratingstablename}(movieid)", 
-            f"CREATE INDEX CONCURRENTLY idx_{ratingstablename}_rating ON {ratingstablename}(rating)"
-        ]
-        for idx_sql in indexes:
-            print(f"Creating index: {idx_sql}")
-            try:
-                cursor.execute(idx_sql)
-            except Exception as e:
-                print(f"Concurrent index creation failed: {e}")
-                # Fallback: try regular index creation (not concurrently)
-                try:
-                    fallback_sql = idx_sql.replace("CONCURRENTLY ", "")
-                    cursor.execute(fallback_sql)
-                    print(f"Regular index creation succeeded: {fallback_sql}")
-                except Exception as e2:
-                    print(f"Regular index creation also failed: {e2}")
-        cursor.close()
+        return build_indexes(ratings_index_jobs(ratingstablename, primary_key), connection_params_of(openconnection))
     except Exception as e:
         print(f"Error in index creation: {e}")
-        print(f"Fallback index creation failed: {e}")
-    finally:
-        try:
-            openconnection.autocommit = old_autocommit
-        except Exception:
-            pass
-
-def reset_db_settings(cursor):
-    """
-    Reset PostgreSQL settings to default values
-    """
-    reset_settings = [
-        "SET synchronous_commit = ON",
-        "RESET maintenance_work_mem",
-        "RESET work_mem",
-        "RESET commit_delay", 
-        "RESET commit_siblings",
-        "RESET temp_buffers",
-        "RESET effective_cache_size"
-    ]
-    
-    for setting in reset_settings:
-        try:
-            cursor.execute(setting)
-        except Exception as e:
-            print(f"Warning: Could not reset '{setting}': {e}")
-    
-    print("Database settings reset completed")
+        if primary_key:
+            raise
+        return {}
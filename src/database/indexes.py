@@ -0,0 +1,144 @@
+import multiprocessing
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2.errors
+from config.config import DatabaseConfig
+from database.pool import get_pool
+from utils import metrics
+
+# One index of the pipeline: `build_sql` runs on its own build connection,
+# `finish_sql` (if any) runs once every build is done, and `dedupe_sql` (if any)
+# removes duplicate keys before a unique build that failed on them is retried
+IndexJob = namedtuple('IndexJob', ['label', 'build_sql', 'finish_sql', 'dedupe_sql'])
+
+def primary_key_job(tablename, columns, dedupe=False):
+    """
+    Primary key of `tablename`, built as a plain unique index so it only blocks
+    writes and can run next to the table's other index builds. finish_sql then
+    promotes it with ADD CONSTRAINT ... USING INDEX, which does not rescan.
+    With dedupe, the first row of each key (in physical order, i.e. file order
+    for a serial COPY) is kept, as the ON CONFLICT DO NOTHING loads do.
+    """
+    name = f"{tablename}_pkey"
+    column_sql = ', '.join(columns)
+    dedupe_sql = None
+    if dedupe:
+        dedupe_sql = f"""
+            DELETE FROM {tablename} WHERE ctid = ANY(ARRAY(
+                SELECT ctid FROM (
+                    SELECT ctid, ROW_NUMBER() OVER (PARTITION BY {column_sql} ORDER BY ctid) AS copy
+                    FROM {tablename}
+                ) numbered WHERE copy > 1
+            ))
+        """
+    return IndexJob(name, f"CREATE UNIQUE INDEX {name} ON {tablename} ({column_sql})",
+                    f"ALTER TABLE {tablename} ADD CONSTRAINT {name} PRIMARY KEY USING INDEX {name}", dedupe_sql)
+
+def ratings_index_jobs(ratingstablename, primary_key=True):
+    """Jobs for the ratings table: the (userid, movieid) key when it was deferred, then one index per column"""
+    jobs = [primary_key_job(ratingstablename, ['userid', 'movieid'], dedupe=True)] if primary_key else []
+    for column in ('userid', 'movieid', 'rating'):
+        name = f"idx_{ratingstablename}_{column}"
+        jobs.append(IndexJob(name, f"CREATE INDEX IF NOT EXISTS {name} ON {ratingstablename} ({column})", None, None))
+    return jobs
+
+def partition_index_jobs(strategy, tablenames):
+    """
+    Jobs for partition children: round robin children get their
+    (UserID, MovieID, Rating) primary key, range children an index on userid
+    and movieid for the lookups that cannot be pruned by rating.
+    """
+    jobs = []
+    for table in tablenames:
+        if strategy == 'roundrobin':
+            jobs.append(primary_key_job(table, ['UserID', 'MovieID', 'Rating']))
+        else:
+            for column in ('userid', 'movieid'):
+                # Unnamed, so the index follows its table through repartition renames
+                jobs.append(IndexJob(f"{table}({column})", f"CREATE INDEX ON {table} ({column})", None, None))
+    return jobs
+
+def index_statements(jobs):
+    """The jobs as plain statements for one connection, e.g. for a table that is still empty"""
+    return [sql for job in jobs for sql in (job.build_sql, job.finish_sql) if sql]
+
+def index_session_settings(connections):
+    """
+    Settings for each of `connections` concurrent builds: they split the
+    maintenance_work_mem budget and the cores between them, each build leading
+    max_parallel_maintenance_workers helper processes. They are SET LOCAL, so
+    they end with the build's transaction and the pooled connection goes back
+    with the server defaults.
+    """
+    memory_mb = max(64, DatabaseConfig.get_index_memory_mb() // connections)
+    parallel_workers = max(0, multiprocessing.cpu_count() // connections - 1)
+    return [
+        f"SET LOCAL maintenance_work_mem = '{memory_mb}MB'",
+        f"SET LOCAL max_parallel_maintenance_workers = {parallel_workers}",
+        "SET LOCAL synchronous_commit = OFF"
+    ]
+
+def _build_index(job, pool, settings):
+    """Worker of build_indexes: run one job's build in a transaction on a pooled connection, returning its seconds"""
+    with pool.connection() as conn, conn.cursor() as cursor:
+        for setting in settings:
+            cursor.execute(setting)
+        start_time = time.perf_counter()
+        try:
+            cursor.execute(job.build_sql)
+        except psycopg2.errors.UniqueViolation:
+            if not job.dedupe_sql:
+                raise
+            conn.rollback()
+            for setting in settings:
+                cursor.execute(setting)
+            cursor.execute(job.dedupe_sql)
+            print(f"Removed {cursor.rowcount:,} duplicate keys before building {job.label}")
+            cursor.execute(job.build_sql)
+        seconds = time.perf_counter() - start_time
+    metrics.observe('statement_seconds', seconds, statement='create_index')
+    return seconds
+
+def build_indexes(jobs, conn_params, connections=None):
+    """
+    Build the index `jobs` in parallel, on up to `connections` connections
+    checked out of the shared pool (default
+    DatabaseConfig.get_index_connections(), at most the pool size). Builds are
+    plain CREATE INDEX, not CONCURRENTLY: the tables were just filled and
+    nobody else writes to them yet, so the single-pass build is the right one.
+    The caller must have committed the tables.
+
+    Prints and returns the build time of every index as {label: seconds}.
+    If a build fails, the others still finish and the first error is raised.
+    """
+    if not jobs:
+        return {}
+    pool = get_pool(conn_params)
+    connections = min(len(jobs), connections or DatabaseConfig.get_index_connections(), pool.maxconn)
+    settings = index_session_settings(connections)
+    print(f"Building {len(jobs)} indexes on {connections} connections "
+          f"({settings[0][len('SET LOCAL '):]}, {settings[1][len('SET LOCAL '):]})...")
+    with metrics.span('index_pipeline') as pipeline_span:
+        timings, errors = {}, []
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            futures = [(job, executor.submit(_build_index, job, pool, settings)) for job in jobs]
+            for job, future in futures:
+                try:
+                    timings[job.label] = future.result()
+                    metrics.info(f"Built {job.label} in {timings[job.label]:.2f} seconds")
+                except Exception as e:
+                    print(f"Building {job.label} failed: {e}")
+                    errors.append(e)
+
+        finish_sql = [job.finish_sql for job in jobs if job.finish_sql and job.label in timings]
+        if finish_sql:
+            with pool.connection() as conn, conn.cursor() as cursor:
+                for sql in finish_sql:
+                    cursor.execute(sql)
+
+    print(f"Index pipeline finished in {pipeline_span.seconds:.2f} seconds")
+    if errors:
+        raise errors[0]
+    return timings
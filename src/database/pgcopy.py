@@ -0,0 +1,70 @@
+import struct
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, rows are packed one by one without it
+    np = None
+
+# PostgreSQL binary COPY framing: signature, flags field, header extension length
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('!h', -1)
+
+# One ratings tuple: field count, then (length, value) for INT, INT, FLOAT (float8)
+RATING_ROW = struct.Struct('!hiiiiid')
+
+if np is not None:
+    RATING_ROW_DTYPE = np.dtype([('fields', '>i2'), ('userid_len', '>i4'), ('userid', '>i4'),
+                                 ('movieid_len', '>i4'), ('movieid', '>i4'),
+                                 ('rating_len', '>i4'), ('rating', '>f8')])
+
+class BinaryCopyEncoder:
+    """
+    Packs (userid, movieid, rating) tuples into binary COPY row data.
+
+    The output buffer is allocated once and reused by every encode() call; it
+    only grows when a batch is larger than any batch seen before.
+    """
+
+    def __init__(self, batch_size=65536):
+        self._buffer = bytearray(RATING_ROW.size * batch_size)
+
+    def _reserve(self, rows):
+        needed = RATING_ROW.size * rows
+        if needed > len(self._buffer):
+            self._buffer = bytearray(needed)
+
+    def encode(self, rows):
+        """
+        Encode a sequence of tuples and return a memoryview over the reused
+        buffer. The view is only valid until the next encode() call.
+        """
+        self._reserve(len(rows))
+        buffer = self._buffer
+        pack_into = RATING_ROW.pack_into
+        size = RATING_ROW.size
+        offset = 0
+        for userid, movieid, rating in rows:
+            pack_into(buffer, offset, 3, 4, userid, 4, movieid, 8, rating)
+            offset += size
+        return memoryview(buffer)[:offset]
+
+    def encode_columns(self, batch):
+        """
+        Encode a RatingsBatch (see utils.ratings_parser) column-wise. With numpy
+        the columns are written into the reused buffer through a structured view
+        instead of packing row by row.
+        """
+        rows = len(batch.userid)
+        if np is None or not isinstance(batch.userid, np.ndarray):
+            return self.encode(list(zip(batch.userid, batch.movieid, batch.rating)))
+
+        self._reserve(rows)
+        view = np.frombuffer(self._buffer, dtype=RATING_ROW_DTYPE, count=rows)
+        view['fields'] = 3
+        view['userid_len'] = 4
+        view['userid'] = batch.userid
+        view['movieid_len'] = 4
+        view['movieid'] = batch.movieid
+        view['rating_len'] = 8
+        view['rating'] = batch.rating
+        return memoryview(self._buffer)[:RATING_ROW.size * rows]
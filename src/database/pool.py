@@ -0,0 +1,154 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+from config.config import DatabaseConfig
+
+# Settings for bulk loading and partitioning. They trade crash safety of
+# recent commits for speed, so they are SET LOCAL in the transactions doing the
+# bulk work (see set_bulk_settings) and never outlive them on a pooled connection
+BULK_SETTINGS = [
+    "SET LOCAL maintenance_work_mem = '512MB'",
+    "SET LOCAL work_mem = '128MB'",
+    "SET LOCAL synchronous_commit = OFF",
+    "SET LOCAL effective_cache_size = '512MB'"
+]
+
+# Connections idle in the pool for longer than this are pinged before reuse
+HEALTH_CHECK_IDLE_SECONDS = 30
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def set_bulk_settings(cursor):
+    """
+    Apply BULK_SETTINGS to the cursor's current transaction in one round trip.
+    They end with its commit or rollback, so nothing is committed here and
+    nothing has to be reset. Skipped on an autocommit connection outside an
+    explicit BEGIN, where they would not outlive this statement.
+    """
+    conn = cursor.connection
+    if conn.autocommit and conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        return
+    cursor.execute("; ".join(BULK_SETTINGS))
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections to one database.
+
+    Checkout blocks while all `maxconn` connections are in use. Pooled
+    connections keep the server defaults (bulk work sets its settings per
+    transaction, see set_bulk_settings); a connection that was idle for
+    HEALTH_CHECK_IDLE_SECONDS is pinged on checkout and replaced if broken.
+
+        with pool.connection() as conn:
+            ...  # committed on success, rolled back on error
+    """
+
+    def __init__(self, minconn=None, maxconn=None, conn_params=None):
+        default_min, default_max = DatabaseConfig.get_pool_size()
+        self.minconn = default_min if minconn is None else minconn
+        self.maxconn = max(1, self.minconn, default_max if maxconn is None else maxconn)
+        self.conn_params = conn_params or DatabaseConfig.get_connection_params()
+        self._available = threading.BoundedSemaphore(self.maxconn)
+        self._lock = threading.Lock()
+        self._returned_at = {}
+        self._pool = psycopg2.pool.ThreadedConnectionPool(0, self.maxconn, **self.conn_params)
+        for _ in range(self.minconn):
+            self.putconn(self.getconn())
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        with self._lock:
+            returned_at = self._returned_at.pop(id(conn), None)
+        if returned_at is None or time.time() - returned_at < HEALTH_CHECK_IDLE_SECONDS:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            if not conn.autocommit:
+                conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self, timeout=None):
+        """Check out a healthy connection, waiting up to `timeout` seconds for a free one"""
+        if not self._available.acquire(timeout=-1 if timeout is None else timeout):
+            raise psycopg2.pool.PoolError(f"No free connection within {timeout} seconds")
+        try:
+            while True:
+                conn = self._pool.getconn()
+                if self._is_healthy(conn):
+                    return conn
+                print("Discarding broken pooled connection")
+                self._pool.putconn(conn, close=True)
+        except Exception:
+            self._available.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        """Return a connection; an open transaction is rolled back first"""
+        try:
+            if not close and not conn.closed:
+                status = conn.info.transaction_status
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+        except psycopg2.Error:
+            close = True
+        try:
+            if not close and not conn.closed:
+                with self._lock:
+                    self._returned_at[id(conn)] = time.time()
+            self._pool.putconn(conn, close=close or conn.closed)
+        finally:
+            self._available.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Checkout as a context manager: commit on success, roll back on error, always return"""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+            if not conn.closed and not conn.autocommit:
+                conn.commit()
+        except Exception:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+            raise
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        self._pool.closeall()
+        with self._lock:
+            self._returned_at.clear()
+
+def get_pool(conn_params=None):
+    """
+    Shared pool for a database, created on first use. Without `conn_params`
+    the connection settings come from DatabaseConfig.
+    """
+    key = tuple(sorted((conn_params or {}).items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(conn_params=conn_params)
+            _pools[key] = pool
+        return pool
+
+def close_pools():
+    """Close every shared pool, e.g. at program exit"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.closeall()
+        _pools.clear()
@@ -6,19 +6,26 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 env_path = os.path.join(project_root, '.env')
 load_dotenv(env_path)
 
-from database.database import get_connection, loadratings
+from database.database import loadratings, loadratings_stream
+from database.pool import get_pool, close_pools
 from partitioning.partitioning import rangepartition, roundrobinpartition, rangeinsert, roundrobininsert
-from utils.utils import download_movielens_dataset
+from utils.utils import stream_movielens_ratings, EXTRACT_PATH
 
 def main():
     ratings_table_name = "ratings"
 
+    conn = None
     try:
-        conn = get_connection()
+        pool = get_pool()
+        conn = pool.getconn()
 
-        ratings_path = download_movielens_dataset()
-
-        loadratings(ratings_table_name, ratings_path, conn)
+        # A ratings.dat extracted by an earlier run loads fastest with parallel COPY;
+        # otherwise it is streamed out of the zip while downloading, without extracting
+        ratings_path = os.path.join(EXTRACT_PATH, "ratings.dat")
+        if os.path.exists(ratings_path):
+            loadratings(ratings_table_name, ratings_path, conn)
+        else:
+            loadratings_stream(ratings_table_name, stream_movielens_ratings(), conn)
 
         # Input number of partitions for range partitioning
         number_of_partitions_range = int(input("Enter number of partitions for RANGE partitioning: "))
@@ -57,8 +64,9 @@ def main():
         traceback.print_exc()
     finally:
         if conn:
-            conn.close()
-            print("\nDatabase connection closed.")
+            pool.putconn(conn)
+        close_pools()
+        print("\nDatabase connection closed.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
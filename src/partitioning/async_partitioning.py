@@ -0,0 +1,197 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+from database.pool import get_pool
+from partitioning.partitioning import (rangepartition, roundrobinpartition, hashpartition,
+                                       rangeinsert_many, roundrobininsert_many)
+from partitioning.repartition import repartition
+
+# Largest number of rows one flush hands to rangeinsert_many / roundrobininsert_many
+ASYNC_BATCH_ROWS = 5000
+# How long the first pending row waits for more rows to share its batch
+ASYNC_LINGER_SECONDS = 0.005
+# Errors caused by the rows themselves; a batch failing with one is bisected to
+# find them, any other error (connection, missing table) fails the whole batch
+ROW_ERRORS = (psycopg2.IntegrityError, psycopg2.DataError, TypeError, ValueError)
+
+class _InsertBatcher:
+    """
+    Collects single-row inserts from many coroutines and writes them with one
+    *_many call per batch. Each caller's await completes when its batch commits.
+    A batch that fails because of its rows is split in halves and retried, so
+    only the callers of the offending rows get the exception.
+    """
+
+    def __init__(self, partitioner, insert_many):
+        self._partitioner = partitioner
+        self._insert_many = insert_many
+        self._queue = asyncio.Queue()
+        self._flushes = set()
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = asyncio.ensure_future(self._collect())
+
+    async def submit(self, row):
+        future = asyncio.get_running_loop().create_future()
+        self._pending += 1
+        self._idle.clear()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _collect(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self._queue.qsize() < self._partitioner.batch_size - 1:
+                await asyncio.sleep(self._partitioner.linger)
+            while len(batch) < self._partitioner.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            # Flush in the background so the next batch can fill in the meantime
+            flush = asyncio.ensure_future(self._flush(batch))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch):
+        try:
+            await self._write(batch)
+        finally:
+            self._pending -= len(batch)
+            if not self._pending:
+                self._idle.set()
+
+    async def _write(self, batch):
+        """One *_many call for the batch; a row error splits it in halves until the failing rows are alone"""
+        try:
+            await self._partitioner.run(self._insert_many, self._partitioner.ratingstablename,
+                                        [row for row, _ in batch])
+        except ROW_ERRORS as e:
+            if len(batch) == 1:
+                self._fail(batch, e)
+                return
+            middle = len(batch) // 2
+            await self._write(batch[:middle])
+            await self._write(batch[middle:])
+        except Exception as e:
+            self._fail(batch, e)
+        else:
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(None)
+
+    @staticmethod
+    def _fail(batch, error):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def close(self):
+        # Let submits already scheduled on the loop queue their rows, then wait for them
+        await asyncio.sleep(0)
+        await self._idle.wait()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+class AsyncPartitioner:
+    """
+    asyncio front end for partitioning.py on top of the shared connection pool.
+
+    Blocking psycopg2 calls run on a thread pool no larger than the connection
+    pool, and a semaphore bounds how many statements are in flight. Single-row
+    inserts from any number of coroutines are coalesced into batched
+    rangeinsert_many / roundrobininsert_many calls, so thousands of pending
+    writes need neither a thread nor a connection each. A batch commits as a
+    whole; when a row in it violates a constraint or holds a bad value, the
+    batch is bisected and retried so only that row's insert fails.
+
+        async with AsyncPartitioner('ratings') as partitioner:
+            await partitioner.rangepartition(5)
+            await asyncio.gather(*(partitioner.rangeinsert(u, m, r) for u, m, r in rows))
+    """
+
+    def __init__(self, ratingstablename='ratings', pool=None, max_in_flight=None,
+                 batch_size=ASYNC_BATCH_ROWS, linger=ASYNC_LINGER_SECONDS):
+        self.ratingstablename = ratingstablename
+        self.pool = pool or get_pool()
+        self.max_in_flight = min(max_in_flight or self.pool.maxconn, self.pool.maxconn)
+        self.batch_size = batch_size
+        self.linger = linger
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        self._in_flight = None
+        self._batchers = {}
+
+    def _call(self, func, args, kwargs):
+        with self.pool.connection() as conn:
+            return func(*args, conn, **kwargs)
+
+    async def run(self, func, *args, **kwargs):
+        """Run func(*args, <pooled connection>, **kwargs) on a worker thread"""
+        if self._in_flight is None:
+            self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        async with self._in_flight:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._call, func, args, kwargs)
+
+    def _batcher(self, insert_many):
+        batcher = self._batchers.get(insert_many)
+        if batcher is None:
+            batcher = _InsertBatcher(self, insert_many)
+            self._batchers[insert_many] = batcher
+        return batcher
+
+    async def rangepartition(self, numberofpartitions, native=False):
+        return await self.run(rangepartition, self.ratingstablename, numberofpartitions, native=native)
+
+    async def roundrobinpartition(self, numberofpartitions, native=False):
+        return await self.run(roundrobinpartition, self.ratingstablename, numberofpartitions, native=native)
+
+    async def hashpartition(self, numberofpartitions, key, native=False):
+        return await self.run(hashpartition, self.ratingstablename, numberofpartitions, key, native=native)
+
+    async def repartition(self, strategy, numberofpartitions):
+        return await self.run(repartition, strategy, numberofpartitions, ratingstablename=self.ratingstablename)
+
+    async def rangeinsert(self, userid, movieid, rating):
+        """Insert one rating; returns once the batch it was grouped into has committed"""
+        return await self._batcher(rangeinsert_many).submit((userid, movieid, rating))
+
+    async def roundrobininsert(self, userid, movieid, rating):
+        """Insert one rating; returns once the batch it was grouped into has committed"""
+        return await self._batcher(roundrobininsert_many).submit((userid, movieid, rating))
+
+    async def rangeinsert_many(self, rows):
+        return await self.run(rangeinsert_many, self.ratingstablename, list(rows))
+
+    async def roundrobininsert_many(self, rows):
+        return await self.run(roundrobininsert_many, self.ratingstablename, list(rows))
+
+    async def scatter(self, sql, tablenames, params=None):
+        """
+        Run `sql` once per table concurrently, `{table}` replaced by the table
+        name, and return {table: fetched rows}.
+        """
+        def fetch(table, conn):
+            with conn.cursor() as cursor:
+                cursor.execute(sql.format(table=table), params)
+                return cursor.fetchall()
+
+        results = await asyncio.gather(*(self.run(fetch, table) for table in tablenames))
+        return dict(zip(tablenames, results))
+
+    async def close(self):
+        """Wait for pending inserts, then release the worker threads"""
+        for batcher in self._batchers.values():
+            await batcher.close()
+        self._batchers.clear()
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
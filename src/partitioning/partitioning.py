@@ -1,167 +1,540 @@
 import psycopg2
+import psycopg2.extras
 import traceback
 import time
+from concurrent.futures import ThreadPoolExecutor
+from config.config import DatabaseConfig
+from database.database import connection_params_of
+from database.indexes import build_indexes, partition_index_jobs
+from database.pool import get_pool, set_bulk_settings
+from partitioning.range_router import RangeRouter
+from utils import metrics
 
 RANGE_TABLE_PREFIX = 'range_part'
 RROBIN_TABLE_PREFIX = 'rrobin_part'
+HASH_TABLE_PREFIX = 'hash_part'
 USER_ID_COLNAME = 'userid'
 MOVIE_ID_COLNAME = 'movieid'
 RATING_COLNAME = 'rating'
+HASH_KEY_COLUMNS = (USER_ID_COLNAME, MOVIE_ID_COLNAME)
 
-def rangepartition(ratingstablename, numberofpartitions, openconnection):
+# Fibonacci hashing: multiply by 2^32 / golden ratio, keep the low 32 bits and
+# take their high half. Written so SQL and Python compute the same value.
+HASH_MULTIPLIER = 2654435761
+
+# Rows per multi-row INSERT statement in the *_many batch APIs
+INSERT_PAGE_SIZE = 10000
+
+# One row per strategy with the progress of its latest repartition (partitioning/repartition.py)
+REPARTITION_PROGRESS_TABLE = 'repartition_progress'
+
+# In-process cache of the RangeRouter stored in range_metadata, per database
+# (connection dsn), as (generation, router). Every rangepartition and
+# repartition stores a new generation from range_metadata_generation_seq, so a
+# cached router is reused only while its generation is still the stored one,
+# even when another process rebuilt the partitions.
+_range_router_cache = {}
+
+def range_parent_name(ratingstablename):
+    """Partitioned parent of range_partI: temporary router, or kept in native mode"""
+    return f"{ratingstablename}_range"
+
+def rrobin_parent_name(ratingstablename):
+    """Partitioned parent of rrobin_partI: temporary router, or kept in native mode"""
+    return f"{ratingstablename}_rrobin"
+
+def hash_parent_name(ratingstablename):
+    """Partitioned parent of hash_partI: temporary router, or kept in native mode"""
+    return f"{ratingstablename}_hash"
+
+def repartition_moves_name(strategy):
+    """Work table of an in-progress repartition: rows still to move, as (source, ctid, target)"""
+    return f"{strategy}_repartition_moves"
+
+def retired_partition_name(prefix, i):
+    """Name an old partition that has no place in a repartitioned layout keeps until it is drained"""
+    return f"{prefix}{i}_old"
+
+def discard_repartition(strategy, prefix, cursor):
+    """Forget an unfinished repartition of `strategy`: a full rebuild replaces its partitions"""
+    cursor.execute(f"DROP TABLE IF EXISTS {repartition_moves_name(strategy)}")
+    cursor.execute("SELECT tablename FROM pg_tables WHERE schemaname = current_schema() AND tablename ~ %s",
+                   (f"^{prefix}[0-9]+_old$",))
+    for (tablename,) in cursor.fetchall():
+        cursor.execute(f"DROP TABLE {tablename}")
+    cursor.execute(f"SELECT to_regclass('{REPARTITION_PROGRESS_TABLE}') IS NOT NULL")
+    if cursor.fetchone()[0]:
+        cursor.execute(f"DELETE FROM {REPARTITION_PROGRESS_TABLE} WHERE strategy = %s AND finished_at IS NULL",
+                       (strategy,))
+
+def hash_slot_sql(key, numberofpartitions):
+    """SQL expression computing the hash partition of column `key`"""
+    return f"((({key}::BIGINT * {HASH_MULTIPLIER}) & 4294967295) >> 16) % {numberofpartitions}"
+
+def hashpartition_for(keyvalue, numberofpartitions):
+    """Index of the hash partition holding `keyvalue`; matches hash_slot_sql"""
+    return (((int(keyvalue) * HASH_MULTIPLIER) & 0xFFFFFFFF) >> 16) % numberofpartitions
+
+def invalidate_range_router(openconnection=None):
+    """Forget cached range bounds for one connection's database, or for all"""
+    if openconnection is None:
+        _range_router_cache.clear()
+    else:
+        _range_router_cache.pop(openconnection.dsn, None)
+
+def get_range_router(openconnection):
+    """
+    RangeRouter of the current range partitions. The bounds are read from
+    range_metadata once and then served from memory; each use only checks
+    that the stored generation has not changed since.
+    """
+    cached = _range_router_cache.get(openconnection.dsn)
+    with openconnection.cursor() as cursor:
+        if cached is not None:
+            cursor.execute("SELECT generation FROM range_metadata WHERE id = 1")
+            row = cursor.fetchone()
+            if row and row[0] == cached[0]:
+                return cached[1]
+
+        cursor.execute("SELECT to_regclass('range_metadata') IS NOT NULL")
+        row = None
+        if cursor.fetchone()[0]:
+            cursor.execute("SELECT generation, bounds, native FROM range_metadata WHERE id = 1")
+            row = cursor.fetchone()
+    if not row:
+        invalidate_range_router(openconnection)
+        raise Exception("No range partitions found. Please run rangepartition first.")
+
+    generation, bounds, native = row
+    router = RangeRouter(bounds, native)
+    _range_router_cache[openconnection.dsn] = (generation, router)
+    return router
+
+def partition_persistence_sql(ratingstablename, cursor):
+    """
+    'UNLOGGED ' when the ratings table was loaded in the fast durability mode
+    (see database.resolve_durability), else ''. Partition DDL is prefixed with
+    it, so the partitions follow the durability mode of the table they copy.
+    """
+    cursor.execute("SELECT relpersistence FROM pg_class WHERE oid = to_regclass(%s)", (ratingstablename,))
+    row = cursor.fetchone()
+    return 'UNLOGGED ' if row and row[0] == 'u' else ''
+
+def range_partition_ddl(partition_name, router_name, router, i, persistence=''):
+    """Statement creating range partition i under the PARTITION BY RANGE (rating) table `router_name`"""
+    lower_sql, upper_sql = router.partition_bound_sql(i)
+    return f"""
+        CREATE {persistence}TABLE {partition_name} PARTITION OF {router_name}
+        FOR VALUES FROM ({lower_sql}) TO ({upper_sql})
+    """
+
+def partition_blocks(numberofpartitions, workers):
+    """Split partition indexes 0..N-1 into at most `workers` contiguous (start, end) blocks"""
+    workers = max(1, min(workers, numberofpartitions))
+    bounds = [numberofpartitions * k // workers for k in range(workers + 1)]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+def _run_build_statements(pool, snapshot_id, statements):
+    """Worker of build_partitions_parallel: one transaction on the shared snapshot"""
+    with pool.connection() as conn:
+        old_autocommit = conn.autocommit
+        conn.autocommit = True
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot_id,))
+            # Every worker must see the rows in the same order for ROW_NUMBER() to agree
+            cursor.execute("SET LOCAL synchronize_seqscans = off")
+            cursor.execute("SET LOCAL max_parallel_workers_per_gather = 0")
+            set_bulk_settings(cursor)
+            for sql in statements:
+                cursor.execute(sql)
+            cursor.execute("COMMIT")
+        except Exception:
+            if not conn.closed:
+                cursor.execute("ROLLBACK")
+            raise
+        finally:
+            cursor.close()
+            conn.autocommit = old_autocommit
+
+def build_partitions_parallel(worker_statements, renames, openconnection):
+    """
+    Run each list in `worker_statements` on its own pooled connection, all
+    reading the same exported snapshot of the database. Every worker builds
+    its partitions under temporary `*_build` names and commits; then the
+    (build_name, final_name) `renames` are applied in one transaction on
+    `openconnection`, so the new partitions appear all at once. If any worker
+    fails, every build table is dropped and the error is raised.
+    """
+    openconnection.commit()
+    conn_params = connection_params_of(openconnection)
+    pool = get_pool(conn_params)
+
+    # Hold the snapshot open on a separate connection until every worker has imported it
+    snapshot_conn = psycopg2.connect(**conn_params)
+    snapshot_conn.autocommit = True
+    try:
+        snapshot_cursor = snapshot_conn.cursor()
+        snapshot_cursor.execute("BEGIN ISOLATION LEVEL REPEATABLE READ")
+        snapshot_cursor.execute("SELECT pg_export_snapshot()")
+        snapshot_id = snapshot_cursor.fetchone()[0]
+
+        with ThreadPoolExecutor(max_workers=min(len(worker_statements), pool.maxconn)) as executor:
+            futures = [executor.submit(_run_build_statements, pool, snapshot_id, statements)
+                       for statements in worker_statements]
+            errors = [future.exception() for future in futures]
+        snapshot_cursor.execute("ROLLBACK")
+    finally:
+        snapshot_conn.close()
+
+    cursor = openconnection.cursor()
+    try:
+        failed = [e for e in errors if e is not None]
+        if failed:
+            raise failed[0]
+        for build_name, final_name in renames:
+            cursor.execute(f"DROP TABLE IF EXISTS {final_name}")
+            cursor.execute(f"ALTER TABLE {build_name} RENAME TO {final_name}")
+        openconnection.commit()
+    except Exception:
+        openconnection.rollback()
+        for build_name, _ in renames:
+            cursor.execute(f"DROP TABLE IF EXISTS {build_name}")
+        openconnection.commit()
+        raise
+    finally:
+        cursor.close()
+
+def index_partitions(strategy, prefix, numberofpartitions, openconnection):
+    """Build the indexes of the committed children {prefix}0..N-1 through the parallel index pipeline"""
+    tablenames = [f"{prefix}{i}" for i in range(numberofpartitions)]
+    print(f"Indexing {numberofpartitions} {strategy} partitions...")
+    return build_indexes(partition_index_jobs(strategy, tablenames), connection_params_of(openconnection))
+
+def drop_router(router_name, openconnection):
+    """Remove a leftover temporary routing parent (and any still attached children)"""
+    try:
+        with openconnection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {router_name} CASCADE")
+        openconnection.commit()
+    except Exception:
+        openconnection.rollback()
+
+def rangepartition(ratingstablename, numberofpartitions, openconnection, native=False, workers=None):
     """
     Create range partitions for the ratings table.
+
+    With native=True the partitions stay attached to a declarative parent,
+    <ratings>_range (PARTITION BY RANGE (rating)), so inserts can go through
+    the parent and queries on it get partition pruning.
+
+    With workers > 1 (default DatabaseConfig.get_partition_workers()) the
+    partitions are built concurrently, each worker filling a contiguous block
+    of them over its own connection (see build_partitions_parallel).
     """
     print(f"\n--- Starting RANGE partitioning with {numberofpartitions} partitions ---")
+    workers = DatabaseConfig.get_partition_workers() if workers is None else workers
+    if workers > 1 and native:
+        print("Parallel build is not used in native mode; building through the parent")
+        workers = 1
+    old_autocommit = openconnection.autocommit
     cursor = openconnection.cursor()
 
     try:
-        # Drop old partitions safely
-        for i in range(numberofpartitions):
-            partition_name = f"{RANGE_TABLE_PREFIX}{i}"
-            try:
-                cursor.execute(f"DROP TABLE IF EXISTS {partition_name}")
-            except Exception as e:
-                print(f"Warning: Could not drop table {partition_name}: {e}")
-                openconnection.rollback()
+        with metrics.span('partition', strategy='range', partitions=numberofpartitions):
+            # One transaction creates and fills the partitions, which lets PostgreSQL
+            # skip WAL for them with wal_level = minimal (durable mode)
+            if old_autocommit:
+                openconnection.autocommit = False
+            # Drop old partitions safely
+            for i in range(numberofpartitions):
+                partition_name = f"{RANGE_TABLE_PREFIX}{i}"
+                try:
+                    cursor.execute(f"DROP TABLE IF EXISTS {partition_name}")
+                except Exception as e:
+                    print(f"Warning: Could not drop table {partition_name}: {e}")
+                    openconnection.rollback()
 
-        # Reset transaction
-        openconnection.commit()
+            discard_repartition('range', RANGE_TABLE_PREFIX, cursor)
 
-        # Get min and max rating
-        cursor.execute(f"SELECT MIN(rating), MAX(rating) FROM {ratingstablename}")
-        min_rating, max_rating = cursor.fetchone()
+            # Reset transaction
+            openconnection.commit()
+            set_bulk_settings(cursor)
 
-        # Calculate partition size
-        range_size = (max_rating - min_rating) / numberofpartitions
+            # Edges over the fixed rating domain, shared with rangeinsert and queries
+            range_router = RangeRouter.for_partitions(numberofpartitions, native=native)
 
-        for i in range (numberofpartitions):
-            partition_name = f"{RANGE_TABLE_PREFIX}{i}"
-            cursor.execute(f"DROP TABLE IF EXISTS {partition_name} CASCADE;")
+            for i in range (numberofpartitions):
+                partition_name = f"{RANGE_TABLE_PREFIX}{i}"
+                cursor.execute(f"DROP TABLE IF EXISTS {partition_name} CASCADE;")
 
-        for i in range(numberofpartitions):
-            partition_name = f"{RANGE_TABLE_PREFIX}{i}"
-            lower_bound = min_rating + i * range_size
-            upper_bound = min_rating + (i + 1) * range_size
+            router_name = range_parent_name(ratingstablename)
+            cursor.execute(f"DROP TABLE IF EXISTS {router_name} CASCADE")
+            persistence = partition_persistence_sql(ratingstablename, cursor)
 
-            # Handle last partition with inclusive upper bound
-            if i == numberofpartitions - 1:
-                condition = f"rating >= {lower_bound} AND rating <= {upper_bound}"
+            if workers > 1:
+                build_range_partitions_parallel(ratingstablename, range_router, openconnection, workers, persistence)
             else:
-                condition = f"rating >= {lower_bound} AND rating < {upper_bound}"
+                # Route all rows in a single scan of the ratings table: the partitions are
+                # attached to a parent partitioned by rating and filled through it; unless
+                # native, they are detached again afterwards.
+                cursor.execute(f"""
+                    CREATE TABLE {router_name} (
+                        userid INT,
+                        movieid INT,
+                        rating FLOAT
+                    ) PARTITION BY RANGE (rating)
+                """)
 
-            cursor.execute(f"""
-                CREATE TABLE IF NOT EXISTS {partition_name} (
-                    userid INT,
-                    movieid INT,
-                    rating FLOAT
-                    
+                for i in range(numberofpartitions):
+                    cursor.execute(range_partition_ddl(f"{RANGE_TABLE_PREFIX}{i}", router_name, range_router, i, persistence))
+
+                cursor.execute(f"""
+                    INSERT INTO {router_name} (userid, movieid, rating)
+                    SELECT userid, movieid, rating FROM {ratingstablename}
+                """)
+
+                if not native:
+                    for i in range(numberofpartitions):
+                        cursor.execute(f"ALTER TABLE {router_name} DETACH PARTITION {RANGE_TABLE_PREFIX}{i}")
+                    cursor.execute(f"DROP TABLE {router_name}")
+
+            # Persist the bounds so rangeinsert can route without scanning the table; the
+            # sequence outlives the table, so every layout gets a new generation
+            cursor.execute("DROP TABLE IF EXISTS range_metadata")
+            cursor.execute("CREATE SEQUENCE IF NOT EXISTS range_metadata_generation_seq")
+            cursor.execute("""
+                CREATE TABLE range_metadata (
+                    id SERIAL PRIMARY KEY,
+                    num_partitions INT NOT NULL,
+                    native BOOLEAN NOT NULL DEFAULT FALSE,
+                    bounds FLOAT[] NOT NULL,
+                    generation BIGINT NOT NULL DEFAULT nextval('range_metadata_generation_seq')
                 )
             """)
-            cursor.execute(f"""
-                INSERT INTO {partition_name}
-                SELECT userid, movieid, rating FROM {ratingstablename}
-                WHERE {condition}
-            """)
+            cursor.execute(
+                "INSERT INTO range_metadata (num_partitions, native, bounds) VALUES (%s, %s, %s) RETURNING generation",
+                (numberofpartitions, native, range_router.bounds)
+            )
+            generation = cursor.fetchone()[0]
 
-        openconnection.commit()
-        print(f"Created {numberofpartitions} range partitions")
-        print(f"--- Finished RANGE partitioning ---\n")
+            openconnection.commit()
+            _range_router_cache[openconnection.dsn] = (generation, range_router)
+            index_partitions('range', RANGE_TABLE_PREFIX, numberofpartitions, openconnection)
+            print(f"Created {numberofpartitions} range partitions" + (f" under {router_name}" if native else ""))
+            print(f"--- Finished RANGE partitioning ---\n")
 
     except Exception as e:
         openconnection.rollback()
+        invalidate_range_router(openconnection)
         print(f"Error creating range partitions: {e}")
+        drop_router(range_parent_name(ratingstablename), openconnection)
         raise
 
     finally:
         cursor.close()
+        if old_autocommit:
+            openconnection.autocommit = True
+
+def build_range_partitions_parallel(ratingstablename, range_router, openconnection, workers, persistence=''):
+    """
+    Build range_part0..N-1 with up to `workers` connections. Each worker routes
+    the rows of one contiguous block of partitions through its own temporary
+    parent, reading only the rating interval that block covers.
+    """
+    numberofpartitions = range_router.num_partitions
+    worker_statements = []
+    for k, (start, end) in enumerate(partition_blocks(numberofpartitions, workers)):
+        router_name = f"{range_parent_name(ratingstablename)}_w{k}"
+        statements = [
+            f"DROP TABLE IF EXISTS {router_name} CASCADE",
+            f"""
+            CREATE TABLE {router_name} (
+                userid INT,
+                movieid INT,
+                rating FLOAT
+            ) PARTITION BY RANGE (rating)
+            """,
+        ]
+        build_names = [f"{RANGE_TABLE_PREFIX}{i}_build" for i in range(start, end)]
+        statements.extend(range_partition_ddl(build_name, router_name, range_router, i, persistence)
+                          for i, build_name in zip(range(start, end), build_names))
+        statements.append(f"""
+            INSERT INTO {router_name} (userid, movieid, rating)
+            SELECT userid, movieid, rating FROM {ratingstablename}
+            WHERE {range_router.block_where_sql(start, end)}
+        """)
+        statements.extend(f"ALTER TABLE {router_name} DETACH PARTITION {build_name}" for build_name in build_names)
+        statements.append(f"DROP TABLE {router_name}")
+        worker_statements.append(statements)
+
+    renames = [(f"{RANGE_TABLE_PREFIX}{i}_build", f"{RANGE_TABLE_PREFIX}{i}") for i in range(numberofpartitions)]
+    print(f"Building {numberofpartitions} range partitions with {len(worker_statements)} workers...")
+    build_partitions_parallel(worker_statements, renames, openconnection)
+
+def verify_range_partitions(ratingstablename, openconnection):
+    """
+    Compare each range_partI with the rows of the ratings table its RangeRouter
+    predicate selects. Returns a list of (partition, expected rows, actual rows)
+    mismatches, empty when the partitioning is exact.
+    """
+    range_router = get_range_router(openconnection)
+    mismatches = []
+    with openconnection.cursor() as cursor:
+        for i in range(range_router.num_partitions):
+            partition_name = f"{RANGE_TABLE_PREFIX}{i}"
+            cursor.execute(f"SELECT COUNT(*) FROM {ratingstablename} WHERE {range_router.where_sql(i)}")
+            expected = cursor.fetchone()[0]
+            cursor.execute(f"SELECT COUNT(*) FROM {partition_name}")
+            actual = cursor.fetchone()[0]
+            if expected != actual:
+                mismatches.append((partition_name, expected, actual))
+    return mismatches
+
+def roundrobinpartition(ratingstablename: str, N: int, open_connection, native: bool = False, workers: int = None):
+    """
+    Create N round robin partitions of the ratings table.
 
-def roundrobinpartition(ratingstablename: str, N: int, open_connection):
+    With native=True the partitions stay attached to a declarative parent,
+    <ratings>_rrobin (PARTITION BY LIST on a stored rr_slot column), and
+    roundrobininsert writes through that parent.
+
+    With workers > 1 (default DatabaseConfig.get_partition_workers()) the
+    partitions are built concurrently (see build_partitions_parallel).
+    """
     print(f"\n--- Starting ROUND ROBIN partitioning with {N} partitions ---")
-    start_time = time.time()
+    workers = DatabaseConfig.get_partition_workers() if workers is None else workers
+    if workers > 1 and native:
+        print("Parallel build is not used in native mode; building through the parent")
+        workers = 1
 
     if not isinstance(N, int) or N <= 0:
         print(f"Error: Number of partitions N ({N}) must be a positive integer (N >= 1).")
         return
 
+    old_autocommit = open_connection.autocommit
     cursor = open_connection.cursor()
     print("\nStarting Round Robin Partitioning...")
 
     try:
-        # Drop old Round Robin partition tables and metadata table (if they exist)
-        for i in range(N):
-            partition_name = f"{RROBIN_TABLE_PREFIX}{i}"
-            cursor.execute(f"DROP TABLE IF EXISTS {partition_name};")
-        cursor.execute("DROP TABLE IF EXISTS rrobin_metadata;")
-        open_connection.commit()
-
-        # Create metadata table to store insertion index and number of partitions
-        cursor.execute("""
-            CREATE TABLE rrobin_metadata (
-                id SERIAL PRIMARY KEY,
-                current_insert_index BIGINT NOT NULL DEFAULT 0,
-                num_partitions INT NOT NULL
-            );
-        """)
-        cursor.execute("INSERT INTO rrobin_metadata (num_partitions) VALUES (%s);", (N,))
-        open_connection.commit()
+        with metrics.span('partition', strategy='roundrobin', partitions=N) as partition_span:
+            # One transaction creates and fills the partitions, which lets PostgreSQL
+            # skip WAL for them with wal_level = minimal (durable mode)
+            if old_autocommit:
+                open_connection.autocommit = False
+            # Drop old Round Robin partition tables and metadata table (if they exist)
+            for i in range(N):
+                partition_name = f"{RROBIN_TABLE_PREFIX}{i}"
+                cursor.execute(f"DROP TABLE IF EXISTS {partition_name};")
+            cursor.execute("DROP TABLE IF EXISTS rrobin_metadata;")
+            discard_repartition('roundrobin', RROBIN_TABLE_PREFIX, cursor)
+            open_connection.commit()
 
-        # Create N child tables (partitions) with schema similar to Ratings
-        for i in range(N):
-            partition_name = f"{RROBIN_TABLE_PREFIX}{i}"
-            cursor.execute(f"""
-                CREATE TABLE {partition_name} (
-                    UserID INT,
-                    MovieID INT,
-                    Rating FLOAT,
-                    PRIMARY KEY (UserID, MovieID, Rating)
+            # Create metadata table to store the number of partitions; the insertion
+            # index lives in a sequence (see create_rrobin_insert_function)
+            cursor.execute("""
+                CREATE TABLE rrobin_metadata (
+                    id SERIAL PRIMARY KEY,
+                    num_partitions INT NOT NULL,
+                    native BOOLEAN NOT NULL DEFAULT FALSE
                 );
             """)
-        open_connection.commit()
+            cursor.execute("INSERT INTO rrobin_metadata (num_partitions, native) VALUES (%s, %s);", (N, native))
+            open_connection.commit()
+            set_bulk_settings(cursor)
 
-        # Insert data into partitions using SQL directly (optimized)
-        total_records_processed = 0
-        for i in range(N):
-            partition_name = f"{RROBIN_TABLE_PREFIX}{i}"
-            cursor.execute(f"""
-                INSERT INTO {partition_name} ({USER_ID_COLNAME}, {MOVIE_ID_COLNAME}, {RATING_COLNAME})
-                SELECT UserID, MovieID, Rating
-                FROM (
-                    SELECT UserID, MovieID, Rating,
-                           ROW_NUMBER() OVER (ORDER BY UserID, MovieID, Rating) as rn
-                    FROM {ratingstablename}
-                ) AS numbered_ratings
-                WHERE (rn - 1) % {N} = {i};
-            """)
-            rows_inserted = cursor.rowcount
-            total_records_processed += rows_inserted
-        
-        # Update the final insertion index in the metadata table
-        cursor.execute("UPDATE rrobin_metadata SET current_insert_index = %s WHERE id = 1;", (total_records_processed,))
-        
-        # Reset current_insert_index to 0 for subsequent single inserts by tester
-        cursor.execute("UPDATE rrobin_metadata SET current_insert_index = 0 WHERE id = 1;")
-
-        open_connection.commit()
-        end_time = time.time()
-        elapsed_time = end_time - start_time
-        print(f"[{ratingstablename}] RoundRobinPartition completed in {elapsed_time:.2f} seconds.")
-        print("Round Robin Partitioning completed.")
-        print(f"--- Finished ROUND ROBIN partitioning ---\n")
+            router_name = rrobin_parent_name(ratingstablename)
+            cursor.execute(f"DROP TABLE IF EXISTS {router_name} CASCADE;")
+            persistence = partition_persistence_sql(ratingstablename, cursor)
+
+            if workers > 1:
+                build_rrobin_partitions_parallel(ratingstablename, N, open_connection, workers, persistence)
+            else:
+                # Number the rows once, in physical order (no sort), and route them to all
+                # N children in a single pass: the children are created as LIST partitions
+                # of a parent keyed on the round robin slot, and detached unless native.
+                for sql in rrobin_build_statements(ratingstablename, router_name, N, 0, N, native=native,
+                                                   persistence=persistence):
+                    cursor.execute(sql)
+
+            # Subsequent single inserts start again at rrobin_part0, as the tester expects
+            create_rrobin_insert_function(ratingstablename, N, native, cursor)
+
+            open_connection.commit()
+            index_partitions('roundrobin', RROBIN_TABLE_PREFIX, N, open_connection)
+            print(f"[{ratingstablename}] RoundRobinPartition completed in {partition_span.elapsed():.2f} seconds.")
+            print("Round Robin Partitioning completed.")
+            print(f"--- Finished ROUND ROBIN partitioning ---\n")
 
     except psycopg2.Error as e:
         print(f"PostgreSQL error during RoundRobin_Partition: {e}")
         if open_connection: open_connection.rollback()
+        drop_router(rrobin_parent_name(ratingstablename), open_connection)
         traceback.print_exc()
         raise
     except Exception as e:
         print(f"General error during RoundRobin_Partition: {e}")
         if open_connection: open_connection.rollback()
+        drop_router(rrobin_parent_name(ratingstablename), open_connection)
         traceback.print_exc()
         raise
     finally:
         if cursor and not cursor.closed:
             cursor.close()
+        if old_autocommit:
+            open_connection.autocommit = True
+
+def rrobin_build_statements(ratingstablename, router_name, N, start, end, native=False, suffix='', persistence=''):
+    """
+    Statements filling round robin partitions start..end-1 (named with `suffix`)
+    through `router_name` in one scan: rows are numbered in physical order, the
+    children are LIST partitions on the slot, then detached unless native.
+    """
+    statements = [f"""
+        CREATE TABLE {router_name} (
+            UserID INT,
+            MovieID INT,
+            Rating FLOAT,
+            rr_slot INT NOT NULL
+        ) PARTITION BY LIST (rr_slot);
+    """]
+    for i in range(start, end):
+        statements.append(f"CREATE {persistence}TABLE {RROBIN_TABLE_PREFIX}{i}{suffix} PARTITION OF {router_name} "
+                          f"FOR VALUES IN ({i});")
+
+    where_sql = f"WHERE rr_slot >= {start} AND rr_slot < {end}" if end - start < N else ""
+    statements.append(f"""
+        INSERT INTO {router_name} ({USER_ID_COLNAME}, {MOVIE_ID_COLNAME}, {RATING_COLNAME}, rr_slot)
+        SELECT * FROM (
+            SELECT UserID, MovieID, Rating, (ROW_NUMBER() OVER () - 1) % {N} AS rr_slot
+            FROM {ratingstablename}
+        ) numbered {where_sql};
+    """)
+
+    # Detach the children and drop the routing column (catalog-only, no rewrite);
+    # their primary keys are built afterwards by index_partitions
+    if not native:
+        for i in range(start, end):
+            partition_name = f"{RROBIN_TABLE_PREFIX}{i}{suffix}"
+            statements.append(f"ALTER TABLE {router_name} DETACH PARTITION {partition_name};")
+            statements.append(f"ALTER TABLE {partition_name} DROP COLUMN rr_slot;")
+        statements.append(f"DROP TABLE {router_name};")
+    return statements
+
+def build_rrobin_partitions_parallel(ratingstablename, N, openconnection, workers, persistence=''):
+    """
+    Build rrobin_part0..N-1 with up to `workers` connections, each numbering
+    the rows of the shared snapshot and keeping one contiguous block of slots.
+    """
+    worker_statements = [
+        rrobin_build_statements(ratingstablename, f"{rrobin_parent_name(ratingstablename)}_w{k}", N, start, end,
+                                suffix='_build', persistence=persistence)
+        for k, (start, end) in enumerate(partition_blocks(N, workers))
+    ]
+    renames = [(f"{RROBIN_TABLE_PREFIX}{i}_build", f"{RROBIN_TABLE_PREFIX}{i}") for i in range(N)]
+    print(f"Building {N} round robin partitions with {len(worker_statements)} workers...")
+    build_partitions_parallel(worker_statements, renames, openconnection)
 
 def rangeinsert(ratingstablename, userid, movieid, rating, openconnection):
     """
@@ -177,42 +550,26 @@ def rangeinsert(ratingstablename, userid, movieid, rating, openconnection):
     cursor = openconnection.cursor()
     
     try:
-        # Get min and max ratings
-        cursor.execute(f"SELECT MIN(rating), MAX(rating) FROM {ratingstablename}")
-        min_rating, max_rating = cursor.fetchone()
-
-        # Get number of partitions from existing range partition tables
-        cursor.execute(f"""
-            SELECT COUNT(*) FROM information_schema.tables 
-            WHERE table_name LIKE '{RANGE_TABLE_PREFIX}%'
-        """)
-        numberofpartitions = cursor.fetchone()[0]
+        # Route with the cached bounds; only their generation is looked up before the INSERT
+        range_router = get_range_router(openconnection)
+        partition_name = f"{RANGE_TABLE_PREFIX}{range_router.partition_for(rating)}"
 
-        if numberofpartitions == 0:
-            raise Exception("No range partitions found. Please run rangepartition first.")
-
-        # Calculate partition number
-        range_size = (max_rating - min_rating) / numberofpartitions
-        partition_num = int((rating - min_rating) / range_size)
-        partition_name = f"{RANGE_TABLE_PREFIX}{partition_num}"
-
-        # Check if partition exists
-        cursor.execute(f"""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = '{partition_name}'
+        statement_start = time.perf_counter()
+        if range_router.native:
+            # Let PostgreSQL route the row through the declarative parent
+            cursor.execute(
+                f"INSERT INTO {range_parent_name(ratingstablename)} (userid,movieid,rating) VALUES (%s, %s, %s)",
+                (userid, movieid, rating)
+            )
+        else:
+            cursor.execute(
+                f"INSERT INTO {partition_name} (userid,movieid,rating) VALUES (%s, %s, %s)", (userid, movieid, rating)
             )
-        """)
-        if not cursor.fetchone()[0]:
-            raise Exception(f"Partition {partition_name} does not exist")
-
-        # Insert into appropriate partition
-        cursor.execute(
-            f"INSERT INTO {partition_name} (userid,movieid,rating) VALUES (%s, %s, %s)", (userid, movieid, rating)
-        )
 
         openconnection.commit()
-        print(f"Inserted rating into range partition {partition_num}")
+        metrics.observe('statement_seconds', time.perf_counter() - statement_start, statement='rangeinsert')
+        metrics.count('rows_inserted', path='rangeinsert')
+        metrics.info(f"Inserted rating into range partition {partition_name}")
 
     except Exception as e:
         openconnection.rollback()
@@ -221,47 +578,71 @@ def rangeinsert(ratingstablename, userid, movieid, rating, openconnection):
     finally:
         cursor.close()
 
+def create_rrobin_insert_function(ratingstablename, N, native, cursor, reset_sequence=True):
+    """
+    (Re)create rrobin_insert_seq and the rrobin_insert() function used by
+    roundrobininsert. The function takes the next sequence value, inserts the
+    row into partition value % N and returns the value, all in one statement.
+    With reset_sequence=False an existing sequence and its position are kept.
+
+    nextval never blocks, so concurrent writers don't queue behind a row lock
+    the way they would on a counter row. Values consumed by rolled back inserts
+    are not reused, which can leave the rotation slightly uneven.
+    """
+    if reset_sequence:
+        cursor.execute("DROP SEQUENCE IF EXISTS rrobin_insert_seq;")
+    cursor.execute("CREATE SEQUENCE IF NOT EXISTS rrobin_insert_seq MINVALUE 0 START WITH 0;")
+    if native:
+        insert_sql = f"""
+            INSERT INTO {rrobin_parent_name(ratingstablename)} (UserID, MovieID, Rating, rr_slot)
+            VALUES (p_userid, p_movieid, p_rating, insert_index % {N});"""
+    else:
+        insert_sql = f"""
+            EXECUTE format('INSERT INTO %I (UserID, MovieID, Rating) VALUES ($1, $2, $3)',
+                           '{RROBIN_TABLE_PREFIX}' || insert_index % {N})
+            USING p_userid, p_movieid, p_rating;"""
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION rrobin_insert(p_userid INT, p_movieid INT, p_rating FLOAT)
+        RETURNS BIGINT AS $$
+        DECLARE
+            insert_index BIGINT := nextval('rrobin_insert_seq');
+        BEGIN
+            {insert_sql}
+            RETURN insert_index;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
 def roundrobininsert(ratingstablename, UserID: int, MovieID: int, Rating: float, openconnection):
     """
     Insert a new record into the correct Round Robin partition.
+
+    Slot assignment and insert happen server-side in rrobin_insert(), so this
+    is a single round trip and concurrent callers do not serialize.
     """
-    start_time = time.time()
+    start_time = time.perf_counter()
     cursor = openconnection.cursor()
     try:
-        # Get current insertion index and number of partitions from metadata table
-        cursor.execute("SELECT current_insert_index, num_partitions FROM rrobin_metadata WHERE id = 1 FOR UPDATE;")
-        metadata = cursor.fetchone()
+        try:
+            cursor.execute("SELECT rrobin_insert(%s, %s, %s), num_partitions FROM rrobin_metadata WHERE id = 1;",
+                           (UserID, MovieID, Rating))
+            metadata = cursor.fetchone()
+        except (psycopg2.errors.UndefinedFunction, psycopg2.errors.UndefinedTable):
+            metadata = None
 
         if not metadata:
             print("Error: Round Robin metadata not found. Please run RoundRobin_Partition() first.")
             openconnection.rollback()
             return
 
-        current_insert_index, N = metadata[0], metadata[1]
-
-        if N <= 0:
-            print(f"Error: Number of partitions N in metadata ({N}) is invalid.")
-            openconnection.rollback()
-            return
-
-        # Determine the target partition table name
-        partition_index = current_insert_index % N
-        target_table = f"{RROBIN_TABLE_PREFIX}{partition_index}"
-
-        # Insert the new record into the target partition table
-        cursor.execute(f"""
-            INSERT INTO {target_table} (UserID, MovieID, Rating)
-            VALUES (%s, %s, %s);
-        """, (UserID, MovieID, Rating))
-
-        # Update insertion index in the metadata table
-        new_insert_index = current_insert_index + 1
-        cursor.execute("UPDATE rrobin_metadata SET current_insert_index = %s WHERE id = 1;", (new_insert_index,))
+        insert_index, N = metadata
+        target_table = f"{RROBIN_TABLE_PREFIX}{insert_index % N}"
 
         openconnection.commit()
-        end_time = time.time()
-        elapsed_time = end_time - start_time
-        print(f"[Round Robin Insert] Insert ({UserID}, {MovieID}, {Rating}) into {target_table} completed in {elapsed_time:.4f} seconds. (Index: {new_insert_index - 1})")
+        elapsed_time = time.perf_counter() - start_time
+        metrics.observe('statement_seconds', elapsed_time, statement='roundrobininsert')
+        metrics.count('rows_inserted', path='roundrobininsert')
+        metrics.info(f"[Round Robin Insert] Insert ({UserID}, {MovieID}, {Rating}) into {target_table} completed in {elapsed_time:.4f} seconds. (Index: {insert_index})")
 
     except psycopg2.Error as e:
         print(f"PostgreSQL error during Round Robin Partition insert: {e}")
@@ -276,3 +657,406 @@ def roundrobininsert(ratingstablename, UserID: int, MovieID: int, Rating: float,
     finally:
         if cursor:
             cursor.close()
+
+def _insert_groups(cursor, groups, columns):
+    """Write {table: [row, ...]} with one multi-row INSERT per page of each group"""
+    for table, rows in groups.items():
+        for page in range(0, len(rows), INSERT_PAGE_SIZE):
+            statement_start = time.perf_counter()
+            psycopg2.extras.execute_values(
+                cursor, f"INSERT INTO {table} ({columns}) VALUES %s", rows[page:page + INSERT_PAGE_SIZE],
+                page_size=INSERT_PAGE_SIZE
+            )
+            metrics.observe('statement_seconds', time.perf_counter() - statement_start, statement='insert_page')
+
+def rangeinsert_many(ratingstablename, rows, openconnection):
+    """
+    Insert many (userid, movieid, rating) tuples using range partitioning.
+
+    Rows are routed in memory with the cached bounds, grouped per partition and
+    written with multi-row INSERTs in a single transaction. Returns the number
+    of rows inserted per partition.
+    """
+    cursor = openconnection.cursor()
+    try:
+        with metrics.span('insert_batch', path='rangeinsert_many') as insert_span:
+            range_router = get_range_router(openconnection)
+
+            groups = {}
+            for row in rows:
+                partition_name = f"{RANGE_TABLE_PREFIX}{range_router.partition_for(row[2])}"
+                groups.setdefault(partition_name, []).append(tuple(row[:3]))
+
+            if range_router.native:
+                # The declarative parent routes each row itself
+                _insert_groups(cursor, {range_parent_name(ratingstablename): [r for g in groups.values() for r in g]},
+                               "userid, movieid, rating")
+            else:
+                _insert_groups(cursor, groups, "userid, movieid, rating")
+
+            openconnection.commit()
+            counts = {partition_name: len(group) for partition_name, group in groups.items()}
+            metrics.count('rows_inserted', sum(counts.values()), path='rangeinsert_many')
+            metrics.info(f"Inserted {sum(counts.values())} ratings into {len(counts)} range partitions "
+                         f"in {insert_span.elapsed():.4f} seconds")
+            return counts
+
+    except Exception as e:
+        openconnection.rollback()
+        print(f"Error inserting ratings: {e}")
+        raise
+    finally:
+        cursor.close()
+
+def roundrobininsert_many(ratingstablename, rows, openconnection):
+    """
+    Insert many (UserID, MovieID, Rating) tuples into the Round Robin partitions,
+    continuing the rotation where the last insert stopped.
+
+    The rows are written, under a savepoint, to the partitions of the indexes
+    rrobin_insert_seq hands out next, and the indexes are only drawn once every
+    row is in. A row that fails leaves the sequence untouched, so a rejected
+    batch (or a bisected one, see async_partitioning) does not shift the
+    rotation. If a concurrent insert drew indexes in the meantime, the rows are
+    written again with the ones actually drawn. Returns the number of rows
+    inserted per partition.
+    """
+    rows = [tuple(row[:3]) for row in rows]
+    old_autocommit = openconnection.autocommit
+    cursor = openconnection.cursor()
+
+    def write(insert_indexes):
+        groups = {}
+        for insert_index, row in zip(insert_indexes, rows):
+            groups.setdefault(insert_index % N, []).append(row)
+        if native:
+            # Send the slot along and let the declarative parent route each row
+            _insert_groups(cursor, {rrobin_parent_name(ratingstablename):
+                                    [row + (index,) for index, group in groups.items() for row in group]},
+                           "UserID, MovieID, Rating, rr_slot")
+        else:
+            _insert_groups(cursor, {f"{RROBIN_TABLE_PREFIX}{index}": group for index, group in groups.items()},
+                           "UserID, MovieID, Rating")
+        return groups
+
+    try:
+        with metrics.span('insert_batch', path='roundrobininsert_many') as insert_span:
+            cursor.execute("SELECT num_partitions, native FROM rrobin_metadata WHERE id = 1;")
+            metadata = cursor.fetchone()
+            if not metadata:
+                raise Exception("Round Robin metadata not found. Please run RoundRobin_Partition() first.")
+            N, native = metadata
+            if N <= 0:
+                raise Exception(f"Number of partitions N in metadata ({N}) is invalid.")
+
+            # The savepoint needs a transaction block
+            if old_autocommit:
+                openconnection.autocommit = False
+            cursor.execute("SAVEPOINT rrobin_batch; "
+                           "SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END FROM rrobin_insert_seq;")
+            first_index = cursor.fetchone()[0]
+            expected_indexes = list(range(first_index, first_index + len(rows)))
+            groups = write(expected_indexes)
+
+            # Reserve the indexes in a single round trip; nextval never blocks, so
+            # concurrent batches interleave without waiting on each other
+            cursor.execute("SELECT nextval('rrobin_insert_seq') FROM generate_series(1, %s);", (len(rows),))
+            insert_indexes = [index for (index,) in cursor.fetchall()]
+            if insert_indexes != expected_indexes:
+                cursor.execute("ROLLBACK TO SAVEPOINT rrobin_batch;")
+                groups = write(insert_indexes)
+
+            openconnection.commit()
+            counts = {f"{RROBIN_TABLE_PREFIX}{index}": len(group) for index, group in groups.items()}
+            metrics.count('rows_inserted', len(rows), path='roundrobininsert_many')
+            metrics.info(f"[Round Robin Insert] Inserted {len(rows)} ratings into {len(counts)} partitions "
+                         f"in {insert_span.elapsed():.4f} seconds.")
+            return counts
+
+    except Exception as e:
+        print(f"Error during Round Robin batch insert: {e}")
+        if openconnection: openconnection.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if old_autocommit:
+            openconnection.autocommit = True
+
+def hashpartition(ratingstablename, numberofpartitions, key, openconnection, native=False):
+    """
+    Create hash partitions of the ratings table keyed on userid or movieid, so
+    every rating of one user (or movie) lives in exactly one partition.
+
+    Rows are routed in one scan through a parent LIST-partitioned on the hash
+    expression; with native=True that parent (<ratings>_hash) is kept.
+    """
+    print(f"\n--- Starting HASH partitioning on {key} with {numberofpartitions} partitions ---")
+    if key not in HASH_KEY_COLUMNS:
+        raise ValueError(f"Hash partition key must be one of {HASH_KEY_COLUMNS}, got '{key}'")
+    if not isinstance(numberofpartitions, int) or numberofpartitions <= 0:
+        raise ValueError(f"Number of partitions ({numberofpartitions}) must be a positive integer")
+
+    old_autocommit = openconnection.autocommit
+    cursor = openconnection.cursor()
+    router_name = hash_parent_name(ratingstablename)
+
+    try:
+        with metrics.span('partition', strategy='hash', partitions=numberofpartitions):
+            # One transaction creates and fills the partitions, which lets PostgreSQL
+            # skip WAL for them with wal_level = minimal (durable mode)
+            if old_autocommit:
+                openconnection.autocommit = False
+            # Drop old hash partitions, parent and metadata (if they exist)
+            for i in range(numberofpartitions):
+                cursor.execute(f"DROP TABLE IF EXISTS {HASH_TABLE_PREFIX}{i}")
+            cursor.execute(f"DROP TABLE IF EXISTS {router_name} CASCADE")
+            cursor.execute("DROP TABLE IF EXISTS hash_metadata")
+            discard_repartition('hash', HASH_TABLE_PREFIX, cursor)
+            set_bulk_settings(cursor)
+
+            cursor.execute("""
+                CREATE TABLE hash_metadata (
+                    id SERIAL PRIMARY KEY,
+                    key_column TEXT NOT NULL,
+                    num_partitions INT NOT NULL,
+                    native BOOLEAN NOT NULL DEFAULT FALSE
+                )
+            """)
+            cursor.execute("INSERT INTO hash_metadata (key_column, num_partitions, native) VALUES (%s, %s, %s)",
+                           (key, numberofpartitions, native))
+
+            cursor.execute(f"""
+                CREATE TABLE {router_name} (
+                    userid INT,
+                    movieid INT,
+                    rating FLOAT
+                ) PARTITION BY LIST (({hash_slot_sql(key, numberofpartitions)}))
+            """)
+            persistence = partition_persistence_sql(ratingstablename, cursor)
+            for i in range(numberofpartitions):
+                cursor.execute(f"CREATE {persistence}TABLE {HASH_TABLE_PREFIX}{i} PARTITION OF {router_name} FOR VALUES IN ({i})")
+
+            cursor.execute(f"""
+                INSERT INTO {router_name} (userid, movieid, rating)
+                SELECT userid, movieid, rating FROM {ratingstablename}
+            """)
+
+            # Index the key on each child once the data is in, for point lookups
+            for i in range(numberofpartitions):
+                partition_name = f"{HASH_TABLE_PREFIX}{i}"
+                if not native:
+                    cursor.execute(f"ALTER TABLE {router_name} DETACH PARTITION {partition_name}")
+                cursor.execute(f"CREATE INDEX ON {partition_name} ({key})")
+            if not native:
+                cursor.execute(f"DROP TABLE {router_name}")
+
+            openconnection.commit()
+            print(f"Created {numberofpartitions} hash partitions on {key}")
+            print(f"--- Finished HASH partitioning ---\n")
+
+    except Exception as e:
+        openconnection.rollback()
+        print(f"Error creating hash partitions: {e}")
+        drop_router(router_name, openconnection)
+        raise
+    finally:
+        cursor.close()
+        if old_autocommit:
+            openconnection.autocommit = True
+
+def hashinsert(ratingstablename, userid, movieid, rating, openconnection):
+    """
+    Insert a new rating into the hash partition of its userid or movieid,
+    whichever hashpartition was keyed on.
+    """
+    cursor = openconnection.cursor()
+    try:
+        cursor.execute("SELECT key_column, num_partitions, native FROM hash_metadata WHERE id = 1")
+        metadata = cursor.fetchone()
+        if not metadata:
+            raise Exception("Hash metadata not found. Please run hashpartition first.")
+        key, numberofpartitions, native = metadata
+
+        keyvalue = userid if key == USER_ID_COLNAME else movieid
+        partition_name = f"{HASH_TABLE_PREFIX}{hashpartition_for(keyvalue, numberofpartitions)}"
+        target_table = hash_parent_name(ratingstablename) if native else partition_name
+
+        statement_start = time.perf_counter()
+        cursor.execute(
+            f"INSERT INTO {target_table} (userid, movieid, rating) VALUES (%s, %s, %s)", (userid, movieid, rating)
+        )
+        openconnection.commit()
+        metrics.observe('statement_seconds', time.perf_counter() - statement_start, statement='hashinsert')
+        metrics.count('rows_inserted', path='hashinsert')
+        metrics.info(f"Inserted rating into hash partition {partition_name}")
+
+    except Exception as e:
+        openconnection.rollback()
+        print(f"Error inserting rating: {e}")
+        raise
+    finally:
+        cursor.close()
+
+def hashlookup(keyvalue, openconnection):
+    """
+    Fetch all (userid, movieid, rating) rows for one userid or movieid value,
+    reading only the single hash partition that can hold them.
+    """
+    cursor = openconnection.cursor()
+    try:
+        cursor.execute("SELECT key_column, num_partitions FROM hash_metadata WHERE id = 1")
+        metadata = cursor.fetchone()
+        if not metadata:
+            raise Exception("Hash metadata not found. Please run hashpartition first.")
+        key, numberofpartitions = metadata
+
+        partition_name = f"{HASH_TABLE_PREFIX}{hashpartition_for(keyvalue, numberofpartitions)}"
+        cursor.execute(f"SELECT userid, movieid, rating FROM {partition_name} WHERE {key} = %s", (keyvalue,))
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+def _routed_insert_sql(source_sql, slot_sql, tablenames):
+    """
+    One statement inserting every row of `source_sql` into tablenames[slot],
+    `slot_sql` giving each row's slot. It returns the number of rows routed.
+    """
+    inserts = ",\n".join(
+        f"insert_{slot} AS (INSERT INTO {tablename} (userid, movieid, rating) "
+        f"SELECT userid, movieid, rating FROM routed WHERE slot = {slot})"
+        for slot, tablename in enumerate(tablenames)
+    )
+    return f"""
+        WITH routed AS MATERIALIZED (
+            SELECT userid, movieid, rating, {slot_sql} AS slot FROM ({source_sql}) source
+        ),
+        {inserts}
+        SELECT COUNT(*) FROM routed
+    """
+
+def append_to_partitions(ratingstablename, sourcetable, openconnection):
+    """
+    Add the (userid, movieid, rating) rows of `sourcetable` to every
+    partitioning that exists, routed as rangeinsert, roundrobininsert and
+    hashinsert would route them one by one, with one set-based statement per
+    strategy. Round robin continues the rotation from rrobin_insert_seq.
+    Runs in the caller's transaction. Returns {strategy: rows added}.
+    """
+    appended = {}
+    cursor = openconnection.cursor()
+    try:
+        cursor.execute("SELECT to_regclass('range_metadata') IS NOT NULL, to_regclass('rrobin_metadata') IS NOT NULL, "
+                       "to_regclass('hash_metadata') IS NOT NULL")
+        has_range, has_rrobin, has_hash = cursor.fetchone()
+        source_sql = f"SELECT userid, movieid, rating FROM {sourcetable}"
+
+        if has_range:
+            range_router = get_range_router(openconnection)
+            if range_router.native:
+                cursor.execute(f"INSERT INTO {range_parent_name(ratingstablename)} (userid, movieid, rating) "
+                               f"SELECT userid, movieid, rating FROM {sourcetable}")
+                appended['range'] = cursor.rowcount
+            else:
+                tablenames = [f"{RANGE_TABLE_PREFIX}{i}" for i in range(range_router.num_partitions)]
+                cursor.execute(_routed_insert_sql(source_sql, range_router.partition_sql(), tablenames))
+                appended['range'] = cursor.fetchone()[0]
+
+        if has_rrobin:
+            cursor.execute("SELECT num_partitions, native FROM rrobin_metadata WHERE id = 1")
+            N, native = cursor.fetchone()
+            # One insertion index per row, taken in staging order from the shared sequence
+            ordered_sql = f"{source_sql} ORDER BY ctid"
+            slot_sql = f"nextval('rrobin_insert_seq') % {N}"
+            if native:
+                cursor.execute(f"INSERT INTO {rrobin_parent_name(ratingstablename)} (UserID, MovieID, Rating, rr_slot) "
+                               f"SELECT userid, movieid, rating, {slot_sql} FROM ({ordered_sql}) source")
+                appended['roundrobin'] = cursor.rowcount
+            else:
+                tablenames = [f"{RROBIN_TABLE_PREFIX}{i}" for i in range(N)]
+                cursor.execute(_routed_insert_sql(ordered_sql, slot_sql, tablenames))
+                appended['roundrobin'] = cursor.fetchone()[0]
+
+        if has_hash:
+            cursor.execute("SELECT key_column, num_partitions, native FROM hash_metadata WHERE id = 1")
+            key, numberofpartitions, native = cursor.fetchone()
+            if native:
+                cursor.execute(f"INSERT INTO {hash_parent_name(ratingstablename)} (userid, movieid, rating) "
+                               f"SELECT userid, movieid, rating FROM {sourcetable}")
+                appended['hash'] = cursor.rowcount
+            else:
+                tablenames = [f"{HASH_TABLE_PREFIX}{i}" for i in range(numberofpartitions)]
+                cursor.execute(_routed_insert_sql(source_sql, hash_slot_sql(key, numberofpartitions), tablenames))
+                appended['hash'] = cursor.fetchone()[0]
+
+        return appended
+    finally:
+        cursor.close()
+
+def _update_ratings_sql(tablenames, sourcetable):
+    """
+    One statement setting the rating of every row of `tablenames` whose
+    (userid, movieid) is in `sourcetable` to the rating there. It returns the
+    number of rows updated.
+    """
+    updates = ",\n".join(
+        f"update_{i} AS (UPDATE {tablename} target SET rating = source.rating FROM {sourcetable} source "
+        f"WHERE target.userid = source.userid AND target.movieid = source.movieid RETURNING 1)"
+        for i, tablename in enumerate(tablenames)
+    )
+    counts = " + ".join(f"(SELECT COUNT(*) FROM update_{i})" for i in range(len(tablenames)))
+    return f"WITH {updates}\nSELECT {counts}"
+
+def update_in_partitions(ratingstablename, sourcetable, openconnection):
+    """
+    Give the rows of every existing partitioning whose (userid, movieid) is in
+    `sourcetable` the new rating held there, e.g. the ratings an append
+    changed. Round robin and hash rows keep their partition and are updated in
+    place. A range row whose new rating falls in another partition has to move:
+    in native mode the UPDATE on the parent moves it, otherwise the changed
+    rows are deleted from the range partitions and routed again by their new
+    rating. Runs in the caller's transaction. Returns {strategy: rows updated}.
+    """
+    updated = {}
+    cursor = openconnection.cursor()
+    try:
+        cursor.execute("SELECT to_regclass('range_metadata') IS NOT NULL, to_regclass('rrobin_metadata') IS NOT NULL, "
+                       "to_regclass('hash_metadata') IS NOT NULL")
+        has_range, has_rrobin, has_hash = cursor.fetchone()
+
+        if has_range:
+            range_router = get_range_router(openconnection)
+            if range_router.native:
+                cursor.execute(_update_ratings_sql([range_parent_name(ratingstablename)], sourcetable))
+                updated['range'] = cursor.fetchone()[0]
+            else:
+                tablenames = [f"{RANGE_TABLE_PREFIX}{i}" for i in range(range_router.num_partitions)]
+                deletes = ",\n".join(
+                    f"delete_{i} AS (DELETE FROM {tablename} target USING {sourcetable} source "
+                    f"WHERE target.userid = source.userid AND target.movieid = source.movieid)"
+                    for i, tablename in enumerate(tablenames)
+                )
+                cursor.execute(f"WITH {deletes}\nSELECT 1")
+                source_sql = f"SELECT userid, movieid, rating FROM {sourcetable}"
+                cursor.execute(_routed_insert_sql(source_sql, range_router.partition_sql(), tablenames))
+                updated['range'] = cursor.fetchone()[0]
+
+        if has_rrobin:
+            cursor.execute("SELECT num_partitions, native FROM rrobin_metadata WHERE id = 1")
+            N, native = cursor.fetchone()
+            tablenames = [rrobin_parent_name(ratingstablename)] if native else \
+                [f"{RROBIN_TABLE_PREFIX}{i}" for i in range(N)]
+            cursor.execute(_update_ratings_sql(tablenames, sourcetable))
+            updated['roundrobin'] = cursor.fetchone()[0]
+
+        if has_hash:
+            cursor.execute("SELECT num_partitions, native FROM hash_metadata WHERE id = 1")
+            numberofpartitions, native = cursor.fetchone()
+            tablenames = [hash_parent_name(ratingstablename)] if native else \
+                [f"{HASH_TABLE_PREFIX}{i}" for i in range(numberofpartitions)]
+            cursor.execute(_update_ratings_sql(tablenames, sourcetable))
+            updated['hash'] = cursor.fetchone()[0]
+
+        return updated
+    finally:
+        cursor.close()
@@ -0,0 +1,89 @@
+import math
+from bisect import bisect_left
+
+# Rating domain split into equal intervals by rangepartition
+RATING_DOMAIN = (0.0, 5.0)
+
+class RangeRouter:
+    """
+    Exact edges of the range partitions and the rule for which side of each
+    edge a rating falls on.
+
+    With N partitions and edges b0 < b1 < ... < bN, partition 0 holds
+    [b0, b1] and partition i > 0 holds (bi, bi+1]. Ratings below b0 or above bN
+    belong to the first or last partition, so every rating has exactly one
+    home. Edges are accumulated as b(i+1) = bi + (bN - b0) / N, the same float
+    additions the assignment tester uses, so boundary ratings such as 1.0 or
+    3.5 land where the tester expects them.
+    """
+
+    def __init__(self, bounds, native=False):
+        self.bounds = [float(bound) for bound in bounds]
+        self.num_partitions = len(self.bounds) - 1
+        self.native = native
+        if self.num_partitions < 1:
+            raise ValueError("A range router needs at least two edges")
+
+    @classmethod
+    def for_partitions(cls, numberofpartitions, native=False, domain=RATING_DOMAIN):
+        """Router splitting `domain` into `numberofpartitions` equal intervals"""
+        if not isinstance(numberofpartitions, int) or numberofpartitions <= 0:
+            raise ValueError(f"Number of partitions ({numberofpartitions}) must be a positive integer")
+        low, high = domain
+        interval = (high - low) / numberofpartitions
+        bounds = [low]
+        for _ in range(numberofpartitions):
+            bounds.append(bounds[-1] + interval)
+        return cls(bounds, native)
+
+    def partition_for(self, rating):
+        """Index of the partition holding `rating`"""
+        return bisect_left(self.bounds, rating, 1, self.num_partitions) - 1
+
+    def partitions_for_interval(self, low=None, high=None, low_inclusive=True, high_inclusive=True):
+        """
+        Indexes of exactly the partitions that can hold ratings between `low`
+        and `high` (None = unbounded), honouring each side's inclusivity.
+        """
+        first = 0 if low is None else self.partition_for(low)
+        if low is not None and not low_inclusive and first < self.num_partitions - 1 and low >= self.bounds[first + 1]:
+            # low is the closed upper edge of `first`; excluding it leaves nothing there
+            first += 1
+        # Ratings just below an exclusive `high` share its partition, so only low needs adjusting
+        last = self.num_partitions - 1 if high is None else self.partition_for(high)
+        if low is not None and high is not None and (low > high or (low == high and not (low_inclusive and high_inclusive))):
+            return []
+        return list(range(first, last + 1))
+
+    def partition_sql(self, column='rating'):
+        """SQL expression giving the partition index of `column`; matches partition_for"""
+        whens = ' '.join(f"WHEN {column} <= {self.bounds[i + 1]!r} THEN {i}" for i in range(self.num_partitions - 1))
+        return f"CASE {whens} ELSE {self.num_partitions - 1} END" if whens else '0'
+
+    def where_sql(self, i, column='rating'):
+        """SQL predicate selecting exactly the rows of partition i"""
+        conditions = []
+        if i > 0:
+            conditions.append(f"{column} > {self.bounds[i]!r}")
+        if i < self.num_partitions - 1:
+            conditions.append(f"{column} <= {self.bounds[i + 1]!r}")
+        return ' AND '.join(conditions) or 'TRUE'
+
+    def block_where_sql(self, start, end, column='rating'):
+        """SQL predicate selecting the rows of partitions start..end-1"""
+        conditions = []
+        if start > 0:
+            conditions.append(f"{column} > {self.bounds[start]!r}")
+        if end < self.num_partitions:
+            conditions.append(f"{column} <= {self.bounds[end]!r}")
+        return ' AND '.join(conditions) or 'TRUE'
+
+    def partition_bound_sql(self, i):
+        """
+        FOR VALUES FROM (...) TO (...) literals for partition i of a PostgreSQL
+        RANGE partitioned table. PostgreSQL ranges are [from, to), so each closed
+        upper edge b is written as the next double after b.
+        """
+        lower_sql = 'MINVALUE' if i == 0 else repr(math.nextafter(self.bounds[i], math.inf))
+        upper_sql = 'MAXVALUE' if i == self.num_partitions - 1 else repr(math.nextafter(self.bounds[i + 1], math.inf))
+        return lower_sql, upper_sql
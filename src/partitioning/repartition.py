@@ -0,0 +1,374 @@
+import re
+import time
+
+from partitioning.partitioning import (RANGE_TABLE_PREFIX, RROBIN_TABLE_PREFIX, HASH_TABLE_PREFIX,
+                                       range_parent_name, rrobin_parent_name, hash_parent_name,
+                                       hash_slot_sql, get_range_router, invalidate_range_router,
+                                       create_rrobin_insert_function, repartition_moves_name,
+                                       retired_partition_name, partition_persistence_sql,
+                                       REPARTITION_PROGRESS_TABLE)
+from database.pool import set_bulk_settings
+from database.indexes import index_statements, partition_index_jobs
+from partitioning.range_router import RangeRouter
+
+REPARTITION_STRATEGIES = ('range', 'roundrobin', 'hash')
+
+# Rows moved per committed batch; each batch is one short transaction
+REPARTITION_BATCH_ROWS = 50000
+
+_TABLE_PREFIXES = {'range': RANGE_TABLE_PREFIX, 'roundrobin': RROBIN_TABLE_PREFIX, 'hash': HASH_TABLE_PREFIX}
+_METADATA_TABLES = {'range': 'range_metadata', 'roundrobin': 'rrobin_metadata', 'hash': 'hash_metadata'}
+_PARENT_NAMES = {'range': range_parent_name, 'roundrobin': rrobin_parent_name, 'hash': hash_parent_name}
+
+def _range_keep_map(old_router, new_router):
+    """
+    {new index: old index} of the range tables kept in place: old and new
+    partitions are paired by largest overlap, each table used at most once.
+    """
+    overlaps = []
+    for i in range(old_router.num_partitions):
+        for j in range(new_router.num_partitions):
+            overlap = (min(old_router.bounds[i + 1], new_router.bounds[j + 1])
+                       - max(old_router.bounds[i], new_router.bounds[j]))
+            if overlap > 0:
+                overlaps.append((-overlap, i, j))
+    keep, used = {}, set()
+    for _, i, j in sorted(overlaps):
+        if j not in keep and i not in used:
+            keep[j] = i
+            used.add(i)
+    return keep
+
+def _create_partition_sql(strategy, i, key, persistence=''):
+    """Statements creating an empty, detached partition i for the new layout"""
+    table = f"{_TABLE_PREFIXES[strategy]}{i}"
+    if strategy == 'hash':
+        return [f"CREATE {persistence}TABLE {table} (userid INT, movieid INT, rating FLOAT)",
+                f"CREATE INDEX ON {table} ({key})"]
+    # Same indexes as the index pipeline gives freshly built partitions
+    return [f"CREATE {persistence}TABLE {table} (userid INT, movieid INT, rating FLOAT)"] + \
+        index_statements(partition_index_jobs(strategy, [table]))
+
+def _read_layout(strategy, cursor):
+    """(num_partitions, native, hash key or None) from the strategy's metadata table"""
+    metadata_table = _METADATA_TABLES[strategy]
+    cursor.execute(f"SELECT to_regclass('{metadata_table}') IS NOT NULL")
+    row = None
+    if cursor.fetchone()[0]:
+        key_sql = "key_column" if strategy == 'hash' else "NULL"
+        cursor.execute(f"SELECT num_partitions, native, {key_sql} FROM {metadata_table} WHERE id = 1")
+        row = cursor.fetchone()
+    if not row:
+        raise Exception(f"No {strategy} partitions found. Please partition the table first.")
+    return row
+
+def _switch_layout(strategy, ratingstablename, old_N, new_N, native, key, cursor):
+    """
+    Point the metadata, insert routing and table names at the new layout. Runs
+    in one short transaction; afterwards new inserts land in the new layout and
+    the rows already stored are moved by _drain_moves.
+    """
+    prefix = _TABLE_PREFIXES[strategy]
+    parent = _PARENT_NAMES[strategy](ratingstablename)
+
+    if strategy == 'range':
+        old_router = get_range_router(cursor.connection)
+        new_router = RangeRouter.for_partitions(new_N)
+        keep = _range_keep_map(old_router, new_router)
+    else:
+        keep = {i: i for i in range(min(old_N, new_N))}
+
+    # Range and hash children are detached while rows move, since their bounds
+    # change; round robin slots of the kept tables stay valid
+    if native:
+        for i in range(old_N):
+            if strategy != 'roundrobin' or i >= new_N:
+                cursor.execute(f"ALTER TABLE {parent} DETACH PARTITION {prefix}{i}")
+        if strategy != 'roundrobin':
+            cursor.execute(f"DROP TABLE {parent}")
+
+    # New tables follow the durability mode of the ratings table, like the rest
+    persistence = partition_persistence_sql(ratingstablename, cursor)
+
+    # Old tables whose index changes or that are not kept step aside under
+    # *_old names, then the kept ones take their new names
+    for i in range(old_N):
+        if keep.get(i) != i:
+            cursor.execute(f"ALTER TABLE {prefix}{i} RENAME TO {retired_partition_name(prefix, i)}")
+    for j in range(new_N):
+        i = keep.get(j)
+        if i != j:
+            # A table left over from an earlier, larger partitioning may hold the name
+            cursor.execute(f"DROP TABLE IF EXISTS {prefix}{j}")
+        if i is None:
+            for sql in _create_partition_sql(strategy, j, key, persistence):
+                cursor.execute(sql)
+            if native and strategy == 'roundrobin':
+                cursor.execute(f"ALTER TABLE {prefix}{j} ADD COLUMN rr_slot INT NOT NULL")
+                cursor.execute(f"ALTER TABLE {parent} ATTACH PARTITION {prefix}{j} FOR VALUES IN ({j})")
+        elif i != j:
+            cursor.execute(f"ALTER TABLE {retired_partition_name(prefix, i)} RENAME TO {prefix}{j}")
+
+    if strategy == 'range':
+        cursor.execute("UPDATE range_metadata SET num_partitions = %s, native = FALSE, bounds = %s, "
+                       "generation = nextval('range_metadata_generation_seq') WHERE id = 1", (new_N, new_router.bounds))
+    elif strategy == 'hash':
+        cursor.execute("UPDATE hash_metadata SET num_partitions = %s, native = FALSE WHERE id = 1", (new_N,))
+    else:
+        # Replace rrobin_insert() for the new N; the insertion counter carries on
+        cursor.execute("UPDATE rrobin_metadata SET num_partitions = %s WHERE id = 1", (new_N,))
+        create_rrobin_insert_function(ratingstablename, new_N, native, cursor, reset_sequence=False)
+
+    moves_table = repartition_moves_name(strategy)
+    cursor.execute(f"DROP TABLE IF EXISTS {moves_table}")
+    cursor.execute(f"""
+        CREATE TABLE {moves_table} (
+            id BIGSERIAL PRIMARY KEY,
+            source TEXT NOT NULL,
+            row_ctid TID NOT NULL,
+            target INT NOT NULL
+        )
+    """)
+
+def _target_sql(strategy, old_N, new_N, key, old_index):
+    """SQL expression giving the new partition of each row of an old table"""
+    if strategy == 'range':
+        return RangeRouter.for_partitions(new_N).partition_sql()
+    if strategy == 'hash':
+        return hash_slot_sql(key, new_N)
+    # Round robin: row r of old partition i held global position r * old_N + i
+    # (rows numbered in physical order), which keeps its place in the new rotation
+    return f"((ROW_NUMBER() OVER (ORDER BY ctid) - 1) * {old_N} + {old_index}) % {new_N}"
+
+def _plan_moves(strategy, old_N, new_N, key, include_kept, cursor):
+    """
+    List every row whose partition changes in the moves table. Drained *_old
+    tables are always scanned; the kept tables only when `include_kept`.
+    Returns the number of rows planned.
+    """
+    prefix = _TABLE_PREFIXES[strategy]
+    moves_table = repartition_moves_name(strategy)
+    cursor.execute("SELECT tablename FROM pg_tables WHERE schemaname = current_schema() AND tablename ~ %s "
+                   "ORDER BY tablename", (f"^{prefix}[0-9]+_old$",))
+    sources = [(table, int(re.match(rf"{prefix}(\d+)_old", table).group(1)), -1) for (table,) in cursor.fetchall()]
+    if include_kept:
+        sources.extend((f"{prefix}{j}", j, j) for j in range(new_N))
+
+    planned = 0
+    for table, old_index, own_index in sources:
+        cursor.execute(f"""
+            INSERT INTO {moves_table} (source, row_ctid, target)
+            SELECT '{table}', ctid, target FROM (
+                SELECT ctid, {_target_sql(strategy, old_N, new_N, key, old_index)} AS target FROM {table}
+            ) planned
+            WHERE target <> {own_index}
+        """)
+        planned += cursor.rowcount
+    return planned
+
+def _drain_moves(strategy, new_N, native, batch_rows, openconnection, report):
+    """Move the planned rows batch by batch, one committed transaction each"""
+    prefix = _TABLE_PREFIXES[strategy]
+    moves_table = repartition_moves_name(strategy)
+    slot_column, slot_value = (", rr_slot", ", target") if native and strategy == 'roundrobin' else ("", "")
+    inserts = ",\n".join(
+        f"insert_{j} AS (INSERT INTO {prefix}{j} (userid, movieid, rating{slot_column}) "
+        f"SELECT userid, movieid, rating{slot_value} FROM moved WHERE target = {j})"
+        for j in range(new_N)
+    )
+
+    cursor = openconnection.cursor()
+    try:
+        cursor.execute(f"SELECT source, MIN(id), MAX(id) FROM {moves_table} GROUP BY source ORDER BY MIN(id)")
+        for source, first_id, last_id in cursor.fetchall():
+            for low in range(first_id, last_id + 1, batch_rows):
+                set_bulk_settings(cursor)
+                cursor.execute(f"""
+                    WITH batch AS (
+                        DELETE FROM {moves_table} WHERE source = %s AND id >= %s AND id < %s
+                        RETURNING row_ctid, target
+                    ), deleted AS (
+                        -- ctid = ANY(...) is a TID scan: only the batch's pages are read
+                        DELETE FROM {source} WHERE ctid = ANY(ARRAY(SELECT row_ctid FROM batch))
+                        RETURNING ctid, userid, movieid, rating
+                    ), moved AS (
+                        SELECT batch.target, deleted.userid, deleted.movieid, deleted.rating
+                        FROM deleted JOIN batch ON batch.row_ctid = deleted.ctid
+                    ),
+                    {inserts}
+                    SELECT COUNT(*) FROM moved
+                """, (source, low, low + batch_rows))
+                moved = cursor.fetchone()[0]
+                report(cursor, moved)
+                openconnection.commit()
+    finally:
+        cursor.close()
+
+def _finish_layout(strategy, ratingstablename, new_N, native, key, cursor):
+    """Drop the drained *_old tables and, in native mode, attach the children to a parent with the new bounds"""
+    prefix = _TABLE_PREFIXES[strategy]
+    parent = _PARENT_NAMES[strategy](ratingstablename)
+    cursor.execute("SELECT tablename FROM pg_tables WHERE schemaname = current_schema() AND tablename ~ %s",
+                   (f"^{prefix}[0-9]+_old$",))
+    for (table,) in cursor.fetchall():
+        cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"DROP TABLE {repartition_moves_name(strategy)}")
+
+    if native and strategy == 'range':
+        router = RangeRouter.for_partitions(new_N, native=True)
+        cursor.execute(f"CREATE TABLE {parent} (userid INT, movieid INT, rating FLOAT) PARTITION BY RANGE (rating)")
+        for j in range(new_N):
+            lower_sql, upper_sql = router.partition_bound_sql(j)
+            cursor.execute(f"ALTER TABLE {parent} ATTACH PARTITION {prefix}{j} "
+                           f"FOR VALUES FROM ({lower_sql}) TO ({upper_sql})")
+        cursor.execute("UPDATE range_metadata SET native = TRUE, "
+                       "generation = nextval('range_metadata_generation_seq') WHERE id = 1")
+    elif native and strategy == 'hash':
+        cursor.execute(f"CREATE TABLE {parent} (userid INT, movieid INT, rating FLOAT) "
+                       f"PARTITION BY LIST (({hash_slot_sql(key, new_N)}))")
+        for j in range(new_N):
+            cursor.execute(f"ALTER TABLE {parent} ATTACH PARTITION {prefix}{j} FOR VALUES IN ({j})")
+        cursor.execute("UPDATE hash_metadata SET native = TRUE WHERE id = 1")
+
+def repartition(strategy, numberofpartitions, openconnection, ratingstablename='ratings',
+                batch_rows=REPARTITION_BATCH_ROWS):
+    """
+    Change the number of range, round robin or hash partitions in place,
+    moving only the rows whose partition changes instead of rebuilding every
+    partition from the ratings table.
+
+    Range partitions are split or merged: each new partition keeps the old
+    table it overlaps most, so growing from 5 to 10 moves about half the rows.
+    Round robin rows keep their position in the rotation (row r of partition i
+    was row r * N + i) and go to position % new N. Hash rows go to their slot
+    for the new N.
+
+    The new layout takes effect in one short transaction at the start, so
+    inserts keep working and go to the new partitions; the existing rows then
+    move in committed batches of `batch_rows`. Until it finishes, pruned
+    queries can miss rows still waiting to move. Progress and an ETA are
+    printed per batch and readable from any session with repartition_status().
+    An interrupted run resumes when repartition is called again with the same
+    arguments. Native parents (native=True) are rebuilt with the new bounds.
+    """
+    if strategy not in REPARTITION_STRATEGIES:
+        raise ValueError(f"Unknown partitioning strategy '{strategy}', expected one of {REPARTITION_STRATEGIES}")
+    if not isinstance(numberofpartitions, int) or numberofpartitions <= 0:
+        raise ValueError(f"Number of partitions ({numberofpartitions}) must be a positive integer")
+
+    print(f"\n--- Starting {strategy.upper()} repartitioning to {numberofpartitions} partitions ---")
+    start_time = time.time()
+    cursor = openconnection.cursor()
+    try:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {REPARTITION_PROGRESS_TABLE} (
+                strategy TEXT PRIMARY KEY,
+                old_partitions INT NOT NULL,
+                new_partitions INT NOT NULL,
+                native BOOLEAN NOT NULL,
+                rows_planned BIGINT NOT NULL DEFAULT 0,
+                rows_moved BIGINT NOT NULL DEFAULT 0,
+                started_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp(),
+                updated_at TIMESTAMPTZ,
+                finished_at TIMESTAMPTZ
+            )
+        """)
+        cursor.execute(f"SELECT old_partitions, new_partitions, native FROM {REPARTITION_PROGRESS_TABLE} "
+                       f"WHERE strategy = %s AND finished_at IS NULL", (strategy,))
+        unfinished = cursor.fetchone()
+
+        if unfinished:
+            old_N, new_N, native = unfinished
+            if new_N != numberofpartitions:
+                raise Exception(f"An unfinished {strategy} repartition from {old_N} to {new_N} partitions exists; "
+                                f"rerun it with {new_N} partitions first")
+            key = _read_layout(strategy, cursor)[2]
+            print(f"Resuming {strategy} repartition from {old_N} to {new_N} partitions")
+        else:
+            old_N, native, key = _read_layout(strategy, cursor)
+            new_N = numberofpartitions
+            _switch_layout(strategy, ratingstablename, old_N, new_N, native, key, cursor)
+            cursor.execute(f"DELETE FROM {REPARTITION_PROGRESS_TABLE} WHERE strategy = %s", (strategy,))
+            cursor.execute(f"INSERT INTO {REPARTITION_PROGRESS_TABLE} (strategy, old_partitions, new_partitions, native) "
+                           f"VALUES (%s, %s, %s, %s)", (strategy, old_N, new_N, native))
+        openconnection.commit()
+        if strategy == 'range':
+            invalidate_range_router(openconnection)
+
+        def report(report_cursor, moved):
+            report_cursor.execute(f"""
+                UPDATE {REPARTITION_PROGRESS_TABLE} SET rows_moved = rows_moved + %s, updated_at = clock_timestamp()
+                WHERE strategy = %s RETURNING rows_moved, rows_planned
+            """, (moved, strategy))
+            rows_moved, rows_planned = report_cursor.fetchone()
+            status = repartition_status(strategy, report_cursor.connection)
+            eta = f"{status['eta_seconds']:.1f}s" if status['eta_seconds'] is not None else "unknown"
+            print(f"Moved {rows_moved:,}/{rows_planned:,} rows, ETA {eta}")
+
+        # Plan and move until no row is left in the wrong partition: later passes
+        # pick up rows written by inserts that still used the old layout
+        include_kept = not unfinished
+        while True:
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {repartition_moves_name(strategy)})")
+            if not cursor.fetchone()[0]:
+                # Round robin accepts any slot in a kept table, so only the first pass scans them
+                planned = _plan_moves(strategy, old_N, new_N, key, include_kept or strategy != 'roundrobin', cursor)
+                cursor.execute(f"UPDATE {REPARTITION_PROGRESS_TABLE} SET rows_planned = rows_planned + %s WHERE strategy = %s",
+                               (planned, strategy))
+                openconnection.commit()
+                include_kept = False
+                if not planned:
+                    break
+            _drain_moves(strategy, new_N, native, batch_rows, openconnection, report)
+
+        _finish_layout(strategy, ratingstablename, new_N, native, key, cursor)
+        cursor.execute(f"UPDATE {REPARTITION_PROGRESS_TABLE} SET finished_at = clock_timestamp() WHERE strategy = %s "
+                       f"RETURNING rows_moved", (strategy,))
+        rows_moved = cursor.fetchone()[0]
+        openconnection.commit()
+        if strategy == 'range':
+            invalidate_range_router(openconnection)
+
+        elapsed_time = time.time() - start_time
+        print(f"Repartitioned {strategy} from {old_N} to {new_N} partitions, moved {rows_moved:,} rows "
+              f"in {elapsed_time:.2f} seconds")
+        print(f"--- Finished {strategy.upper()} repartitioning ---\n")
+        return {'strategy': strategy, 'old_partitions': old_N, 'new_partitions': new_N,
+                'rows_moved': rows_moved, 'seconds': elapsed_time}
+
+    except Exception as e:
+        openconnection.rollback()
+        if strategy == 'range':
+            invalidate_range_router(openconnection)
+        print(f"Error repartitioning {strategy} partitions: {e}")
+        print("Committed batches are kept; call repartition again to resume")
+        raise
+    finally:
+        cursor.close()
+
+def repartition_status(strategy, openconnection):
+    """
+    Progress of the latest repartition of `strategy`, or None: partition
+    counts, rows planned and moved, elapsed seconds, ETA and whether it is done.
+    Can be called from another session while repartition runs.
+    """
+    with openconnection.cursor() as cursor:
+        cursor.execute(f"SELECT to_regclass('{REPARTITION_PROGRESS_TABLE}') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            return None
+        cursor.execute(f"""
+            SELECT old_partitions, new_partitions, rows_planned, rows_moved,
+                   EXTRACT(EPOCH FROM COALESCE(finished_at, clock_timestamp()) - started_at),
+                   finished_at IS NOT NULL
+            FROM {REPARTITION_PROGRESS_TABLE} WHERE strategy = %s
+        """, (strategy,))
+        row = cursor.fetchone()
+    if not row:
+        return None
+
+    old_N, new_N, rows_planned, rows_moved, elapsed, finished = row
+    elapsed = float(elapsed)
+    remaining = max(rows_planned - rows_moved, 0)
+    eta = 0.0 if finished or not remaining else (remaining * elapsed / rows_moved if rows_moved else None)
+    return {'old_partitions': old_N, 'new_partitions': new_N, 'rows_planned': rows_planned,
+            'rows_moved': rows_moved, 'elapsed_seconds': elapsed, 'eta_seconds': eta, 'finished': finished}
@@ -0,0 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from database.database import connection_params_of
+from database.pool import get_pool
+from partitioning.partitioning import (RANGE_TABLE_PREFIX, RROBIN_TABLE_PREFIX, HASH_TABLE_PREFIX,
+                                       get_range_router, hashpartition_for)
+from utils import metrics
+
+AGGREGATES = ('count', 'sum', 'avg', 'min', 'max')
+GROUP_BY_COLUMNS = ('movieid', 'userid')
+STRATEGIES = ('range', 'roundrobin', 'hash')
+
+def _rrobin_partition_count(openconnection):
+    with openconnection.cursor() as cursor:
+        cursor.execute("SELECT num_partitions FROM rrobin_metadata WHERE id = 1")
+        row = cursor.fetchone()
+    if not row:
+        raise Exception("Round Robin metadata not found. Please run RoundRobin_Partition() first.")
+    return row[0]
+
+def _hash_metadata(openconnection):
+    with openconnection.cursor() as cursor:
+        cursor.execute("SELECT key_column, num_partitions FROM hash_metadata WHERE id = 1")
+        row = cursor.fetchone()
+    if not row:
+        raise Exception("Hash metadata not found. Please run hashpartition first.")
+    return row
+
+def partitions_for_query(strategy, openconnection, userid=None, movieid=None, rating_min=None, rating_max=None):
+    """
+    Partition tables that can hold rows matching the filter. Range partitions
+    outside [rating_min, rating_max] and hash partitions of other keys are pruned.
+    """
+    if strategy == 'range':
+        range_router = get_range_router(openconnection)
+        return [f"{RANGE_TABLE_PREFIX}{i}" for i in range_router.partitions_for_interval(rating_min, rating_max)]
+
+    if strategy == 'roundrobin':
+        return [f"{RROBIN_TABLE_PREFIX}{i}" for i in range(_rrobin_partition_count(openconnection))]
+
+    if strategy == 'hash':
+        key, numberofpartitions = _hash_metadata(openconnection)
+        keyvalue = {'userid': userid, 'movieid': movieid}[key]
+        if keyvalue is not None:
+            return [f"{HASH_TABLE_PREFIX}{hashpartition_for(keyvalue, numberofpartitions)}"]
+        return [f"{HASH_TABLE_PREFIX}{i}" for i in range(numberofpartitions)]
+
+    raise ValueError(f"Unknown partitioning strategy '{strategy}', expected one of {STRATEGIES}")
+
+def _partial_sql(tablename, userid, movieid, rating_min, rating_max, group_by):
+    """Per-partition statement returning mergeable partials: [group,] count, sum, min, max"""
+    conditions, params = [], []
+    for column, value, operator in (('userid', userid, '='), ('movieid', movieid, '='),
+                                    ('rating', rating_min, '>='), ('rating', rating_max, '<=')):
+        if value is not None:
+            conditions.append(f"{column} {operator} %s")
+            params.append(value)
+    where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    group_select = f"{group_by}, " if group_by else ""
+    group_sql = f"GROUP BY {group_by}" if group_by else ""
+    return (f"SELECT {group_select}COUNT(*), SUM(rating), MIN(rating), MAX(rating) "
+            f"FROM {tablename} {where_sql} {group_sql}"), params
+
+def _merge(partials, aggregates):
+    """Combine (count, sum, min, max) partials; AVG is the merged sum over the merged count"""
+    count = sum(p[0] for p in partials)
+    total = sum(p[1] for p in partials if p[1] is not None) if count else None
+    minimum = min((p[2] for p in partials if p[2] is not None), default=None)
+    maximum = max((p[3] for p in partials if p[3] is not None), default=None)
+    values = {'count': count, 'sum': total, 'min': minimum, 'max': maximum,
+              'avg': total / count if count else None}
+    return {name: values[name] for name in aggregates}
+
+def query_ratings(strategy, openconnection, userid=None, movieid=None, rating_min=None, rating_max=None,
+                  aggregates=('count', 'avg'), group_by=None, workers=None):
+    """
+    Aggregate ratings straight from the partitions of one strategy.
+
+    Filters are equality on userid/movieid and an inclusive rating interval.
+    The partitions left after pruning are queried concurrently on pooled
+    connections (up to `workers`, default the pool size), so they read committed
+    data; with workers=1 they are read one by one on `openconnection`.
+    Returns {aggregate: value}, or {group value: {aggregate: value}} with group_by.
+    """
+    aggregates = tuple(aggregates)
+    unknown = [name for name in aggregates if name not in AGGREGATES]
+    if unknown:
+        raise ValueError(f"Unknown aggregates {unknown}, expected a subset of {AGGREGATES}")
+    if group_by is not None and group_by not in GROUP_BY_COLUMNS:
+        raise ValueError(f"Cannot group by '{group_by}', expected one of {GROUP_BY_COLUMNS}")
+
+    tablenames = partitions_for_query(strategy, openconnection, userid, movieid, rating_min, rating_max)
+    statements = [_partial_sql(tablename, userid, movieid, rating_min, rating_max, group_by)
+                  for tablename in tablenames]
+
+    def fetch(conn, sql, params):
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    if workers == 1 or len(statements) <= 1:
+        results = [fetch(openconnection, sql, params) for sql, params in statements]
+    else:
+        pool = get_pool(connection_params_of(openconnection))
+
+        def fetch_pooled(statement):
+            with pool.connection() as conn:
+                return fetch(conn, *statement)
+
+        with ThreadPoolExecutor(max_workers=min(workers or pool.maxconn, pool.maxconn, len(statements))) as executor:
+            results = list(executor.map(fetch_pooled, statements))
+    metrics.info(f"Queried {len(tablenames)} {strategy} partitions")
+
+    if group_by is None:
+        return _merge([row for rows in results for row in rows], aggregates)
+
+    groups = {}
+    for rows in results:
+        for row in rows:
+            groups.setdefault(row[0], []).append(row[1:])
+    return {key: _merge(partials, aggregates) for key, partials in groups.items()}
+
+def movie_rating_stats(strategy, openconnection, movieid=None, workers=None):
+    """Per-movie rating count and average, served from the partitions"""
+    stats = query_ratings(strategy, openconnection, movieid=movieid, aggregates=('count', 'avg'),
+                          group_by='movieid', workers=workers)
+    return stats if movieid is None else stats.get(movieid)
@@ -0,0 +1,261 @@
+import hashlib
+import os
+import re
+import struct
+import time
+import zlib
+
+import requests
+
+# Bytes per network read and per read of an already downloaded file
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Times a dropped connection is resumed with a Range request before giving up
+DOWNLOAD_RETRIES = 5
+
+# Seconds to wait for the server to connect or send more data
+DOWNLOAD_TIMEOUT = 60
+
+# Zip local file header: signature, version, flags, method, time, date, crc32,
+# compressed size, uncompressed size, name length, extra field length
+ZIP_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+ZIP_LOCAL_HEADER_SIGNATURE = 0x04034b50
+ZIP_DATA_DESCRIPTOR_SIGNATURE = 0x08074b50
+ZIP_FLAG_ENCRYPTED = 0x01
+ZIP_FLAG_DATA_DESCRIPTOR = 0x08
+ZIP_FLAG_UTF8 = 0x800
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP64_SIZE = 0xFFFFFFFF
+
+def fetch_checksum(url, session=None):
+    """
+    'md5:<hex>' from the `<url>.md5` file published next to the archive (as
+    GroupLens does), or None with a warning when it cannot be fetched.
+    """
+    try:
+        response = (session or requests).get(f"{url}.md5", timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        match = re.search(r'\b[0-9a-fA-F]{32}\b', response.text)
+        if match:
+            return f"md5:{match.group(0).lower()}"
+    except requests.RequestException as e:
+        print(f"Warning: could not fetch checksum {url}.md5: {e}")
+        return None
+    print(f"Warning: no MD5 checksum found in {url}.md5")
+    return None
+
+def _read_file_chunks(path, chunk_bytes):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                return
+            yield chunk
+
+def iter_download(url, path, checksum=None, chunk_bytes=DOWNLOAD_CHUNK_BYTES, retries=DOWNLOAD_RETRIES, session=None):
+    """
+    Yield the bytes of `url` front to back while saving them to `path`, so the
+    caller can consume the file while it downloads.
+
+    A complete `path` is read back from disk. Otherwise the bytes kept in
+    `<path>.part` by an interrupted run are yielded first and only the rest is
+    requested, with an HTTP Range header; a connection dropped mid-way is
+    resumed the same way up to `retries` times. A server that ignores Range
+    resends the whole file and the bytes already held are skipped.
+
+    checksum ('md5:<hex>', 'sha256:<hex>', ...) is verified over the whole file
+    after its last byte was yielded and before the generator finishes: a
+    mismatch deletes the file and raises ValueError, so a consumer that only
+    commits at end of input never commits corrupt data. `<path>.part` is
+    renamed to `path` once the download is complete and verified.
+    """
+    algorithm, expected = checksum.split(':', 1) if checksum else (None, None)
+    hasher = hashlib.new(algorithm) if algorithm else None
+    part_path = f"{path}.part"
+    source = path if os.path.exists(path) else part_path
+    offset = 0
+
+    # Bytes already on disk, from a finished or an interrupted download
+    if os.path.exists(source):
+        for chunk in _read_file_chunks(source, chunk_bytes):
+            if hasher:
+                hasher.update(chunk)
+            offset += len(chunk)
+            yield chunk
+        if source == part_path:
+            print(f"Resuming download of {url} at {offset:,} bytes")
+
+    if source == part_path:
+        session = session or requests.Session()
+        attempts = 0
+        with open(part_path, 'ab') as out:
+            while True:
+                headers = {'Range': f"bytes={offset}-"} if offset else {}
+                try:
+                    with session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                        if offset and response.status_code == 416:
+                            # Nothing past `offset`: the interrupted run already had every byte
+                            break
+                        response.raise_for_status()
+                        skip = offset if response.status_code != 206 else 0
+                        for chunk in response.iter_content(chunk_size=chunk_bytes):
+                            if skip:
+                                dropped = min(skip, len(chunk))
+                                chunk, skip = chunk[dropped:], skip - dropped
+                                if not chunk:
+                                    continue
+                            out.write(chunk)
+                            if hasher:
+                                hasher.update(chunk)
+                            offset += len(chunk)
+                            yield chunk
+                    break
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                    attempts += 1
+                    if attempts > retries:
+                        raise
+                    print(f"Download interrupted at {offset:,} bytes ({e}); resuming ({attempts}/{retries})")
+                    out.flush()
+                    time.sleep(min(attempts, 5))
+
+    if hasher and hasher.hexdigest() != expected.lower():
+        os.remove(source)
+        raise ValueError(f"{algorithm} checksum mismatch for {url}: expected {expected}, got {hasher.hexdigest()}; "
+                         f"the file was deleted and will be downloaded again")
+    if source == part_path:
+        os.replace(part_path, path)
+        print(f"Downloaded {offset:,} bytes to {path}")
+
+def download_file(url, path, checksum=None, **kwargs):
+    """Download (or finish downloading) `url` to `path` with iter_download; returns `path`"""
+    for _ in iter_download(url, path, checksum, **kwargs):
+        pass
+    return path
+
+class _ChunkReader:
+    """Exact-size reads over an iterator of byte chunks, with push-back of unused bytes"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+
+    def read_some(self):
+        """The buffered bytes, or the next chunk; b'' at the end"""
+        if self._buffer:
+            data, self._buffer = self._buffer, b''
+            return data
+        return next(self._chunks, b'')
+
+    def read(self, size):
+        if not size:
+            return b''
+        parts, have = [], 0
+        while have < size:
+            data = self.read_some()
+            if not data:
+                raise EOFError(f"Archive ended {size - have} bytes early")
+            parts.append(data)
+            have += len(data)
+        data = b''.join(parts)
+        self._buffer = data[size:]
+        return data[:size]
+
+    def unread(self, data):
+        self._buffer = data + self._buffer
+
+    def skip(self, size):
+        while size:
+            data = self.read_some()
+            if not data:
+                raise EOFError(f"Archive ended {size} bytes early")
+            if len(data) > size:
+                self.unread(data[size:])
+                data = data[:size]
+            size -= len(data)
+
+    def drain(self):
+        while self.read_some():
+            pass
+
+def _iter_member_data(reader, method, compressed_size):
+    """Uncompressed bytes of the member whose data starts at the reader (size None = unknown, deflate only)"""
+    if method == ZIP_STORED:
+        remaining = compressed_size
+        while remaining:
+            data = reader.read_some()
+            if not data:
+                raise EOFError("Archive ended inside a member")
+            if len(data) > remaining:
+                reader.unread(data[remaining:])
+                data = data[:remaining]
+            remaining -= len(data)
+            yield data
+        return
+    if method != ZIP_DEFLATED:
+        raise ValueError(f"Unsupported zip compression method {method}")
+    inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+    while not inflater.eof:
+        data = reader.read_some()
+        if not data:
+            raise EOFError("Archive ended inside a member")
+        output = inflater.decompress(data)
+        if output:
+            yield output
+    reader.unread(inflater.unused_data)
+
+def iter_zip_member(chunks, member):
+    """
+    Yield the uncompressed bytes of `member` (a full name, or a file name
+    matched at the end of the member's path) from a zip archive given as an
+    iterator of byte chunks, e.g. iter_download(). The local headers are read
+    in order, so the member is decompressed while the archive is still
+    arriving and nothing is extracted to disk. The member's CRC-32 is checked,
+    and the rest of the archive is consumed before the generator finishes so
+    the chunk source can complete (and verify) the download.
+    """
+    reader = _ChunkReader(chunks)
+    while True:
+        try:
+            header = ZIP_LOCAL_HEADER.unpack(reader.read(ZIP_LOCAL_HEADER.size))
+        except EOFError:
+            header = None
+        if header is None or header[0] != ZIP_LOCAL_HEADER_SIGNATURE:
+            # Central directory (or end of input) reached without finding it
+            reader.drain()
+            raise FileNotFoundError(f"{member} not found in the archive")
+
+        _, _, flags, method, _, _, crc, compressed_size, _, name_length, extra_length = header
+        name = reader.read(name_length).decode('utf-8' if flags & ZIP_FLAG_UTF8 else 'cp437')
+        reader.read(extra_length)
+        if flags & ZIP_FLAG_ENCRYPTED:
+            raise ValueError(f"Encrypted zip member {name} is not supported")
+        has_descriptor = flags & ZIP_FLAG_DATA_DESCRIPTOR
+        if compressed_size == ZIP64_SIZE:
+            raise ValueError(f"Zip64 member {name} is not supported")
+        if has_descriptor and method == ZIP_STORED:
+            raise ValueError(f"Zip member {name} is stored without sizes and cannot be streamed")
+
+        wanted = name == member or name.endswith('/' + member)
+        actual_crc = 0
+        if not wanted and not has_descriptor:
+            reader.skip(compressed_size)
+        else:
+            for data in _iter_member_data(reader, method, None if has_descriptor else compressed_size):
+                if wanted:
+                    actual_crc = zlib.crc32(data, actual_crc)
+                    yield data
+
+        if has_descriptor:
+            # Optional signature, then crc32, compressed and uncompressed size
+            (first,) = struct.unpack('<I', reader.read(4))
+            if first == ZIP_DATA_DESCRIPTOR_SIGNATURE:
+                (first,) = struct.unpack('<I', reader.read(4))
+            crc = first
+            reader.read(8)
+
+        if wanted:
+            if actual_crc != crc:
+                raise ValueError(f"CRC-32 mismatch in zip member {name}")
+            reader.drain()
+            return
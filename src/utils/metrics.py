@@ -0,0 +1,273 @@
+"""
+In-process instrumentation of the load, partition and insert paths.
+
+Three kinds of metric are kept, keyed by name and labels:
+
+- spans: `with span('load', table=...) as s:` times a block, records its
+  duration in the `<name>_seconds` histogram and reports it to the sinks;
+- counters: `count('rows_loaded', n)`, e.g. rows and bytes streamed;
+- histograms: `observe('insert_seconds', seconds)`, e.g. per-statement latency.
+
+Where they go is set by DB_METRICS (DatabaseConfig.get_metrics_sinks()), a
+comma-separated list of sinks:
+
+- `log`: one line per span and a summary at exit, via the logging module;
+- `jsonl:<path>`: one JSON object per span, and a snapshot of all counters
+  and histograms at exit, appended to <path>;
+- `prometheus:<path>`: the whole registry in the Prometheus text exposition
+  format, rewritten atomically after every span (for node_exporter's textfile
+  collector or a scrape through any static file server).
+
+With DB_QUIET set, info() drops the per-row and progress messages of the hot
+paths, while the metrics themselves are still collected.
+"""
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from config.config import DatabaseConfig
+
+# Every exported metric is prefixed with this
+METRIC_PREFIX = 'movielens_'
+
+# Histogram upper bounds in seconds, from a single-row INSERT to a 10M-row load
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+logger = logging.getLogger('movielens.metrics')
+
+class Histogram:
+    """Cumulative-bucket histogram with the fixed LATENCY_BUCKETS"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        return {'count': self.count, 'sum': round(self.sum, 6),
+                'buckets': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], self.buckets))}
+
+class Registry:
+    """Thread-safe counters and histograms, keyed by (name, sorted label items)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def count(self, name, value, labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def snapshot(self):
+        """Plain-dict copy of every metric, as written by the JSON lines sink"""
+        with self._lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                'histograms': [dict({'name': name, 'labels': dict(labels)}, **histogram.as_dict())
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+            }
+
+    def prometheus_text(self):
+        """The registry in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {METRIC_PREFIX}{name}_total counter")
+                for (key_name, labels), value in sorted(self.counters.items()):
+                    if key_name == name:
+                        lines.append(f"{METRIC_PREFIX}{name}_total{_label_text(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} histogram")
+                for (key_name, labels), histogram in sorted(self.histograms.items()):
+                    if key_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket in zip([repr(b) for b in LATENCY_BUCKETS] + ['+Inf'], histogram.buckets):
+                        cumulative += bucket
+                        lines.append(f"{METRIC_PREFIX}{name}_bucket{_label_text(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{METRIC_PREFIX}{name}_sum{_label_text(labels)} {histogram.sum!r}")
+                    lines.append(f"{METRIC_PREFIX}{name}_count{_label_text(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+class LogSink:
+    def __init__(self):
+        if not logger.handlers and not logging.getLogger().handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('[metrics] %(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+    def span(self, name, seconds, labels):
+        label_text = ' '.join(f"{key}={value}" for key, value in sorted(labels.items()))
+        logger.info(f"{name} {seconds:.4f}s {label_text}".rstrip())
+
+    def flush(self, registry, final):
+        if not final:
+            return
+        for (name, labels), value in sorted(registry.counters.items()):
+            logger.info(f"{name}{_label_text(labels)} = {value:,}")
+        for (name, labels), histogram in sorted(registry.histograms.items()):
+            mean = histogram.sum / histogram.count if histogram.count else 0.0
+            logger.info(f"{name}{_label_text(labels)} count={histogram.count:,} sum={histogram.sum:.3f}s mean={mean:.6f}s")
+
+class JsonLinesSink:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _write(self, record):
+        line = json.dumps(record) + '\n'
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line)
+
+    def span(self, name, seconds, labels):
+        self._write({'time': time.time(), 'type': 'span', 'name': name, 'seconds': round(seconds, 6), 'labels': labels})
+
+    def flush(self, registry, final):
+        if final:
+            self._write(dict({'time': time.time(), 'type': 'snapshot', 'pid': os.getpid()}, **registry.snapshot()))
+
+class PrometheusFileSink:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def span(self, name, seconds, labels):
+        pass
+
+    def flush(self, registry, final):
+        # Written next to the target and renamed over it, so a scraper never reads half a file
+        with self._lock:
+            partial_path = f"{self.path}.{os.getpid()}.partial"
+            with open(partial_path, 'w') as f:
+                f.write(registry.prometheus_text())
+            os.replace(partial_path, self.path)
+
+def create_sink(spec):
+    """Sink for one DB_METRICS entry: 'log', 'jsonl:<path>' or 'prometheus:<path>'"""
+    kind, _, path = spec.partition(':')
+    kind = kind.strip().lower()
+    if kind == 'log':
+        return LogSink()
+    if kind in ('jsonl', 'prometheus') and path:
+        return JsonLinesSink(path) if kind == 'jsonl' else PrometheusFileSink(path)
+    raise ValueError(f"Unknown metrics sink '{spec}'; expected 'log', 'jsonl:<path>' or 'prometheus:<path>'")
+
+registry = Registry()
+_sinks = None
+_quiet = None
+
+def configure(sinks=None, quiet=None):
+    """
+    (Re)configure the sinks and quiet mode. Either defaults to the environment
+    (DB_METRICS, DB_QUIET) the first time a metric is recorded.
+    """
+    global _sinks, _quiet
+    specs = DatabaseConfig.get_metrics_sinks() if sinks is None else sinks
+    _sinks = [create_sink(spec) if isinstance(spec, str) else spec for spec in specs]
+    _quiet = DatabaseConfig.is_quiet() if quiet is None else quiet
+
+def sinks():
+    if _sinks is None:
+        configure()
+    return _sinks
+
+def quiet():
+    """Whether info() messages are suppressed (DB_QUIET)"""
+    if _quiet is None:
+        configure()
+    return _quiet
+
+def info(message):
+    """print() for per-row and progress messages of the hot paths; silent in quiet mode"""
+    if not quiet():
+        print(message)
+
+def count(name, value=1, **labels):
+    """Add `value` to the counter `name` (exported as <name>_total)"""
+    registry.count(name, value, labels)
+
+def observe(name, seconds, **labels):
+    """Record one latency sample in the histogram `name`"""
+    registry.observe(name, seconds, labels)
+
+class Span:
+    """
+    Timer of one block (see span()). Labels can be added while it runs, e.g.
+    once the load method is known; elapsed() reads the time so far and
+    `seconds` holds the final duration.
+    """
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.seconds = None
+        self._start = None
+
+    def label(self, **labels):
+        self.labels.update(labels)
+
+    def elapsed(self):
+        return time.perf_counter() - self._start
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = self.elapsed()
+        if exc_type is not None:
+            self.labels['status'] = 'error'
+        registry.observe(f"{self.name}_seconds", self.seconds, self.labels)
+        for sink in sinks():
+            sink.span(self.name, self.seconds, dict(self.labels))
+        flush()
+        return False
+
+def span(name, **labels):
+    """Context manager timing a block into the `<name>_seconds` histogram"""
+    return Span(name, labels)
+
+def flush(final=False):
+    """Hand the registry to every sink; final=True also writes the end-of-run summaries"""
+    for sink in sinks():
+        try:
+            sink.flush(registry, final)
+        except OSError as e:
+            print(f"Could not write metrics: {e}")
+
+def reset():
+    """Drop every recorded metric (sinks and quiet mode are kept)"""
+    global registry
+    registry = Registry()
+
+atexit.register(flush, True)
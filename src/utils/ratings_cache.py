@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+from array import array
+
+from utils.ratings_parser import RatingsBatch, iter_rating_batches, DEFAULT_BATCH_ROWS
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, columns are read with array.fromfile without it
+    np = None
+
+CACHE_VERSION = 2
+MANIFEST_NAME = 'manifest.json'
+
+# Column name -> (array typecode, numpy dtype without byte order)
+CACHE_COLUMNS = {
+    'userid': ('i', 'i4'),
+    'movieid': ('i', 'i4'),
+    'rating': ('d', 'f8'),
+    'timestamp': ('q', 'i8'),
+}
+
+def default_cache_dir(ratingsfilepath):
+    """Cache directory used for a ratings file: <dir>/.ratings_cache/<file name>"""
+    directory, filename = os.path.split(os.path.abspath(ratingsfilepath))
+    return os.path.join(directory, '.ratings_cache', filename)
+
+def file_checksum(filepath, chunk_bytes=4 * 1024 * 1024):
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _source_stat(ratingsfilepath):
+    stat = os.stat(ratingsfilepath)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def _read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_manifest(cache_dir, manifest):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def cache_is_valid(ratingsfilepath, cache_dir=None):
+    """
+    Return the manifest if the cache matches the current source file, else None.
+
+    Size and mtime are compared first. If only the mtime changed the checksum
+    decides, and a matching file gets its manifest refreshed instead of a rebuild.
+    """
+    cache_dir = cache_dir or default_cache_dir(ratingsfilepath)
+    manifest = _read_manifest(cache_dir)
+    if not manifest or manifest.get('version') != CACHE_VERSION or manifest.get('byteorder') != sys.byteorder:
+        return None
+    if not all(os.path.exists(os.path.join(cache_dir, f"{name}.bin")) for name in CACHE_COLUMNS):
+        return None
+
+    source = manifest['source']
+    stat = _source_stat(ratingsfilepath)
+    if stat['size'] != source['size']:
+        return None
+    if stat['mtime_ns'] != source['mtime_ns']:
+        if file_checksum(ratingsfilepath) != source['sha256']:
+            return None
+        source['mtime_ns'] = stat['mtime_ns']
+        _write_manifest(cache_dir, manifest)
+    return manifest
+
+def build_cache(ratingsfilepath, cache_dir=None):
+    """Parse the ratings file once and write one binary file per column plus a manifest"""
+    cache_dir = cache_dir or default_cache_dir(ratingsfilepath)
+    print(f"Building columnar cache for {ratingsfilepath} in {cache_dir}...")
+    stat = _source_stat(ratingsfilepath)
+
+    tmp_dir = cache_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    rows = 0
+    files = {name: open(os.path.join(tmp_dir, f"{name}.bin"), 'wb') for name in CACHE_COLUMNS}
+    try:
+        for batch in iter_rating_batches(ratingsfilepath):
+            for name in CACHE_COLUMNS:
+                getattr(batch, name).tofile(files[name])
+            rows += len(batch.userid)
+    finally:
+        for f in files.values():
+            f.close()
+
+    manifest = {
+        'version': CACHE_VERSION,
+        'byteorder': sys.byteorder,
+        'rows': rows,
+        'source': dict(stat, path=os.path.abspath(ratingsfilepath), sha256=file_checksum(ratingsfilepath)),
+        'columns': {name: {'file': f"{name}.bin", 'typecode': typecode, 'dtype': dtype}
+                    for name, (typecode, dtype) in CACHE_COLUMNS.items()},
+    }
+    _write_manifest(tmp_dir, manifest)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+    print(f"Cached {rows:,} rows")
+    return manifest
+
+def ensure_cache(ratingsfilepath, cache_dir=None):
+    """Return a valid manifest, rebuilding the cache if the source file changed"""
+    return cache_is_valid(ratingsfilepath, cache_dir) or build_cache(ratingsfilepath, cache_dir)
+
+def load_cached_ratings(ratingsfilepath, cache_dir=None):
+    """
+    All cached columns as one RatingsBatch. With numpy the columns are
+    read-only memory maps, so nothing is read until it is used.
+    """
+    cache_dir = cache_dir or default_cache_dir(ratingsfilepath)
+    manifest = ensure_cache(ratingsfilepath, cache_dir)
+    rows = manifest['rows']
+
+    columns = []
+    for name, (typecode, dtype) in CACHE_COLUMNS.items():
+        path = os.path.join(cache_dir, f"{name}.bin")
+        if np is not None:
+            columns.append(np.memmap(path, dtype=np.dtype(dtype), mode='r', shape=(rows,)) if rows
+                           else np.empty(0, dtype=np.dtype(dtype)))
+        else:
+            column = array(typecode)
+            with open(path, 'rb') as f:
+                column.fromfile(f, rows)
+            columns.append(column)
+    return RatingsBatch(*columns)
+
+def iter_cached_rating_batches(ratingsfilepath, batch_size=DEFAULT_BATCH_ROWS, cache_dir=None, start=0, end=None):
+    """
+    Yield RatingsBatch slices of the cached columns for rows [start, end),
+    the cached equivalent of iter_rating_batches without any text parsing.
+    """
+    cache_dir = cache_dir or default_cache_dir(ratingsfilepath)
+    manifest = ensure_cache(ratingsfilepath, cache_dir)
+    end = manifest['rows'] if end is None else min(end, manifest['rows'])
+
+    if np is not None:
+        columns = load_cached_ratings(ratingsfilepath, cache_dir)
+        for offset in range(start, end, batch_size):
+            yield RatingsBatch(*(column[offset:min(offset + batch_size, end)] for column in columns))
+        return
+
+    files = [open(os.path.join(cache_dir, f"{name}.bin"), 'rb') for name in CACHE_COLUMNS]
+    try:
+        for f, (typecode, _) in zip(files, CACHE_COLUMNS.values()):
+            f.seek(start * array(typecode).itemsize)
+        for offset in range(start, end, batch_size):
+            count = min(batch_size, end - offset)
+            columns = []
+            for f, (typecode, _) in zip(files, CACHE_COLUMNS.values()):
+                column = array(typecode)
+                column.fromfile(f, count)
+                columns.append(column)
+            yield RatingsBatch(*columns)
+    finally:
+        for f in files:
+            f.close()
+
+def split_cached_rows(ratingsfilepath, parts, cache_dir=None):
+    """Split the cached rows into at most `parts` contiguous (start, end) row ranges"""
+    rows = ensure_cache(ratingsfilepath, cache_dir)['rows']
+    parts = max(1, min(parts, rows))
+    bounds = [rows * i // parts for i in range(parts + 1)]
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
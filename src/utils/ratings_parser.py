@@ -0,0 +1,194 @@
+import io
+import mmap
+import os
+from array import array
+from collections import namedtuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, array.array columns are used without it
+    np = None
+
+# Column batch of parsed ratings. Columns are numpy arrays (int32, int32,
+# float64, int64) when numpy is installed, otherwise array.array ('i', 'i',
+# 'd', 'q'). Ratings stay float64, the precision of the FLOAT column they are
+# stored in, so any rating in the file reaches the table unchanged.
+RatingsBatch = namedtuple('RatingsBatch', ['userid', 'movieid', 'rating', 'timestamp'])
+
+DEFAULT_BATCH_ROWS = 1000000
+DEFAULT_BLOCK_BYTES = 8 * 1024 * 1024
+
+def iter_line_blocks(ratingsfilepath, block_bytes=DEFAULT_BLOCK_BYTES, start=0, end=None):
+    """
+    Memory-map a file and yield consecutive byte blocks of about `block_bytes`
+    that always end on a line boundary. `start`/`end` restrict reading to a
+    byte range whose edges fall on line starts.
+    """
+    with open(ratingsfilepath, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        end = file_size if end is None else min(end, file_size)
+        if start >= end:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            position = start
+            while position < end:
+                block_end = min(position + block_bytes, end)
+                if block_end < end:
+                    newline = mm.find(b'\n', block_end - 1, end)
+                    block_end = end if newline < 0 else newline + 1
+                block = mm[position:block_end]
+                position = block_end
+                if not block.endswith(b'\n'):
+                    block += b'\n'
+                yield block
+
+def iter_stream_blocks(chunks, block_bytes=DEFAULT_BLOCK_BYTES):
+    """
+    Same blocks as iter_line_blocks, from an iterator of raw byte chunks (e.g.
+    a zip member being downloaded) instead of a file on disk.
+    """
+    pending, pending_bytes = [], 0
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_bytes += len(chunk)
+        if pending_bytes < block_bytes:
+            continue
+        data = b''.join(pending)
+        cut = data.rfind(b'\n') + 1
+        if cut:
+            yield data[:cut]
+            data = data[cut:]
+        pending, pending_bytes = [data], len(data)
+    tail = b''.join(pending)
+    if tail:
+        yield tail if tail.endswith(b'\n') else tail + b'\n'
+
+def _parse_lines(block):
+    """Line-by-line fallback for blocks with malformed or short lines"""
+    userids, movieids, ratings, timestamps = [], [], [], []
+    for line in block.splitlines():
+        parts = line.split(b'::')
+        if len(parts) < 3:
+            continue
+        try:
+            userid, movieid, rating = int(parts[0]), int(parts[1]), float(parts[2])
+            timestamp = int(parts[3]) if len(parts) > 3 and parts[3].strip() else 0
+        except ValueError:
+            continue  # Skip malformed lines
+        userids.append(userid)
+        movieids.append(movieid)
+        ratings.append(rating)
+        timestamps.append(timestamp)
+    return _make_batch(userids, movieids, ratings, timestamps)
+
+def _make_batch(userids, movieids, ratings, timestamps):
+    if np is not None:
+        return RatingsBatch(np.array(userids, dtype=np.int32), np.array(movieids, dtype=np.int32),
+                            np.array(ratings, dtype=np.float64), np.array(timestamps, dtype=np.int64))
+    return RatingsBatch(array('i', userids), array('i', movieids), array('d', ratings), array('q', timestamps))
+
+def _uniform_fields(block, lines):
+    """The field count (3 or 4) shared by every line of the block, or None when lines differ"""
+    separators = block.count(b'::')
+    if separators not in (2 * lines, 3 * lines):
+        return None
+    fields = separators // lines + 1
+    if np is not None:
+        data = np.frombuffer(block, dtype=np.uint8)
+        colon = data == ord(':')
+        separator_starts = np.flatnonzero(colon[:-1] & colon[1:])
+        if separator_starts.size != separators:
+            return None  # Runs of three or more colons
+        per_line = np.diff(np.searchsorted(separator_starts, np.flatnonzero(data == ord('\n'))), prepend=0)
+        return fields if (per_line == fields - 1).all() else None
+    if any(line.count(b'::') != fields - 1 for line in block.split(b'\n')[:lines]):
+        return None
+    return fields
+
+def parse_block(block):
+    """
+    Parse a block of complete '::' lines into a RatingsBatch.
+
+    Well-formed blocks (every line has the same 3 or 4 non-empty fields) are
+    parsed in one pass over the whole block; anything else falls back to
+    line-by-line parsing that skips malformed lines.
+    """
+    lines = block.count(b'\n')
+    if lines == 0:
+        return _make_batch([], [], [], [])
+    fields = _uniform_fields(block, lines)
+    if fields is None:
+        return _parse_lines(block)
+
+    # Every field is converted on its own, so an empty field or one with inner
+    # whitespace fails the parse instead of shifting values across rows
+    if np is not None:
+        try:
+            values = np.loadtxt(io.BytesIO(block.replace(b'::', b',')), delimiter=',', comments=None, ndmin=2)
+        except ValueError:
+            return _parse_lines(block)
+        if values.shape != (lines, fields):
+            return _parse_lines(block)
+        timestamp = values[:, 3].astype(np.int64) if fields == 4 else np.zeros(lines, dtype=np.int64)
+        return RatingsBatch(values[:, 0].astype(np.int32), values[:, 1].astype(np.int32),
+                            values[:, 2].astype(np.float64), timestamp)
+
+    tokens = block.replace(b'\n', b'::').split(b'::')
+    if len(tokens) != fields * lines + 1:
+        return _parse_lines(block)
+    del tokens[-1]
+    try:
+        timestamp = array('q', map(int, tokens[3::4])) if fields == 4 else array('q', bytes(8 * lines))
+        return RatingsBatch(array('i', map(int, tokens[0::fields])), array('i', map(int, tokens[1::fields])),
+                            array('d', map(float, tokens[2::fields])), timestamp)
+    except (ValueError, OverflowError):
+        return _parse_lines(block)
+
+def _concat(parts):
+    if np is not None:
+        return np.concatenate(parts)
+    column = array(parts[0].typecode)
+    for part in parts:
+        column.extend(part)
+    return column
+
+def concat_batches(batches):
+    """Join RatingsBatch objects column by column"""
+    batches = list(batches)
+    if not batches:
+        return _make_batch([], [], [], [])
+    if len(batches) == 1:
+        return batches[0]
+    return RatingsBatch(*(_concat([batch[i] for batch in batches]) for i in range(4)))
+
+def slice_batch(batch, start, stop):
+    return RatingsBatch(*(column[start:stop] for column in batch))
+
+def iter_rating_batches(ratingsfilepath, batch_size=DEFAULT_BATCH_ROWS, start=0, end=None,
+                        block_bytes=DEFAULT_BLOCK_BYTES):
+    """
+    Parse a MovieLens ratings.dat file into RatingsBatch column batches of
+    exactly `batch_size` rows (the last batch may be shorter).
+    """
+    pending, pending_rows = [], 0
+    for block in iter_line_blocks(ratingsfilepath, block_bytes, start, end):
+        batch = parse_block(block)
+        pending.append(batch)
+        pending_rows += len(batch.userid)
+        if pending_rows < batch_size:
+            continue
+
+        merged = concat_batches(pending)
+        offset = 0
+        while pending_rows - offset >= batch_size:
+            yield slice_batch(merged, offset, offset + batch_size)
+            offset += batch_size
+        pending = [slice_batch(merged, offset, pending_rows)] if offset < pending_rows else []
+        pending_rows -= offset
+
+    if pending_rows:
+        yield concat_batches(pending)
+
+def batch_rows(batch):
+    """(userid, movieid, rating) tuples of plain Python values for DB-API calls"""
+    return list(zip(batch.userid.tolist(), batch.movieid.tolist(), batch.rating.tolist()))
@@ -1,36 +1,37 @@
 import os
-import requests
-import zipfile
+from utils.download import fetch_checksum, iter_download, iter_zip_member, DOWNLOAD_CHUNK_BYTES
 
-def download_movielens_dataset():
-    """Download and extract MovieLens dataset"""
-    dataset_url = "http://files.grouplens.org/datasets/movielens/ml-10m.zip"
-    zip_path = os.path.join("data", "ml-10m.zip")
-    extract_path = os.path.join("data", "ml-10M100K")
-    
-    # Create data directory if it doesn't exist
-    os.makedirs("data", exist_ok=True)
-    
-    # Download the dataset if it doesn't exist
-    if not os.path.exists(zip_path):
-        print("Downloading MovieLens dataset...")
-        response = requests.get(dataset_url, stream=True)
-        response.raise_for_status()
-        
-        with open(zip_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        print("Download completed.")
-    
-    # Extract the dataset if it hasn't been extracted
-    if not os.path.exists(extract_path):
-        print("Extracting dataset...")
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            # Extract only the ml-10M100K directory
-            for file in zip_ref.namelist():
-                if file.startswith('ml-10M100K/'):
-                    zip_ref.extract(file, "data")
+DATASET_URL = "https://files.grouplens.org/datasets/movielens/ml-10m.zip"
+DATA_DIR = "data"
+ZIP_PATH = os.path.join(DATA_DIR, "ml-10m.zip")
+EXTRACT_PATH = os.path.join(DATA_DIR, "ml-10M100K")
+RATINGS_MEMBER = "ml-10M100K/ratings.dat"
+
+def stream_movielens_ratings(dataset_url=DATASET_URL, zip_path=ZIP_PATH, checksum=None):
+    """
+    Raw bytes of ratings.dat, inflated straight out of the MovieLens zip while
+    it downloads (or read back from `zip_path` once it has), for
+    database.loadratings_stream. The archive is kept for later runs, an
+    interrupted download resumes with an HTTP Range request, and the archive
+    is checked against `checksum` (default: the published `<url>.md5`).
+    """
+    os.makedirs(os.path.dirname(zip_path) or '.', exist_ok=True)
+    if checksum is None:
+        checksum = fetch_checksum(dataset_url)
+    return iter_zip_member(iter_download(dataset_url, zip_path, checksum), RATINGS_MEMBER)
+
+def download_movielens_dataset(dataset_url=DATASET_URL, zip_path=ZIP_PATH, extract_path=EXTRACT_PATH, checksum=None):
+    """Download the MovieLens dataset and extract ratings.dat only; returns its path"""
+    ratings_path = os.path.join(extract_path, "ratings.dat")
+    if not os.path.exists(ratings_path):
+        print("Downloading MovieLens dataset and extracting ratings.dat...")
+        os.makedirs(extract_path, exist_ok=True)
+        partial_path = f"{ratings_path}.partial"
+        with open(partial_path, 'wb', buffering=DOWNLOAD_CHUNK_BYTES) as f:
+            for data in stream_movielens_ratings(dataset_url, zip_path, checksum):
+                f.write(data)
+        os.replace(partial_path, ratings_path)
         print("Extraction completed.")
-    
+
     # Return path to ratings.dat file
-    return os.path.join(extract_path, "ratings.dat")
+    return ratings_path
@@ -0,0 +1,132 @@
+#
+# Tester for append mode (database/append.py appendratings)
+#
+# Loads a small generated file, builds range, round robin and hash partitions
+# (plain and native) and appends a delta holding new pairs, repeated pairs and
+# already loaded pairs with a changed rating. Checks that the table ends with
+# the last rating of every pair, that every partitioning holds exactly the
+# table's rows (changed range rows moved to the partition of their new
+# rating), that a second append of the same delta changes nothing, and that
+# appending to a missing table falls back to a full load with the same result
+# shape. Uses the database from .env.
+#
+#     python tests/append_tester.py
+#
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.append import appendratings
+from database.database import get_connection, loadratings
+from partitioning.partitioning import (rangepartition, roundrobinpartition, hashpartition, verify_range_partitions,
+                                       range_parent_name, rrobin_parent_name, hash_parent_name,
+                                       RANGE_TABLE_PREFIX, RROBIN_TABLE_PREFIX, HASH_TABLE_PREFIX)
+
+RATINGS_TABLE = 'append_ratings'
+INPUT_ROWS = 2000
+NEW_ROWS = 200
+CHANGED_ROWS = 100
+PARTITIONS = {RANGE_TABLE_PREFIX: 5, RROBIN_TABLE_PREFIX: 5, HASH_TABLE_PREFIX: 3}
+
+def write_ratings(path, rows, seed=0):
+    rng = random.Random(seed)
+    ratings = {}
+    with open(path, 'w') as f:
+        for i in range(rows):
+            pair, rating = (i // 20 + 1, i % 20 * 13 + 1), rng.randint(1, 10) / 2
+            ratings[pair] = rating
+            f.write(f"{pair[0]}::{pair[1]}::{rating}::1230000000\n")
+    return ratings
+
+def write_delta(path, base, seed=1):
+    """New pairs (a few of them twice, the last rating winning), then loaded pairs moved to another range"""
+    rng = random.Random(seed)
+    ratings = dict(base)
+    lines = []
+    for i in range(NEW_ROWS):
+        lines.append((900000 + i, 1, rng.randint(1, 10) / 2))
+    for i in range(20):
+        lines.append((900000 + i, 1, 5.0 - i % 10 / 2))
+    for pair in rng.sample(sorted(base), CHANGED_ROWS):
+        lines.append((*pair, 0.5 if base[pair] > 2.5 else 5.0))
+    with open(path, 'w') as f:
+        for userid, movieid, rating in lines:
+            ratings[(userid, movieid)] = rating
+            f.write(f"{userid}::{movieid}::{rating}::1230000000\n")
+    return ratings, len(lines)
+
+def table_rows(cursor, tables):
+    cursor.execute(" UNION ALL ".join(f"SELECT userid, movieid, rating FROM {table}" for table in tables))
+    return sorted(cursor.fetchall())
+
+def check(results, name, passed, detail=''):
+    results.append(passed)
+    print(f"{name} {detail}- {'pass' if passed else 'fail'}")
+
+if __name__ == '__main__':
+    workdir = tempfile.mkdtemp(prefix='append_test_')
+    path = os.path.join(workdir, 'ratings.dat')
+    delta_path = os.path.join(workdir, 'delta.dat')
+    base = write_ratings(path, INPUT_ROWS)
+    expected, delta_rows = write_delta(delta_path, base)
+    expected_rows = sorted((userid, movieid, rating) for (userid, movieid), rating in expected.items())
+
+    conn = get_connection()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    results = []
+    try:
+        for native in (False, True):
+            with contextlib.redirect_stdout(io.StringIO()):
+                loadratings(RATINGS_TABLE, path, conn)
+                rangepartition(RATINGS_TABLE, PARTITIONS[RANGE_TABLE_PREFIX], conn, native=native)
+                roundrobinpartition(RATINGS_TABLE, PARTITIONS[RROBIN_TABLE_PREFIX], conn, native=native)
+                hashpartition(RATINGS_TABLE, PARTITIONS[HASH_TABLE_PREFIX], 'movieid', conn, native=native)
+                appended = appendratings(RATINGS_TABLE, delta_path, conn)
+            mode = 'native' if native else 'plain'
+
+            check(results, f"[{mode}] append counts", appended['rows_read'] == delta_rows
+                  and appended['rows_added'] == NEW_ROWS and appended['rows_updated'] == CHANGED_ROWS
+                  and set(appended['partitions'].values()) == {NEW_ROWS}
+                  and set(appended['updated_partitions'].values()) == {CHANGED_ROWS}, f"({appended}) ")
+            check(results, f"[{mode}] last rating of every pair", table_rows(cursor, [RATINGS_TABLE]) == expected_rows)
+            for prefix, count in PARTITIONS.items():
+                check(results, f"[{mode}] {prefix} partitions hold the table",
+                      table_rows(cursor, [f"{prefix}{i}" for i in range(count)]) == expected_rows)
+            check(results, f"[{mode}] changed ratings moved range partition", verify_range_partitions(RATINGS_TABLE, conn) == [])
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                appended = appendratings(RATINGS_TABLE, delta_path, conn)
+            check(results, f"[{mode}] second append changes nothing", appended['rows_added'] == 0
+                  and appended['rows_updated'] == 0 and table_rows(cursor, [RATINGS_TABLE]) == expected_rows)
+
+        cursor.execute(f"DROP TABLE {RATINGS_TABLE}")
+        with contextlib.redirect_stdout(io.StringIO()):
+            appended = appendratings(RATINGS_TABLE, path, conn)
+        check(results, "full load fallback", appended == {'rows_read': INPUT_ROWS, 'rows_added': INPUT_ROWS, 'rows_updated': 0,
+                                                         'partitions': {}, 'updated_partitions': {}}, f"({appended}) ")
+    finally:
+        # The partitioning metadata is shared by every ratings table, so leave none behind
+        for prefix, count in PARTITIONS.items():
+            for i in range(count):
+                cursor.execute(f"DROP TABLE IF EXISTS {prefix}{i}")
+        for parent in (range_parent_name, rrobin_parent_name, hash_parent_name):
+            cursor.execute(f"DROP TABLE IF EXISTS {parent(RATINGS_TABLE)} CASCADE")
+        cursor.execute("DROP TABLE IF EXISTS range_metadata, rrobin_metadata, hash_metadata")
+        cursor.execute(f"DROP TABLE IF EXISTS {RATINGS_TABLE}")
+        cursor.close()
+        conn.close()
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,134 @@
+#
+# Tester for the coalesced inserts of AsyncPartitioner (partitioning/async_partitioning.py)
+#
+# Loads a small generated file, builds range and round robin partitions
+# (plain and native) and sends a few thousand concurrent single-row inserts
+# holding two bad rows. Checks that only the callers of the bad rows get an
+# exception, that every other row is stored once in its partition, and that
+# the round robin rotation carries on without a gap: the bisected attempts
+# that hit a bad row must not use up rrobin_insert_seq values. Uses the
+# database from .env.
+#
+#     python tests/async_insert_tester.py
+#
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.database import get_connection, loadratings
+from partitioning.async_partitioning import AsyncPartitioner
+from partitioning.partitioning import (RANGE_TABLE_PREFIX, RROBIN_TABLE_PREFIX, verify_range_partitions,
+                                       range_parent_name, rrobin_parent_name)
+
+RATINGS_TABLE = 'async_ratings'
+INPUT_ROWS = 2000
+INSERT_ROWS = 3000
+PARTITIONS = 4
+FIRST_USERID = 9000000
+# Row positions holding a userid out of INT range and a rating that is not a number
+BAD_ROWS = {777: (2 ** 40, 1, 3.0), 1500: (FIRST_USERID + 1500, 1, 'x')}
+
+def write_ratings(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        for i in range(rows):
+            f.write(f"{i // 20 + 1}::{i % 20 * 13 + 1}::{rng.randint(1, 10) / 2}::1230000000\n")
+
+def insert_rows():
+    rows = [(FIRST_USERID + i, 1, i % 10 / 2 + 0.5) for i in range(INSERT_ROWS)]
+    for i, row in BAD_ROWS.items():
+        rows[i] = row
+    return rows
+
+def fetch_one(cursor, sql, params=None):
+    cursor.execute(sql, params)
+    return cursor.fetchone()[0]
+
+def partition_counts(cursor, prefix):
+    return [fetch_one(cursor, f"SELECT COUNT(*) FROM {prefix}{i} WHERE userid >= %s", (FIRST_USERID,))
+            for i in range(PARTITIONS)]
+
+def check(results, name, passed, detail=''):
+    results.append(passed)
+    print(f"{name} {detail}- {'pass' if passed else 'fail'}")
+
+async def call(method, *args, **kwargs):
+    async with AsyncPartitioner(RATINGS_TABLE) as partitioner:
+        return await getattr(partitioner, method)(*args, **kwargs)
+
+async def insert_all(insert):
+    rows = insert_rows()
+    async with AsyncPartitioner(RATINGS_TABLE) as partitioner:
+        outcomes = await asyncio.gather(*(getattr(partitioner, insert)(*row) for row in rows), return_exceptions=True)
+    return sorted(i for i, outcome in enumerate(outcomes) if isinstance(outcome, Exception))
+
+if __name__ == '__main__':
+    workdir = tempfile.mkdtemp(prefix='async_insert_test_')
+    path = os.path.join(workdir, 'ratings.dat')
+    write_ratings(path, INPUT_ROWS)
+    stored = INSERT_ROWS - len(BAD_ROWS)
+
+    conn = get_connection()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    results = []
+    try:
+        for native in (False, True):
+            mode = 'native' if native else 'plain'
+            with contextlib.redirect_stdout(io.StringIO()):
+                loadratings(RATINGS_TABLE, path, conn)
+                asyncio.run(call('rangepartition', PARTITIONS, native=native))
+                asyncio.run(call('roundrobinpartition', PARTITIONS, native=native))
+                range_failed = asyncio.run(insert_all('rangeinsert'))
+                first_index = fetch_one(cursor, "SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END "
+                                                "FROM rrobin_insert_seq")
+                rrobin_failed = asyncio.run(insert_all('roundrobininsert'))
+
+            check(results, f"[{mode}] range: only the bad rows fail", range_failed == sorted(BAD_ROWS), f"({range_failed}) ")
+            check(results, f"[{mode}] range: the other rows are stored",
+                  sum(partition_counts(cursor, RANGE_TABLE_PREFIX)) == stored)
+            cursor.execute(f"INSERT INTO {RATINGS_TABLE} SELECT * FROM (" + " UNION ALL ".join(
+                f"SELECT userid, movieid, rating FROM {RANGE_TABLE_PREFIX}{i} WHERE userid >= {FIRST_USERID}"
+                for i in range(PARTITIONS)) + ") inserted")
+            check(results, f"[{mode}] range: rows are in their partitions", verify_range_partitions(RATINGS_TABLE, conn) == [])
+
+            check(results, f"[{mode}] round robin: only the bad rows fail", rrobin_failed == sorted(BAD_ROWS),
+                  f"({rrobin_failed}) ")
+            next_index = fetch_one(cursor, "SELECT last_value + 1 FROM rrobin_insert_seq")
+            check(results, f"[{mode}] round robin: one sequence value per stored row", next_index - first_index == stored,
+                  f"({next_index - first_index} used) ")
+            expected = [sum(1 for index in range(first_index, first_index + stored) if index % PARTITIONS == i)
+                        for i in range(PARTITIONS)]
+            counts = partition_counts(cursor, RROBIN_TABLE_PREFIX)
+            check(results, f"[{mode}] round robin: rows spread over the rotation", counts == expected, f"({counts}) ")
+            with contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(call('roundrobininsert', FIRST_USERID + INSERT_ROWS, 1, 3.0))
+            landed = [i for i in range(PARTITIONS) if fetch_one(
+                cursor, f"SELECT COUNT(*) FROM {RROBIN_TABLE_PREFIX}{i} WHERE userid = %s", (FIRST_USERID + INSERT_ROWS,))]
+            check(results, f"[{mode}] round robin: next insert continues the rotation without a gap",
+                  landed == [(first_index + stored) % PARTITIONS], f"({landed}) ")
+    finally:
+        # The partitioning metadata is shared by every ratings table, so leave none behind
+        for prefix in (RANGE_TABLE_PREFIX, RROBIN_TABLE_PREFIX):
+            for i in range(PARTITIONS):
+                cursor.execute(f"DROP TABLE IF EXISTS {prefix}{i}")
+        for parent in (range_parent_name, rrobin_parent_name):
+            cursor.execute(f"DROP TABLE IF EXISTS {parent(RATINGS_TABLE)} CASCADE")
+        cursor.execute("DROP TABLE IF EXISTS range_metadata, rrobin_metadata")
+        cursor.execute(f"DROP TABLE IF EXISTS {RATINGS_TABLE}")
+        cursor.close()
+        conn.close()
+        os.remove(path)
+        os.rmdir(workdir)
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    sys.exit(0 if all(results) else 1)
@@ -0,0 +1,150 @@
+#
+# Fault-injection tester for the checkpointed, resumable loadratings
+#
+# Interrupts a checkpointed load twice - once by killing the loading process
+# in the middle of a chunk, once by terminating its server connection - and
+# checks that each rerun resumes from the last committed chunk and ends with
+# exactly the rows of the input file. Uses the database from .env.
+#
+#     python tests/checkpoint_load_tester.py
+#
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+import database.database as db
+
+RATINGS_TABLE = 'checkpoint_ratings'
+INPUT_ROWS = 200000
+CHECKPOINT_BYTES = 256 * 1024
+CRASH_IN_CHUNK = 4  # the loading process exits while streaming this chunk
+
+def write_ratings(path, rows, seed=0):
+    rng = random.Random(seed)
+    expected_sum = 0
+    with open(path, 'w') as f:
+        for i in range(rows):
+            rating = rng.randint(1, 10) / 2
+            expected_sum += rating
+            f.write(f"{i // 50 + 1}::{i % 50 * 7 + 1}::{rating}::1230000000\n")
+    return expected_sum
+
+def progress(conn):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT byte_offset, rows_loaded, completed FROM {db.LOAD_PROGRESS_TABLE} WHERE tablename = %s",
+                   (RATINGS_TABLE,))
+    row = cursor.fetchone()
+    cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(rating), 0) FROM {RATINGS_TABLE}")
+    count, total = cursor.fetchone()
+    cursor.close()
+    return row, count, total
+
+def crash_mid_chunk(path):
+    """Run in a child process: load, exiting abruptly partway through chunk CRASH_IN_CHUNK"""
+    real_open_copy_stream = db.open_copy_stream
+    calls = []
+
+    def open_copy_stream(*args, **kwargs):
+        stream = real_open_copy_stream(*args, **kwargs)
+        calls.append(1)
+        if len(calls) == CRASH_IN_CHUNK:
+            real_read = stream.read
+
+            def read(size=-1):
+                data = real_read(size)
+                if stream.rows > 100:
+                    os._exit(3)
+                return data
+            stream.read = read
+        return stream
+
+    db.open_copy_stream = open_copy_stream
+    conn = db.get_connection()
+    db.loadratings(RATINGS_TABLE, path, conn, copy_format='csv', checkpoint_bytes=CHECKPOINT_BYTES)
+
+def terminate_when_checkpointed(pid, min_rows):
+    """Terminate backend `pid` once its load has committed at least `min_rows`"""
+    conn = db.get_connection()
+    conn.autocommit = True
+    cursor = conn.cursor()
+    for _ in range(2000):
+        cursor.execute(f"SELECT rows_loaded, completed FROM {db.LOAD_PROGRESS_TABLE} WHERE tablename = %s", (RATINGS_TABLE,))
+        row = cursor.fetchone()
+        if row and not row[1] and row[0] >= min_rows:
+            cursor.execute("SELECT pg_terminate_backend(%s)", (pid,))
+            break
+        time.sleep(0.005)
+    conn.close()
+
+def check_resumed(conn, label):
+    (offset, rows_loaded, completed), count, _ = progress(conn)
+    ok = offset > 0 and not completed and count == rows_loaded
+    print(f"{label}: {count:,} rows committed up to byte {offset:,} - {'pass' if ok else 'fail'}")
+    return ok
+
+def check_finished(conn, label, expected_sum):
+    (offset, rows_loaded, completed), count, total = progress(conn)
+    ok = completed and count == INPUT_ROWS and rows_loaded == INPUT_ROWS and abs(total - expected_sum) < 1e-6
+    print(f"{label}: {count:,} rows, rating sum {total} - {'pass' if ok else 'fail'}")
+    return ok
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--crash':
+        crash_mid_chunk(sys.argv[2])
+        sys.exit(0)
+
+    workdir = tempfile.mkdtemp(prefix='checkpoint_load_')
+    path = os.path.join(workdir, 'ratings.dat')
+    expected_sum = write_ratings(path, INPUT_ROWS)
+    results = []
+    conn = db.get_connection()
+    conn.autocommit = True
+    try:
+        conn.cursor().execute(f"DROP TABLE IF EXISTS {RATINGS_TABLE}")
+
+        # 1. The loading process dies mid-chunk
+        child = subprocess.run([sys.executable, __file__, '--crash', path], capture_output=True, text=True)
+        results.append(child.returncode == 3)
+        print(f"loader killed mid-chunk (exit {child.returncode}) - {'pass' if results[-1] else 'fail'}")
+        results.append(check_resumed(conn, "after process kill"))
+        db.loadratings(RATINGS_TABLE, path, conn, copy_format='csv', checkpoint_bytes=CHECKPOINT_BYTES)
+        results.append(check_finished(conn, "resumed after process kill", expected_sum))
+
+        # 2. The server drops the loading connection
+        conn.cursor().execute(f"DROP TABLE {RATINGS_TABLE}")
+        loader = db.get_connection()
+        killer = threading.Thread(target=terminate_when_checkpointed,
+                                  args=(loader.get_backend_pid(), INPUT_ROWS // 3))
+        killer.start()
+        try:
+            db.loadratings(RATINGS_TABLE, path, loader, copy_format='csv', checkpoint_bytes=CHECKPOINT_BYTES)
+            results.append(False)
+            print("connection terminated mid-load - fail (load was not interrupted)")
+        except Exception:
+            results.append(True)
+            print("connection terminated mid-load - pass")
+        killer.join()
+        results.append(check_resumed(conn, "after connection reset"))
+        db.loadratings(RATINGS_TABLE, path, conn, copy_format='csv', checkpoint_bytes=CHECKPOINT_BYTES)
+        results.append(check_finished(conn, "resumed after connection reset", expected_sum))
+
+        # 3. A completed load of the same file starts over instead of resuming
+        db.loadratings(RATINGS_TABLE, path, conn, copy_format='csv', checkpoint_bytes=CHECKPOINT_BYTES)
+        results.append(check_finished(conn, "reload after completion", expected_sum))
+    finally:
+        conn.cursor().execute(f"DROP TABLE IF EXISTS {RATINGS_TABLE}")
+        conn.close()
+        os.remove(path)
+        os.rmdir(workdir)
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    sys.exit(0 if all(results) else 1)
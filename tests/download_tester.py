@@ -0,0 +1,197 @@
+#
+# Tester for the streaming MovieLens download (utils/download.py, utils.utils
+# stream_movielens_ratings and database.loadratings_stream)
+#
+# Serves a generated MovieLens-shaped zip from a local HTTP stand-in that
+# honours Range requests and can drop a connection mid-body or ignore Range,
+# then checks that ratings.dat is loaded straight out of the zip while it
+# downloads (nothing extracted to disk), that dropped and interrupted
+# downloads resume with Range requests, that a finished archive is not
+# fetched again, and that a checksum mismatch rolls the load back. Uses the
+# database from .env.
+#
+#     python tests/download_tester.py
+#
+import contextlib
+import hashlib
+import io
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.database import get_connection, loadratings_stream
+from utils.download import fetch_checksum, iter_download
+from utils.utils import stream_movielens_ratings
+
+RATINGS_TABLE = 'download_ratings'
+INPUT_ROWS = 300000
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """GET of the files in server.files, with 'bytes=N-' ranges, a request log and fault injection"""
+
+    def do_GET(self):
+        server = self.server
+        range_header = self.headers.get('Range')
+        server.requests.append((self.path, range_header))
+        body = server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        start = 0
+        match = re.fullmatch(r'bytes=(\d+)-', range_header or '')
+        if match and not server.ignore_range:
+            start = int(match.group(1))
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{len(body)}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body) - start))
+        self.end_headers()
+        if server.drop_after:
+            # Announce the full length but hang up early, as a dropped connection does
+            self.wfile.write(body[start:start + server.drop_after])
+            server.drop_after = None
+            self.close_connection = True
+            return
+        self.wfile.write(body[start:])
+
+    def log_message(self, format, *args):
+        pass
+
+class UnseekableWriter(io.RawIOBase):
+    """Write-only file without seek, so zipfile writes data descriptors instead of sizes"""
+
+    def __init__(self, target):
+        self._target = target
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self._target.write(data)
+
+def build_archive(rows, seed=0, descriptors=False):
+    """MovieLens-shaped zip bytes (movies.dat, ratings.dat, tags.dat) and the ratings' row count and sum"""
+    rng = random.Random(seed)
+    ratings, total = [], 0
+    for i in range(rows):
+        rating = rng.randint(1, 10) / 2
+        total += rating
+        ratings.append(f"{i // 40 + 1}::{i % 40 * 11 + 1}::{rating:g}::{1230000000 + i}\n")
+    movies = ''.join(f"{m}::Movie {m} (1999)::Drama\n" for m in range(1, 500))
+    target = io.BytesIO()
+    with zipfile.ZipFile(UnseekableWriter(target) if descriptors else target, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('ml-10M100K/movies.dat', movies)
+        archive.writestr('ml-10M100K/ratings.dat', ''.join(ratings))
+        archive.writestr('ml-10M100K/tags.dat', "1::1::tag::1230000000\n" * 1000)
+    return target.getvalue(), rows, total
+
+def table_stats(conn):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(rating), 0) FROM {RATINGS_TABLE}")
+    stats = cursor.fetchone()
+    cursor.close()
+    return stats
+
+def check(results, name, passed, detail=''):
+    results.append(passed)
+    print(f"{name} {detail}- {'pass' if passed else 'fail'}")
+
+def load(url, zip_path, conn, checksum=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        loadratings_stream(RATINGS_TABLE, stream_movielens_ratings(url, zip_path, checksum), conn)
+
+if __name__ == '__main__':
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.requests, server.drop_after, server.ignore_range = [], None, False
+    archive, rows, total = build_archive(INPUT_ROWS)
+    md5 = hashlib.md5(archive).hexdigest()
+    server.files = {'/ml-10m.zip': archive, '/ml-10m.zip.md5': f"MD5 (ml-10m.zip) = {md5}\n".encode()}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/ml-10m.zip"
+
+    workdir = tempfile.mkdtemp(prefix='download_test_')
+    zip_path = os.path.join(workdir, 'ml-10m.zip')
+    conn = get_connection()
+    conn.autocommit = True
+    results = []
+    try:
+        check(results, "published checksum", fetch_checksum(url) == f"md5:{md5}")
+
+        # 1. Fresh download, connection dropped two thirds of the way in (past the first read)
+        server.drop_after = len(archive) * 2 // 3
+        load(url, zip_path, conn, checksum=f"md5:{md5}")
+        check(results, "load while downloading, dropped connection", table_stats(conn) == (rows, total),
+              f"({table_stats(conn)[0]:,} rows) ")
+        resumed_at = [int(r[len('bytes='):-1]) for path, r in server.requests if path == '/ml-10m.zip' and r]
+        check(results, "resumed with a Range request", len(resumed_at) == 1 and 0 < resumed_at[0] <= len(archive) * 2 // 3,
+              f"(at {resumed_at[0]:,} bytes) " if resumed_at else "")
+        check(results, "nothing extracted to disk", os.listdir(workdir) == ['ml-10m.zip'])
+
+        # 2. A finished archive is read back without fetching it again
+        server.requests.clear()
+        load(url, zip_path, conn, checksum=f"md5:{md5}")
+        check(results, "archive reused", table_stats(conn) == (rows, total) and not server.requests)
+
+        # 3. A run stopped partway leaves <zip>.part; the next one only fetches the rest
+        os.remove(zip_path)
+        downloaded = 0
+        download = iter_download(url, zip_path, chunk_bytes=64 * 1024)
+        for chunk in download:
+            downloaded += len(chunk)
+            if downloaded >= len(archive) // 2:
+                break
+        download.close()
+        part_size = os.path.getsize(f"{zip_path}.part")
+        server.requests.clear()
+        load(url, zip_path, conn)
+        check(results, "interrupted download resumed", table_stats(conn) == (rows, total)
+              and ('/ml-10m.zip', f"bytes={part_size}-") in server.requests, f"(from {part_size:,} bytes) ")
+
+        # 4. A server that ignores Range resends everything; the bytes already held are skipped
+        os.remove(zip_path)
+        with open(f"{zip_path}.part", 'wb') as f:
+            f.write(archive[:len(archive) // 4])
+        server.ignore_range = True
+        load(url, zip_path, conn)
+        server.ignore_range = False
+        with open(zip_path, 'rb') as f:
+            check(results, "Range ignored by the server", table_stats(conn) == (rows, total) and f.read() == archive)
+
+        # 5. A checksum mismatch fails the load before commit; the previous table stays
+        os.remove(zip_path)
+        try:
+            load(url, zip_path, conn, checksum="md5:" + "0" * 32)
+            check(results, "checksum mismatch", False, "(load succeeded) ")
+        except ValueError:
+            check(results, "checksum mismatch", table_stats(conn) == (rows, total) and not os.listdir(workdir))
+
+        # 6. Archives written with data descriptors (no sizes in the local headers)
+        archive, rows, total = build_archive(INPUT_ROWS // 3, seed=1, descriptors=True)
+        server.files['/ml-10m.zip'] = archive
+        load(url, zip_path, conn, checksum=f"md5:{hashlib.md5(archive).hexdigest()}")
+        check(results, "zip with data descriptors", table_stats(conn) == (rows, total))
+    finally:
+        server.shutdown()
+        conn.cursor().execute(f"DROP TABLE IF EXISTS {RATINGS_TABLE}")
+        conn.close()
+        shutil.rmtree(workdir)
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    sys.exit(0 if all(results) else 1)
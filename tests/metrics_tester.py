@@ -0,0 +1,149 @@
+#
+# Tester for the instrumentation layer (utils/metrics.py)
+#
+# Loads a small generated file, builds range and round robin partitions,
+# runs the single-row and batch insert paths and appends a delta file with
+# the JSON lines and Prometheus sinks enabled and quiet mode on, then checks
+# the counters, latency histograms, span records and exposition file they
+# produced, and that no per-row message was printed. Uses the database from
+# .env.
+#
+#     python tests/metrics_tester.py
+#
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from dotenv import load_dotenv
+load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+from database.append import appendratings
+from database.database import get_connection, loadratings
+from partitioning.partitioning import rangepartition, roundrobinpartition, rangeinsert, roundrobininsert, rangeinsert_many
+from utils import metrics
+
+RATINGS_TABLE = 'metrics_ratings'
+INPUT_ROWS = 20000
+SINGLE_INSERTS = 50
+BATCH_ROWS = 2000
+APPEND_ROWS = 300
+
+# One sample line of the text exposition format: name, optional {labels}, value
+SAMPLE_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (\S+)$')
+
+def write_ratings(path, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        for i in range(rows):
+            f.write(f"{i // 20 + 1}::{i % 20 * 13 + 1}::{rng.randint(1, 10) / 2}::1230000000\n")
+
+def counter(snapshot, name, **labels):
+    labels = {key: str(value) for key, value in labels.items()}
+    return sum(c['value'] for c in snapshot['counters'] if c['name'] == name and c['labels'] == labels)
+
+def histogram_count(snapshot, name, **labels):
+    return sum(h['count'] for h in snapshot['histograms'] if h['name'] == name and h['labels'] == labels)
+
+def check(results, name, passed, detail=''):
+    results.append(passed)
+    print(f"{name} {detail}- {'pass' if passed else 'fail'}")
+
+def check_prometheus(path):
+    """Every line is a TYPE comment or a sample; buckets are cumulative and end at the count"""
+    buckets, counts = {}, {}
+    with open(path) as f:
+        for line in f.read().splitlines():
+            if line.startswith('# TYPE '):
+                continue
+            match = SAMPLE_LINE.match(line)
+            if not match:
+                return False
+            name, labels, value = match.group(1), match.group(2) or '', float(match.group(3))
+            if name.endswith('_bucket'):
+                # le is always the last label
+                series = (name[:-len('_bucket')], re.sub(r'\{?,?le="[^"]*"\}$', '', labels))
+                buckets.setdefault(series, []).append(value)
+            elif name.endswith('_count'):
+                counts[(name[:-len('_count')], labels[:-1] if labels else '')] = value
+    for (name, labels), values in buckets.items():
+        if values != sorted(values) or values[-1] != counts.get((name, labels)):
+            return False
+    return bool(buckets)
+
+if __name__ == '__main__':
+    workdir = tempfile.mkdtemp(prefix='metrics_test_')
+    path = os.path.join(workdir, 'ratings.dat')
+    jsonl_path = os.path.join(workdir, 'metrics.jsonl')
+    prometheus_path = os.path.join(workdir, 'metrics.prom')
+    delta_path = os.path.join(workdir, 'delta.dat')
+    write_ratings(path, INPUT_ROWS)
+    with open(delta_path, 'w') as f:
+        # New (userid, movieid) pairs, then the first loaded pairs again, rated 5.0, which the append updates where that changes the rating
+        f.writelines(f"{920000 + i}::1::{i % 10 / 2 + 0.5}::1230000000\n" for i in range(APPEND_ROWS))
+        f.writelines(f"{i // 20 + 1}::{i % 20 * 13 + 1}::5.0::1230000000\n" for i in range(10))
+
+    metrics.configure(sinks=[f"jsonl:{jsonl_path}", f"prometheus:{prometheus_path}"], quiet=True)
+    metrics.reset()
+    conn = get_connection()
+    conn.autocommit = True
+    results = []
+    try:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            loadratings(RATINGS_TABLE, path, conn)
+            rangepartition(RATINGS_TABLE, 5, conn)
+            roundrobinpartition(RATINGS_TABLE, 5, conn)
+            for i in range(SINGLE_INSERTS):
+                rangeinsert(RATINGS_TABLE, 900000 + i, 1, i % 10 / 2, conn)
+                roundrobininsert(RATINGS_TABLE, 900000 + i, 2, i % 10 / 2, conn)
+            rangeinsert_many(RATINGS_TABLE, [(910000 + i, 3, i % 10 / 2) for i in range(BATCH_ROWS)], conn)
+            appendratings(RATINGS_TABLE, delta_path, conn)
+        metrics.flush(final=True)
+
+        snapshot = metrics.registry.snapshot()
+        check(results, "rows_loaded counter",
+              counter(snapshot, 'rows_loaded', table=RATINGS_TABLE) == INPUT_ROWS + APPEND_ROWS)
+        for insert_path, rows in (('rangeinsert', SINGLE_INSERTS), ('roundrobininsert', SINGLE_INSERTS),
+                                  ('rangeinsert_many', BATCH_ROWS)):
+            check(results, f"rows_inserted counter of {insert_path}",
+                  counter(snapshot, 'rows_inserted', path=insert_path) == rows)
+        check(results, "rows_inserted counters of append",
+              all(counter(snapshot, 'rows_inserted', path='append', strategy=strategy) == APPEND_ROWS
+                  for strategy in ('range', 'roundrobin')))
+        rng = random.Random(0)
+        changed = sum(rng.randint(1, 10) / 2 != 5.0 for _ in range(10))
+        check(results, "rows_updated counters of append",
+              all(counter(snapshot, 'rows_updated', path='append', strategy=strategy) == changed
+                  for strategy in ('range', 'roundrobin')), f"({changed} changed) ")
+        for statement in ('rangeinsert', 'roundrobininsert'):
+            check(results, f"statement latency histogram of {statement}",
+                  histogram_count(snapshot, 'statement_seconds', statement=statement) == SINGLE_INSERTS)
+
+        with open(jsonl_path) as f:
+            records = [json.loads(line) for line in f]
+        spans = [r['name'] for r in records if r['type'] == 'span']
+        check(results, "span records", all(name in spans for name in ('load', 'partition', 'index_pipeline', 'insert_batch', 'append'))
+              and spans.count('partition') == 2, f"({len(spans)} spans) ")
+        check(results, "JSON lines snapshot", records[-1]['type'] == 'snapshot'
+              and counter(records[-1], 'rows_loaded', table=RATINGS_TABLE) == INPUT_ROWS + APPEND_ROWS)
+        check(results, "Prometheus exposition file", check_prometheus(prometheus_path))
+        check(results, "quiet mode", not any(message in output.getvalue() for message in (
+            "Inserted rating into range partition", "[Round Robin Insert] Insert (", "ratings into",
+            "Staged ", "Routed ", "Append completed")))
+    finally:
+        metrics.configure(sinks=[])
+        conn.cursor().execute(f"DROP TABLE IF EXISTS {RATINGS_TABLE}")
+        conn.close()
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    sys.exit(0 if all(results) else 1)
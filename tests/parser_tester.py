@@ -0,0 +1,69 @@
+#
+# Tester for the columnar ratings parser (utils/ratings_parser.py parse_block)
+#
+# Parses blocks that mix line widths or hold short, blank, empty-field and
+# trailing-garbage lines, with numpy and with the array.array fallback, and
+# checks that every path yields the rows the line-by-line parser and the CSV
+# COPY stream yield, so the binary, cached and batch-insert loads store the
+# same data as the CSV load. No database is needed.
+#
+#     python tests/parser_tester.py
+#
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+import utils.ratings_parser as ratings_parser
+from database.copy_stream import RatingsCopyStream
+
+# (name, block, expected (userid, movieid, rating, timestamp) rows)
+CASES = [
+    ("uniform 4 fields", b"1::2::3::4\n5::6::7::8\n", [(1, 2, 3, 4), (5, 6, 7, 8)]),
+    ("uniform 3 fields", b"1::2::3.5\n5::6::7\n", [(1, 2, 3.5, 0), (5, 6, 7, 0)]),
+    ("non half-star ratings", b"1::2::3.7::4\n5::6::0.1::8\n", [(1, 2, 3.7, 4), (5, 6, 0.1, 8)]),
+    ("CRLF line ends", b"1::2::3::4\r\n5::6::7::8\r\n", [(1, 2, 3, 4), (5, 6, 7, 8)]),
+    ("mixed 4, 5 and 3 fields", b"1::2::3::4\n5::6::7::8::9\n10::11::12\n",
+     [(1, 2, 3, 4), (5, 6, 7, 8), (10, 11, 12, 0)]),
+    ("short line", b"1::2\n3::4::5::6\n", [(3, 4, 5, 6)]),
+    ("blank line", b"1::2::3::4\n\n5::6::7::8\n", [(1, 2, 3, 4), (5, 6, 7, 8)]),
+    ("trailing garbage", b"1::2::3::4 9\n5::6::7::\n", [(5, 6, 7, 0)]),
+    ("garbage field", b"1::2::x::4\n5::6::7::8\n", [(5, 6, 7, 8)]),
+    ("empty field", b"1::::3::4\n5::6::7::8::\n", [(5, 6, 7, 8)]),
+    ("triple colon", b"1:::2::3::4\n5::6::7::8\n", [(5, 6, 7, 8)]),
+]
+
+def rows(batch):
+    return list(zip(batch.userid.tolist(), batch.movieid.tolist(), batch.rating.tolist(), batch.timestamp.tolist()))
+
+def csv_rows(block):
+    """(userid, movieid, rating) of the rows the CSV COPY stream sends for `block`"""
+    data, _ = RatingsCopyStream.encode_block(None, block)
+    return [tuple(float(value) for value in line.split(b',')) for line in data.splitlines()]
+
+def check(results, name, passed, detail=''):
+    results.append(passed)
+    print(f"{name} {detail}- {'pass' if passed else 'fail'}")
+
+if __name__ == '__main__':
+    results = []
+    numpy = ratings_parser.np
+    backends = [('numpy', numpy), ('array', None)] if numpy is not None else [('array', None)]
+    for backend, module in backends:
+        ratings_parser.np = module
+        try:
+            for name, block, expected in CASES:
+                parsed = rows(ratings_parser.parse_block(block))
+                check(results, f"[{backend}] {name}", parsed == expected
+                      and parsed == rows(ratings_parser._parse_lines(block)), f"({parsed}) ")
+        finally:
+            ratings_parser.np = numpy
+
+    # Blocks whose every field parses: the CSV stream must send the same rows
+    for name, block, expected in CASES:
+        if name in ("trailing garbage", "garbage field", "empty field", "triple colon"):
+            continue
+        check(results, f"[csv] {name}", csv_rows(block) == [row[:3] for row in expected])
+
+    print(f"\n{sum(results)}/{len(results)} checks passed")
+    sys.exit(0 if all(results) else 1)